@@ -15,7 +15,17 @@ from datetime import datetime, timedelta
 
 import discord
 from discord.ext import commands, tasks
-import aiohttp
+
+# Shared helpers live next to the reader and import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'telegram_reader'))
+
+from http_client import http_client
+from pattern_matcher import (
+    BLOCKLIST_TRAP_TYPE, PatternHit, PatternMatcher, build_trap_matcher
+)
+from mapping_store import MappingStore
+from outbox import DeliveryError, Outbox, PermanentDeliveryError
+from telegram_sender import TelegramSendError, TelegramSender, clean_for_telegram
 
 # Setup logging
 logging.basicConfig(
@@ -32,56 +42,35 @@ class MessageMapping:
     """Track message relationships between Discord and Telegram"""
     
     def __init__(self):
-        self.mappings: Dict[str, Dict] = {}
-        self.mappings_file = Path('telegram_reader/config/message_mappings.json')
-        self.load_mappings()
-    
-    def load_mappings(self):
-        """Load message mappings from file"""
-        try:
-            if self.mappings_file.exists():
-                with open(self.mappings_file, 'r') as f:
-                    self.mappings = json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading message mappings: {e}")
-            self.mappings = {}
-    
-    def save_mappings(self):
-        """Save message mappings to file"""
-        try:
-            self.mappings_file.parent.mkdir(exist_ok=True)
-            with open(self.mappings_file, 'w') as f:
-                json.dump(self.mappings, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving message mappings: {e}")
+        self.mappings_file = Path('telegram_reader/config/message_mappings.db')
+        # Older installs kept every mapping in one JSON file; it is imported once and renamed
+        self.store = MappingStore(self.mappings_file, legacy_json=Path('telegram_reader/config/message_mappings.json'))
     
     def add_mapping(self, discord_msg_id: str, telegram_msg_id: str, pair_name: str):
         """Add a new message mapping"""
-        self.mappings[discord_msg_id] = {
-            'telegram_msg_id': telegram_msg_id,
-            'pair_name': pair_name,
-            'timestamp': datetime.now().isoformat(),
-            'edit_count': 0
-        }
-        self.save_mappings()
+        try:
+            self.store.add(discord_msg_id, telegram_msg_id, pair_name)
+        except Exception as e:
+            logger.error(f"Error saving message mapping: {e}")
     
     def get_mapping(self, discord_msg_id: str) -> Optional[Dict]:
         """Get mapping for a Discord message"""
-        return self.mappings.get(discord_msg_id)
+        return self.store.get(discord_msg_id)
     
     def increment_edit_count(self, discord_msg_id: str) -> int:
         """Increment edit count and return new count"""
-        if discord_msg_id in self.mappings:
-            self.mappings[discord_msg_id]['edit_count'] += 1
-            self.save_mappings()
-            return self.mappings[discord_msg_id]['edit_count']
-        return 0
+        return self.store.increment_edit_count(discord_msg_id)
+    
+    def remove_older_than(self, cutoff_time: datetime) -> int:
+        """Drop mappings created before cutoff_time"""
+        return self.store.delete_before(cutoff_time)
 
 class TelegramPoster:
     """Handle posting messages to Telegram channels"""
     
     def __init__(self):
         self.bot_tokens = self.load_bot_tokens()
+        self.sender = TelegramSender(http_client)
     
     def load_bot_tokens(self) -> Dict[str, str]:
         """Load bot tokens from configuration"""
@@ -103,10 +92,10 @@ class TelegramPoster:
     
     async def post_to_telegram(self, message_content: str, pair_config: Dict, 
                               original_discord_id: str) -> Optional[str]:
-        """Post message to Telegram and return message ID"""
+        """Post message to Telegram and return message ID; TelegramSendError is passed on"""
         try:
-            bot_token = pair_config.get('bot_token') or self.bot_tokens.get('default')
-            if not bot_token or bot_token == 'YOUR_BOT_TOKEN_HERE':
+            tokens = self.tokens_for(pair_config)
+            if not tokens:
                 logger.error(f"No valid bot token for pair: {pair_config.get('pair_name')}")
                 return None
             
@@ -118,46 +107,31 @@ class TelegramPoster:
             # Prepare message for Telegram
             cleaned_content = self.clean_message_for_telegram(message_content)
             
-            # Send to Telegram
-            url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-            payload = {
-                'chat_id': destination_channel,
-                'text': cleaned_content,
-                'parse_mode': 'HTML',
-                'disable_web_page_preview': True
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        telegram_msg_id = str(result['result']['message_id'])
-                        logger.info(f"Posted to Telegram: {pair_config.get('pair_name')}")
-                        return telegram_msg_id
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Telegram API error {response.status}: {error_text}")
-                        return None
+            # Paced send: waits out flood limits instead of failing on 429
+            result = await self.sender.send_message(
+                destination_channel, cleaned_content, tokens,
+                parse_mode='HTML', disable_web_page_preview=True
+            )
+            logger.info(f"Posted to Telegram: {pair_config.get('pair_name')}")
+            return result.message_id
         
+        except TelegramSendError:
+            # The caller needs to know whether Telegram refused the post for good
+            raise
         except Exception as e:
             logger.error(f"Error posting to Telegram: {e}")
             return None
     
+    def tokens_for(self, pair_config: Dict) -> List[str]:
+        """Pair token first, then every other configured bot as a fallback sender"""
+        tokens = [pair_config.get('bot_token'), self.bot_tokens.get('default')]
+        tokens.extend(self.bot_tokens.values())
+        return [t for t in dict.fromkeys(tokens) if t and t != 'YOUR_BOT_TOKEN_HERE']
+    
     def clean_message_for_telegram(self, content: str) -> str:
         """Clean Discord message content for Telegram"""
-        # Remove Discord-specific formatting
-        content = content.replace('**From ', 'From ')
-        content = content.replace(':**\n', ':\n')
-        
-        # Handle Discord mentions and formatting
-        content = content.replace('@everyone', '')
-        content = content.replace('@here', '')
-        
-        # Limit length
-        if len(content) > 4000:
-            content = content[:3900] + "... (message truncated)"
-        
-        return content.strip()
+        # Shared with the reader's direct path so both produce the same post
+        return clean_for_telegram(content)
 
 class AutoForwardXBot(commands.Bot):
     """Main Discord bot class"""
@@ -171,6 +145,9 @@ class AutoForwardXBot(commands.Bot):
         
         self.message_mapping = MessageMapping()
         self.telegram_poster = TelegramPoster()
+        # Telegram posts are committed here first and retried until Telegram accepts them
+        self.outbox = Outbox(os.getenv('DISCORD_BOT_OUTBOX_PATH', 'telegram_reader/config/discord_bot_outbox.db'))
+        self.outbox.register('telegram', self.deliver_to_telegram)
         self.pairs_config = self.load_pairs_config()
         self.webhook_channels = self.get_webhook_channels()
         self.edit_threshold = 3
@@ -212,6 +189,23 @@ class AutoForwardXBot(commands.Bot):
         except Exception as e:
             logger.error(f"Error loading blocklist: {e}")
             self.blocklist = {"global_blocklist": {"text": [], "images": []}, "pair_blocklist": {}}
+        
+        # Automatons are rebuilt lazily per pair from the freshly loaded blocklist
+        self._matchers: Dict[str, PatternMatcher] = {}
+    
+    def get_matcher(self, pair_name: str) -> PatternMatcher:
+        """Return the combined blocklist + trap pattern automaton for a pair"""
+        matcher = self._matchers.get(pair_name)
+        if matcher is None:
+            global_text = self.blocklist.get('global_blocklist', {}).get('text', [])
+            pair_text = self.blocklist.get('pair_blocklist', {}).get(pair_name, {}).get('text', [])
+            matcher = build_trap_matcher(list(global_text) + list(pair_text))
+            self._matchers[pair_name] = matcher
+        return matcher
+    
+    def scan_content(self, content: str, pair_name: str) -> List[PatternHit]:
+        """Scan content once and return every blocklist and trap pattern hit"""
+        return self.get_matcher(pair_name).find_all(content)
     
     def find_pair_by_channel(self, channel_id: int) -> Optional[Dict]:
         """Find pair configuration by Discord channel ID"""
@@ -223,39 +217,27 @@ class AutoForwardXBot(commands.Bot):
     
     def is_text_blocked(self, text: str, pair_name: str) -> bool:
         """Check if text contains blocked content"""
-        text_lower = text.lower()
-        
-        # Check global blocklist
-        for blocked in self.blocklist.get('global_blocklist', {}).get('text', []):
-            if blocked.lower() in text_lower:
-                return True
-        
-        # Check pair-specific blocklist
-        pair_blocklist = self.blocklist.get('pair_blocklist', {}).get(pair_name, {})
-        for blocked in pair_blocklist.get('text', []):
-            if blocked.lower() in text_lower:
-                return True
-        
-        return False
+        hits = self.scan_content(text, pair_name)
+        return any(hit.trap_type == BLOCKLIST_TRAP_TYPE for hit in hits)
     
-    def detect_trap_patterns(self, content: str) -> Optional[str]:
+    def detect_trap_patterns(self, content: str, pair_name: str = '') -> Optional[str]:
         """Detect known trap patterns"""
-        content_lower = content.lower().strip()
-        
-        trap_patterns = [
-            ('/ *', 'forward_slash_trap'),
-            ('1', 'single_digit_trap'),
-            ('trap', 'explicit_trap'),
-            ('leak', 'leak_warning'),
-            ('copy warning', 'copy_warning')
-        ]
-        
-        for pattern, trap_type in trap_patterns:
-            if pattern in content_lower:
-                return trap_type
-        
+        for hit in self.scan_content(content, pair_name):
+            if hit.trap_type != BLOCKLIST_TRAP_TYPE:
+                return hit.trap_type
         return None
     
+    def find_pair_by_name(self, pair_name: str) -> Optional[Dict]:
+        """Find an active pair configuration by name"""
+        for pair in self.pairs_config:
+            if pair.get('pair_name') == pair_name:
+                return pair
+        return None
+    
+    async def setup_hook(self):
+        """Replay Telegram posts left undelivered by the previous run"""
+        await self.outbox.start()
+    
     async def on_ready(self):
         """Bot ready event"""
         logger.info(f"Discord bot ready: {self.user}")
@@ -265,6 +247,15 @@ class AutoForwardXBot(commands.Bot):
         # Start periodic tasks
         self.cleanup_old_mappings.start()
     
+    async def close(self):
+        """Close the Telegram sender and shared HTTP pool before shutting down the gateway connection"""
+        # Pending posts stay on disk and are replayed on the next start
+        await self.outbox.close()
+        await self.telegram_poster.sender.close()
+        await http_client.close()
+        self.message_mapping.store.close()
+        await super().close()
+    
     async def on_message(self, message):
         """Handle incoming messages"""
         # Skip if not bot message or not in monitored channels
@@ -281,34 +272,60 @@ class AutoForwardXBot(commands.Bot):
             logger.warning(f"No pair found for channel: {message.channel.id}")
             return
         
+        # Direct pairs are posted to Telegram by the reader; this webhook message is only their mirror
+        if pair_config.get('direct_telegram'):
+            return
+        
         # Extract original content from embed or message
         content = self.extract_message_content(message)
         if not content:
             return
         
-        # Check for blocked content
-        if self.is_text_blocked(content, pair_config['pair_name']):
+        # Scan once for blocked content and trap patterns
+        hits = self.scan_content(content, pair_config['pair_name'])
+        if any(hit.trap_type == BLOCKLIST_TRAP_TYPE for hit in hits):
             logger.warning(f"Blocked content detected in pair: {pair_config['pair_name']}")
             return
         
-        # Check for trap patterns
-        trap_type = self.detect_trap_patterns(content)
+        trap_type = next((hit.trap_type for hit in hits if hit.trap_type != BLOCKLIST_TRAP_TYPE), None)
         if trap_type:
             logger.warning(f"Trap detected ({trap_type}) in pair: {pair_config['pair_name']}")
             await self.handle_trap_detection(trap_type, pair_config, message)
             return
         
-        # Forward to Telegram
-        telegram_msg_id = await self.telegram_poster.post_to_telegram(
-            content, pair_config, str(message.id)
-        )
+        # Forward to Telegram through the outbox: committed now, posted (and retried) in the background
+        item = {'content': content, 'discord_id': str(message.id)}
+        try:
+            await self.outbox.submit('telegram', pair_config['pair_name'], item)
+        except Exception as e:
+            logger.error(f"Outbox unavailable, posting directly: {e}")
+            try:
+                await self.deliver_to_telegram(pair_config['pair_name'], item)
+            except DeliveryError as e:
+                logger.error(f"Error posting to Telegram: {e}")
+    
+    async def deliver_to_telegram(self, pair_name: str, item: Dict):
+        """Outbox sender: post to Telegram and store the mapping, raising DeliveryError to retry"""
+        pair_config = self.find_pair_by_name(pair_name)
+        if pair_config is None:
+            raise PermanentDeliveryError(f"pair {pair_name} is no longer active")
+        if not pair_config.get('destination_tg_channel') or not self.telegram_poster.tokens_for(pair_config):
+            raise PermanentDeliveryError(f"pair {pair_name} has no destination channel or bot token")
         
-        if telegram_msg_id:
-            # Store mapping
-            self.message_mapping.add_mapping(
-                str(message.id), telegram_msg_id, pair_config['pair_name']
+        try:
+            telegram_msg_id = await self.telegram_poster.post_to_telegram(
+                item['content'], pair_config, item['discord_id']
             )
-            logger.info(f"Message forwarded: Discord {message.id} to Telegram {telegram_msg_id}")
+        except TelegramSendError as e:
+            # 4xx other than 429: dead-letter now rather than hold the lane through every retry
+            error = PermanentDeliveryError if e.permanent else DeliveryError
+            raise error(f"Telegram did not accept the post for {pair_name}: {e}") from e
+        if not telegram_msg_id:
+            raise DeliveryError(f"Telegram did not accept the post for {pair_name}")
+        
+        # Store mapping
+        self.message_mapping.add_mapping(item['discord_id'], telegram_msg_id, pair_name)
+        logger.info(f"Message forwarded: Discord {item['discord_id']} to Telegram {telegram_msg_id}")
     
     def extract_message_content(self, message) -> Optional[str]:
         """Extract meaningful content from Discord message"""
@@ -346,18 +363,10 @@ class AutoForwardXBot(commands.Bot):
             current_time = datetime.now()
             cutoff_time = current_time - timedelta(days=7)  # Keep mappings for 7 days
             
-            old_mappings = []
-            for msg_id, mapping in self.message_mapping.mappings.items():
-                mapping_time = datetime.fromisoformat(mapping['timestamp'])
-                if mapping_time < cutoff_time:
-                    old_mappings.append(msg_id)
-            
-            for msg_id in old_mappings:
-                del self.message_mapping.mappings[msg_id]
-            
-            if old_mappings:
-                self.message_mapping.save_mappings()
-                logger.info(f"Cleaned up {len(old_mappings)} old message mappings")
+            removed = self.message_mapping.remove_older_than(cutoff_time)
+            if removed:
+                self.message_mapping.store.checkpoint()
+                logger.info(f"Cleaned up {removed} old message mappings")
         
         except Exception as e:
             logger.error(f"Error cleaning up mappings: {e}")
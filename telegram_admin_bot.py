@@ -18,6 +18,12 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Mess
 import aiohttp
 import aiofiles
 
+# Shared helpers live next to the reader and import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'telegram_reader'))
+
+from config_writer import ConfigWriter, atomic_write_json, file_lock
+from perceptual_hash import PERCEPTUAL_HASH_AVAILABLE, compute_hashes
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,6 +46,9 @@ class AdminBotConfig:
         self.blocklist_file = self.config_dir / 'blocklist.json'
         self.sessions_file = self.config_dir / 'sessions.json'
         
+        # Same locking and batching as the reader's ConfigManager, so neither clobbers the other
+        self.writer = ConfigWriter()
+        
         # Initialize files if they don't exist
         self._init_config_files()
     
@@ -84,90 +93,93 @@ class AdminBotConfig:
         """Load JSON file with error handling"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                data = json.load(f)
         except Exception as e:
             logger.error(f"Error loading {file_path}: {e}")
-            return {}
+            data = {}
+        return self.writer.view(file_path, data)
     
     def _save_json(self, file_path: Path, data: dict):
-        """Save data to JSON file"""
+        """Replace a JSON file atomically under the cross-process lock"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with file_lock(file_path):
+                atomic_write_json(file_path, data)
         except Exception as e:
             logger.error(f"Error saving {file_path}: {e}")
     
+    def _update_json(self, file_path: Path, mutate, default):
+        """Queue an in-place change; written (batched) by the writer thread"""
+        return self.writer.update(file_path, mutate, default)
+    
     def get_pairs(self) -> List[Dict]:
         """Get all pairs"""
         pairs_data = self._load_json(self.pairs_file)
         return pairs_data if isinstance(pairs_data, list) else []
     
+    def _set_statuses(self, from_status: Optional[str], to_status: str, pair_name: Optional[str] = None) -> int:
+        """Queue a status change for one pair or every pair in from_status; returns how many match now"""
+        def matches(pair) -> bool:
+            if pair_name is not None:
+                return pair.get('pair_name') == pair_name
+            return pair.get('status') == from_status
+        
+        count = sum(1 for pair in self.get_pairs() if matches(pair))
+        if count:
+            def set_status(pairs):
+                for pair in pairs if isinstance(pairs, list) else []:
+                    if matches(pair):
+                        pair['status'] = to_status
+            self._update_json(self.pairs_file, set_status, [])
+        return count
+    
     def update_pair_status(self, pair_name: str, status: str) -> bool:
         """Update pair status"""
-        pairs = self.get_pairs()
-        for pair in pairs:
-            if pair.get('pair_name') == pair_name:
-                pair['status'] = status
-                self._save_json(self.pairs_file, pairs)
-                return True
-        return False
+        return self._set_statuses(None, status, pair_name=pair_name) > 0
     
     def pause_all_pairs(self) -> int:
         """Pause all pairs and return count"""
-        pairs = self.get_pairs()
-        count = 0
-        for pair in pairs:
-            if pair.get('status') == 'active':
-                pair['status'] = 'paused'
-                count += 1
-        self._save_json(self.pairs_file, pairs)
-        return count
+        return self._set_statuses('active', 'paused')
     
     def resume_all_pairs(self) -> int:
         """Resume all pairs and return count"""
-        pairs = self.get_pairs()
-        count = 0
-        for pair in pairs:
-            if pair.get('status') == 'paused':
-                pair['status'] = 'active'
-                count += 1
-        self._save_json(self.pairs_file, pairs)
-        return count
+        return self._set_statuses('paused', 'active')
     
     def add_blocked_text(self, text: str, pair_name: Optional[str] = None) -> bool:
         """Add text to blocklist"""
-        blocklist_data = self._load_json(self.blocklist_file)
-        
-        if pair_name:
-            # Add to pair-specific blocklist
-            if pair_name not in blocklist_data.get('pair_blocklist', {}):
-                blocklist_data.setdefault('pair_blocklist', {})[pair_name] = {'text': [], 'images': []}
-            if text not in blocklist_data['pair_blocklist'][pair_name]['text']:
-                blocklist_data['pair_blocklist'][pair_name]['text'].append(text)
-        else:
-            # Add to global blocklist
-            if text not in blocklist_data.get('global_blocklist', {}).get('text', []):
-                blocklist_data.setdefault('global_blocklist', {}).setdefault('text', []).append(text)
+        def add(blocklist_data):
+            if pair_name:
+                # Add to pair-specific blocklist
+                if pair_name not in blocklist_data.get('pair_blocklist', {}):
+                    blocklist_data.setdefault('pair_blocklist', {})[pair_name] = {'text': [], 'images': []}
+                if text not in blocklist_data['pair_blocklist'][pair_name]['text']:
+                    blocklist_data['pair_blocklist'][pair_name]['text'].append(text)
+            else:
+                # Add to global blocklist
+                if text not in blocklist_data.get('global_blocklist', {}).get('text', []):
+                    blocklist_data.setdefault('global_blocklist', {}).setdefault('text', []).append(text)
         
-        self._save_json(self.blocklist_file, blocklist_data)
+        self._update_json(self.blocklist_file, add, {})
         return True
     
-    def add_blocked_image(self, image_hash: str, pair_name: Optional[str] = None) -> bool:
-        """Add image hash to blocklist"""
-        blocklist_data = self._load_json(self.blocklist_file)
-        
-        if pair_name:
-            # Add to pair-specific blocklist
-            if pair_name not in blocklist_data.get('pair_blocklist', {}):
-                blocklist_data.setdefault('pair_blocklist', {})[pair_name] = {'text': [], 'images': []}
-            if image_hash not in blocklist_data['pair_blocklist'][pair_name]['images']:
-                blocklist_data['pair_blocklist'][pair_name]['images'].append(image_hash)
-        else:
-            # Add to global blocklist
-            if image_hash not in blocklist_data.get('global_blocklist', {}).get('images', []):
-                blocklist_data.setdefault('global_blocklist', {}).setdefault('images', []).append(image_hash)
+    def add_blocked_image(self, image_hash: str, pair_name: Optional[str] = None,
+                          perceptual: Optional[Dict[str, str]] = None) -> bool:
+        """Add image hash (and optional perceptual hashes) to blocklist"""
+        def add(blocklist_data):
+            if pair_name:
+                # Add to pair-specific blocklist
+                if pair_name not in blocklist_data.get('pair_blocklist', {}):
+                    blocklist_data.setdefault('pair_blocklist', {})[pair_name] = {'text': [], 'images': []}
+                rules = blocklist_data['pair_blocklist'][pair_name]
+            else:
+                # Add to global blocklist
+                rules = blocklist_data.setdefault('global_blocklist', {})
+            
+            if image_hash not in rules.setdefault('images', []):
+                rules['images'].append(image_hash)
+            if perceptual and not any(e.get('md5') == image_hash for e in rules.get('perceptual', [])):
+                rules.setdefault('perceptual', []).append({'md5': image_hash, **perceptual})
         
-        self._save_json(self.blocklist_file, blocklist_data)
+        self._update_json(self.blocklist_file, add, {})
         return True
     
     def get_blocklist_summary(self) -> Dict[str, Any]:
@@ -514,8 +526,16 @@ class AutoForwardXAdminBot:
                 file_bytes = await file.download_as_bytearray()
                 image_hash = hashlib.md5(file_bytes).hexdigest()
                 
+                # Perceptual hashes also catch recompressed/re-cropped copies
+                perceptual = None
+                if PERCEPTUAL_HASH_AVAILABLE:
+                    try:
+                        perceptual = await asyncio.to_thread(compute_hashes, bytes(file_bytes))
+                    except Exception as e:
+                        logger.error(f"Error computing perceptual hash: {e}")
+                
                 # Add to blocklist
-                self.config.add_blocked_image(image_hash)
+                self.config.add_blocked_image(image_hash, perceptual=perceptual)
                 
                 await update.message.reply_text(
                     f"🖼️ Image blocked successfully!\n\nHash: {image_hash[:16]}...\n\nThis image will now be blocked in all pairs.",
@@ -560,6 +580,8 @@ async def main():
         logger.info("Received interrupt signal, shutting down...")
     except Exception as e:
         logger.error(f"Fatal error: {e}")
+    finally:
+        admin_bot.config.writer.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: in-place json.dump per status flip vs ConfigWriter (locked, atomic, coalesced)
+Run from the telegram_reader directory: python benchmarks/bench_config_writer.py
+"""
+
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config_writer import ConfigWriter
+
+PAIRS = 500
+PROCESSES = 2
+
+def make_pairs(path: Path):
+    pairs = [{'pair_name': f"pair_{i}", 'source_tg_channel': f"@source_{i}",
+              'discord_webhook': f"https://discord.com/api/webhooks/{i}/token", 'destination_tg_channel': f"@dest_{i}",
+              'bot_token': '123:abc', 'session': f"session_{i % 10}", 'status': 'active'} for i in range(PAIRS)]
+    path.write_text(json.dumps(pairs, indent=2))
+
+def naive_pause(path: Path, names):
+    """Old behaviour: load, flip one status, dump the whole file in place"""
+    for name in names:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                pairs = json.load(f)
+        except ValueError:
+            # Caught the other process mid-write; the old loader gave up on this update the same way
+            continue
+        for pair in pairs:
+            if pair['pair_name'] == name:
+                pair['status'] = 'paused'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(pairs, f, indent=2)
+
+def writer_pause(path: Path, names):
+    writer = ConfigWriter(delay=0.05)
+    for name in names:
+        def pause(pairs, name=name):
+            for pair in pairs:
+                if pair['pair_name'] == name:
+                    pair['status'] = 'paused'
+        writer.update(path, pause, [])
+    writer.close()
+    return writer.stats()
+
+def paused_count(path: Path):
+    try:
+        return sum(1 for pair in json.loads(path.read_text()) if pair['status'] == 'paused'), 'ok'
+    except ValueError:
+        return 0, 'corrupt'
+
+def run_single(directory: Path):
+    names = [f"pair_{i}" for i in range(PAIRS)]
+    path = directory / 'single.json'
+    
+    make_pairs(path)
+    start = time.perf_counter()
+    naive_pause(path, names)
+    naive = time.perf_counter() - start
+    
+    make_pairs(path)
+    writer = ConfigWriter(delay=0.05)
+    start = time.perf_counter()
+    for name in names:
+        def pause(pairs, name=name):
+            for pair in pairs:
+                if pair['pair_name'] == name:
+                    pair['status'] = 'paused'
+        writer.update(path, pause, [])
+    caller = time.perf_counter() - start
+    writer.close()
+    stats = writer.stats()
+    
+    print(f"pause {PAIRS} pairs one by one, single process")
+    print(f"  in-place dump   {PAIRS:>4} writes  {naive * 1000:8.1f} ms on the caller")
+    print(f"  ConfigWriter    {stats['writes']:>4} writes  {caller * 1000:8.1f} ms on the caller  "
+          f"(write thread {stats['avg_write_ms'] * stats['writes']:.1f} ms)  paused {paused_count(path)[0]}")
+
+def run_concurrent(directory: Path, name: str, target):
+    path = directory / f"{name}.json"
+    make_pairs(path)
+    # Every process pauses its own disjoint slice of pairs
+    slices = [[f"pair_{i}" for i in range(p, PAIRS, PROCESSES)] for p in range(PROCESSES)]
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=target, args=(path, names)) for names in slices]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    paused, state = paused_count(path)
+    print(f"  {name:<15} paused {paused:>4}/{PAIRS}  file {state}")
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        run_single(directory)
+        print(f"{PROCESSES} processes pausing disjoint pairs of one file at the same time")
+        run_concurrent(directory, 'in-place dump', naive_pause)
+        run_concurrent(directory, 'ConfigWriter', writer_pause)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Telegram -> webhook -> Discord bot -> Telegram vs the reader posting to Telegram directly (local stubs)
+Run from the telegram_reader directory: python benchmarks/bench_direct_telegram.py
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from fake_discord import FakeDiscord
+from fake_telegram import FakeTelegram
+from telegram_sender import TelegramSender
+
+MESSAGES = 40
+INTERVAL = 0.25
+# Round trip of one API call; the stubs add it to every request
+DISCORD_API_LATENCY = 0.05
+TELEGRAM_API_LATENCY = 0.05
+# Assumed delay from a webhook post to the bot receiving MESSAGE_CREATE over the gateway
+GATEWAY_LATENCY = 0.1
+BOT_TOKEN = '123456:bench'
+
+def reference(message_id: int) -> str:
+    """Message id spelled in letters, since the built-in trap patterns reject any text containing a 1"""
+    return ''.join(chr(ord('a') + int(digit)) for digit in str(message_id))
+
+def message_id_of(text: str) -> int:
+    return int(''.join(str(ord(letter) - ord('a')) for letter in text.rsplit('#', 1)[1]))
+
+def message_data(pair_name: str, message_id: int):
+    return {
+        'text': f"BUY XAUUSD @ market TP +50 SL -25 #{reference(message_id)}",
+        'message_id': message_id,
+        'chat_id': -1001234567890,
+        'edited': False,
+        'channel': 'signals',
+        'channel_title': 'VIP Signals',
+        'timestamp': datetime.now().isoformat(),
+        'pair_name': pair_name,
+        'has_media': False,
+        'media_hash': None,
+        'media_size': None,
+        'media_perceptual': None,
+        'formatting': {'entities': [], 'has_formatting': False}
+    }
+
+def gateway_message(message: dict):
+    """The discord.Message fields on_message reads, built from what the webhook posted"""
+    payload = message['payload']
+    return SimpleNamespace(
+        id=int(message['id']),
+        author=SimpleNamespace(bot=True, display_name=payload.get('username', '')),
+        channel=SimpleNamespace(id=int(message['route'])),
+        embeds=[SimpleNamespace(description=embed.get('description')) for embed in payload.get('embeds') or []],
+        content=payload.get('content', '')
+    )
+
+def percentiles(values):
+    values = sorted(values)
+    return statistics.median(values), values[int(len(values) * 0.95) - 1], values[-1]
+
+async def run_case(reader_main, discord_bot, name: str, direct: bool):
+    # A pair per case: webhook message mappings persist across runs in the same directory
+    pair_name = 'signals_direct' if direct else 'signals_via_bot'
+    telegram = FakeTelegram(chat_limit=100000, token_limit=100000, latency=TELEGRAM_API_LATENCY)
+    await telegram.start()
+    
+    bot = discord_bot.AutoForwardXBot()
+    bot.telegram_poster.sender = TelegramSender(reader_main.http_client, api_base=telegram.api_base)
+    await bot.outbox.start()
+    
+    async def deliver_to_bot(message):
+        await asyncio.sleep(GATEWAY_LATENCY)
+        await bot.on_message(gateway_message(message))
+    
+    discord = FakeDiscord(limit=100000, latency=DISCORD_API_LATENCY, listener=deliver_to_bot)
+    await discord.start()
+    pair = reader_main.PairConfig(
+        pair_name=pair_name, source_tg_channel='@signals', discord_webhook=discord.webhook_url(),
+        destination_tg_channel='@dest', bot_token=BOT_TOKEN, session='bench', direct_telegram=direct
+    )
+    bot.pairs_config = [{'pair_name': pair_name, 'discord_webhook': pair.discord_webhook, 'bot_token': BOT_TOKEN,
+                         'destination_tg_channel': '@dest', 'status': 'active', 'direct_telegram': direct}]
+    bot.webhook_channels = bot.get_webhook_channels()
+    
+    reader = reader_main.TelegramMessageReader()
+    reader.telegram_sender = TelegramSender(reader_main.http_client, api_base=telegram.api_base)
+    reader.pairs = [pair]
+    reader.active_pair_names = {pair_name}
+    reader.rebuild_routing()
+    await reader.outbox.start()
+    
+    sent_at = {}
+    for message_id in range(1, MESSAGES + 1):
+        data = message_data(pair_name, message_id)
+        sent_at[message_id] = time.monotonic()
+        # Trap detection and delivery exactly as the pipeline runs them for one pair
+        trap_result = await reader.detect_traps(data, pair)
+        await reader.deliver_message((pair, data, trap_result))
+        await asyncio.sleep(INTERVAL)
+    
+    deadline = time.monotonic() + 30
+    while (len(telegram.sent) < MESSAGES or len(discord.delivered) < MESSAGES) and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    
+    telegram_ms = [(sent['received_at'] - sent_at[message_id_of(sent['text'])]) * 1000
+                   for sent in telegram.sent]
+    discord_ms = [(message['received_at'] - sent_at[int(message['payload']['embeds'][0]['footer']['text']
+                                                         .rsplit('ID: ', 1)[1])]) * 1000
+                  for message in discord.delivered]
+    t50, t95, tmax = percentiles(telegram_ms)
+    d50, d95, _ = percentiles(discord_ms)
+    print(f"  {name:<24} Telegram posts {len(telegram.sent):>3}/{MESSAGES}  "
+          f"latency p50 {t50:6.1f} ms  p95 {t95:6.1f} ms  max {tmax:6.1f} ms   "
+          f"Discord p50 {d50:6.1f} ms  p95 {d95:6.1f} ms")
+    
+    await reader.outbox.close()
+    reader.webhook_messages.close()
+    await reader.telegram_sender.close()
+    await bot.outbox.close()
+    bot.message_mapping.store.close()
+    await bot.telegram_poster.sender.close()
+    await discord.stop()
+    await telegram.stop()
+
+async def main():
+    print(f"{MESSAGES} messages every {INTERVAL}s on one pair; API round trips Discord {DISCORD_API_LATENCY * 1000:.0f} ms, "
+          f"Telegram {TELEGRAM_API_LATENCY * 1000:.0f} ms, gateway delivery {GATEWAY_LATENCY * 1000:.0f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        # main.py and discord_bot.py create config/ and log to logs/ under the working directory
+        os.chdir(tmp)
+        Path('logs').mkdir()
+        Path('telegram_reader/config').mkdir(parents=True)
+        os.environ['DISCORD_GLOBAL_RATE'] = '100000'
+        os.environ['TELEGRAM_CHAT_RATE'] = '100000'
+        os.environ['TELEGRAM_CHAT_BURST'] = '1000'
+        os.environ['PERCEPTUAL_HASHING'] = 'false'
+        import main as reader_main
+        import discord_bot
+        logging.getLogger().setLevel(logging.WARNING)
+        # The bot finds no pairs.json or blocklist.json here; its pairs are set per case below
+        logging.getLogger('discord_bot').setLevel(logging.CRITICAL)
+        
+        await run_case(reader_main, discord_bot, 'via Discord bot', direct=False)
+        await run_case(reader_main, discord_bot, 'direct (Discord mirror)', direct=True)
+        await reader_main.webhook_scheduler.close()
+        await reader_main.http_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: re-posting every edit vs PATCH/DELETE through the webhook message mapping (fake Discord)
+Run from the telegram_reader directory: python benchmarks/bench_edit_propagation.py
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_discord import FakeDiscord
+from mapping_store import WebhookMessageStore
+
+MESSAGES = 300
+EDITS_PER_MESSAGE = 2.0
+DELETE_RATE = 0.1
+PAIR = 'bench_pair'
+CHAT_ID = -1001234567890
+STORE_ROWS = 1_000_000
+STORE_LOOKUPS = 200_000
+
+def make_events():
+    """Source events in arrival order: posts, edits (mostly soon after the post) and deletes"""
+    rng = random.Random(5)
+    events = []
+    for message_id in range(1, MESSAGES + 1):
+        events.append(('post', message_id, f"message {message_id}"))
+        for edit in range(int(rng.expovariate(1 / EDITS_PER_MESSAGE))):
+            events.append(('edit', message_id, f"message {message_id} (edit {edit + 1})"))
+        if rng.random() < DELETE_RATE:
+            events.append(('delete', message_id, None))
+    return events
+
+def expected_state(events):
+    latest = {}
+    for action, message_id, text in events:
+        if action == 'delete':
+            latest.pop(message_id, None)
+        else:
+            latest[message_id] = text
+    return latest
+
+def payload(text: str):
+    return {'content': text, 'username': f"AutoForwardX - {PAIR}", 'embeds': [{'description': text}]}
+
+def visible(fake: FakeDiscord):
+    return [message['payload']['content'] for message in fake.messages.values()]
+
+async def run_repost(events, url: str, fake: FakeDiscord, client):
+    """Old behaviour: every new message and every edit is a new POST, deletes are ignored"""
+    for action, _, text in events:
+        if action == 'delete':
+            continue
+        async with client.get_session().post(url, json=payload(text)) as response:
+            await response.read()
+
+async def run_mapped(events, url: str, reader):
+    for action, message_id, text in events:
+        item = {'action': action, 'url': url, 'source': [CHAT_ID, message_id]}
+        if text is not None:
+            item['payload'] = payload(text)
+        await reader.send_to_discord(PAIR, item)
+
+def report(name: str, fake: FakeDiscord, latest, elapsed: float):
+    shown = visible(fake)
+    stale = sum(1 for content in shown if content not in latest.values())
+    missing = sum(1 for content in latest.values() if content not in shown)
+    print(f"  {name:<16} requests {fake.requests:>4}  "
+          f"messages on Discord {len(shown):>4}  stale/deleted still shown {stale:>4}  "
+          f"latest missing {missing:>3}  {elapsed * 1000:7.1f} ms")
+
+def bench_store(directory: Path):
+    store = WebhookMessageStore(directory / 'store.db')
+    rng = random.Random(9)
+    start = time.perf_counter()
+    with store.conn:
+        store.conn.execute('BEGIN')
+        for i in range(STORE_ROWS):
+            store.add(f"pair_{i % 50}", CHAT_ID - i % 200, i, str(10 ** 17 + i))
+    inserted = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    hits = 0
+    for _ in range(STORE_LOOKUPS):
+        i = rng.randrange(STORE_ROWS * 2)
+        hits += store.get(f"pair_{i % 50}", CHAT_ID - i % 200, i) is not None
+    looked_up = time.perf_counter() - start
+    print(f"WebhookMessageStore with {STORE_ROWS:,} rows: {STORE_ROWS / inserted:,.0f} inserts/s (one transaction), "
+          f"{looked_up / STORE_LOOKUPS * 1e6:.1f} us per lookup ({hits / STORE_LOOKUPS:.0%} hits)")
+    store.close()
+
+async def main():
+    events = make_events()
+    latest = expected_state(events)
+    counts = {action: sum(1 for event in events if event[0] == action) for action in ('post', 'edit', 'delete')}
+    print(f"{counts['post']} messages, {counts['edit']} edits, {counts['delete']} deletes on one pair")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # main.py creates config/ and logs to logs/ under the working directory
+        os.chdir(tmp)
+        Path('logs').mkdir()
+        os.environ['DISCORD_GLOBAL_RATE'] = '100000'
+        import main as reader_main
+        logging.getLogger().setLevel(logging.WARNING)
+        
+        fake = FakeDiscord(limit=100000)
+        await fake.start()
+        start = time.perf_counter()
+        await run_repost(events, fake.webhook_url(), fake, reader_main.http_client)
+        report('re-post edits', fake, latest, time.perf_counter() - start)
+        await fake.stop()
+        
+        fake = FakeDiscord(limit=100000)
+        await fake.start()
+        reader = reader_main.TelegramMessageReader()
+        start = time.perf_counter()
+        await run_mapped(events, fake.webhook_url(), reader)
+        report('PATCH/DELETE', fake, latest, time.perf_counter() - start)
+        reader.webhook_messages.close()
+        await reader_main.webhook_scheduler.close()
+        await reader_main.http_client.close()
+        await fake.stop()
+        
+        bench_store(Path(tmp))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: RSS soak of the edit tracker over 10M synthetic edits vs the old lifetime dict
+Run from the telegram_reader directory: python benchmarks/bench_edit_tracker.py
+"""
+
+import multiprocessing
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from edit_tracker import MessageTracker
+
+EDITS = 10_000_000
+OLD_EDITS = 3_000_000
+REPORT_EVERY = 1_000_000
+CHATS = 2_000
+# Simulated clock: 2000 edits/s, so a 30 s window holds ~60k edits (below the 100k cap, expiry does the work)
+EDITS_PER_SECOND = 2_000
+WINDOW = 30.0
+MAX_ENTRIES = 100_000
+
+def rss_mb() -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def synthetic_edits(count: int):
+    """Mostly fresh messages across many chats, with some messages edited repeatedly"""
+    rng = random.Random(7)
+    next_id = 1
+    for i in range(count):
+        if rng.random() < 0.3 and next_id > 100:
+            message_id = next_id - rng.randrange(1, 20)
+        else:
+            message_id = next_id
+            next_id += 1
+        yield i / EDITS_PER_SECOND, -1000000000000 - message_id % CHATS, message_id
+
+def run_tracker():
+    tracker = MessageTracker(threshold=3, window=WINDOW, max_entries=MAX_ENTRIES)
+    print(f"MessageTracker (window {WINDOW:.0f}s, cap {MAX_ENTRIES})")
+    start = time.perf_counter()
+    flagged = 0
+    for i, (now, chat_id, message_id) in enumerate(synthetic_edits(EDITS), 1):
+        flagged += tracker.track_edit(chat_id, message_id, now=now)
+        if i % REPORT_EVERY == 0:
+            print(f"  {i // 1_000_000:>3}M edits  RSS {rss_mb():7.1f} MB  tracked {len(tracker):>7}  "
+                  f"{i / (time.perf_counter() - start) / 1e6:5.2f}M edits/s")
+    print(f"  flagged {flagged}  {tracker.stats()}")
+
+def run_old_dict():
+    """Old MessageTracker: lifetime count keyed by message id only"""
+    edit_counts = {}
+    print(f"old dict (lifetime counts, keyed by message id), first {OLD_EDITS // 1_000_000}M edits")
+    for i, (_, _, message_id) in enumerate(synthetic_edits(OLD_EDITS), 1):
+        edit_counts[message_id] = edit_counts.get(message_id, 0) + 1
+        if i % REPORT_EVERY == 0:
+            print(f"  {i // 1_000_000:>3}M edits  RSS {rss_mb():7.1f} MB  tracked {len(edit_counts):>7}")
+
+def main():
+    # Each run in its own process so RSS is not shared between them
+    context = multiprocessing.get_context('fork')
+    for target in (run_old_dict, run_tracker):
+        process = context.Process(target=target)
+        process.start()
+        process.join()
+
+if __name__ == "__main__":
+    main()
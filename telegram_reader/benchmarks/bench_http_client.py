@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: session-per-message vs pooled HttpClient against a local stub webhook
+Run from the telegram_reader directory: python benchmarks/bench_http_client.py [messages] [concurrency]
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from http_client import HttpClient
+
+PAYLOAD = {'content': 'x' * 200, 'username': 'AutoForwardX - bench'}
+
+async def start_stub_server():
+    """Minimal webhook stub that answers 204 like Discord"""
+    async def webhook(request):
+        await request.read()
+        return web.Response(status=204)
+    
+    app = web.Application()
+    app.router.add_post('/api/webhooks/{id}/{token}', webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/webhooks/1/token"
+
+async def send_fresh_session(url: str):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=PAYLOAD) as response:
+            await response.read()
+
+async def run_case(name: str, send, url: str, messages: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one():
+        async with semaphore:
+            await send(url)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(messages)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {messages / elapsed:>10.0f} msg/s  ({elapsed:.2f}s)")
+    return messages / elapsed
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    
+    runner, url = await start_stub_server()
+    client = HttpClient()
+    
+    async def send_pooled(target: str):
+        async with client.get_session().post(target, json=PAYLOAD) as response:
+            await response.read()
+    
+    try:
+        print(f"{messages} messages, concurrency {concurrency}")
+        before = await run_case('session per message', send_fresh_session, url, messages, concurrency)
+        after = await run_case('pooled HttpClient', send_pooled, url, messages, concurrency)
+        print(f"speedup: {after / before:.1f}x")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
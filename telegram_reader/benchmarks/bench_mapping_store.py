@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: whole-file JSON rewrite per mapping vs the SQLite WAL mapping store
+Run from the telegram_reader directory: python benchmarks/bench_mapping_store.py
+"""
+
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mapping_store import MappingStore
+
+EXISTING = 20000
+ADDS = 200
+
+def json_rewrite(workdir: Path) -> float:
+    """Old behaviour: add to the dict and dump the whole file with indent=2"""
+    path = workdir / 'message_mappings.json'
+    mappings = {
+        str(i): {'telegram_msg_id': str(i), 'pair_name': 'pair', 'timestamp': datetime.now().isoformat(),
+                 'edit_count': 0}
+        for i in range(EXISTING)
+    }
+    start = time.perf_counter()
+    for i in range(EXISTING, EXISTING + ADDS):
+        mappings[str(i)] = {'telegram_msg_id': str(i), 'pair_name': 'pair',
+                            'timestamp': datetime.now().isoformat(), 'edit_count': 0}
+        with open(path, 'w') as f:
+            json.dump(mappings, f, indent=2)
+    return time.perf_counter() - start
+
+def sqlite_store(workdir: Path) -> float:
+    store = MappingStore(workdir / 'message_mappings.db')
+    old = (datetime.now() - timedelta(days=8)).timestamp()
+    with store.conn:
+        store.conn.execute('BEGIN')
+        store.conn.executemany(
+            'INSERT INTO message_mappings VALUES (?, ?, ?, ?, 0)',
+            ((str(i), str(i), 'pair', old if i % 2 else time.time()) for i in range(EXISTING))
+        )
+    start = time.perf_counter()
+    for i in range(EXISTING, EXISTING + ADDS):
+        store.add(str(i), str(i), 'pair')
+    elapsed = time.perf_counter() - start
+    
+    cleanup_start = time.perf_counter()
+    removed = store.delete_before(datetime.now() - timedelta(days=7))
+    print(f"sqlite cleanup: removed {removed} rows in {(time.perf_counter() - cleanup_start) * 1000:.1f} ms")
+    store.close()
+    return elapsed
+
+def main():
+    print(f"{ADDS} new mappings on top of {EXISTING} existing")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = json_rewrite(Path(tmp))
+        store = sqlite_store(Path(tmp))
+    print(f"json rewrite: {legacy / ADDS * 1000:8.3f} ms/mapping")
+    print(f"sqlite WAL:   {store / ADDS * 1000:8.3f} ms/mapping  ({legacy / store:.0f}x faster)")
+
+if __name__ == "__main__":
+    main()
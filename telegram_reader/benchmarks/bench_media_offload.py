@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop lag while perceptual-hashing large images inline vs thread pool vs process pool
+Run from the telegram_reader directory: python benchmarks/bench_media_offload.py
+"""
+
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image
+
+from loop_lag import LoopLagMonitor
+from media_offload import MediaAnalyzer
+
+IMAGES = 16
+SIDE = 2400
+
+def make_images():
+    """Large PNGs: no JPEG draft shortcut, so decoding is the real cost"""
+    rng = np.random.default_rng(5)
+    images = []
+    for i in range(IMAGES):
+        gradient = np.linspace(0, 255, SIDE)[None, :] * np.linspace(0.2, 1.0, SIDE)[:, None]
+        noise = rng.integers(0, 40, (SIDE, SIDE))
+        pixels = ((gradient + noise + i * 7) % 256).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, 'PNG', compress_level=1)
+        images.append(buffer.getvalue())
+    return images
+
+async def run_mode(mode: str, images):
+    analyzer = MediaAnalyzer(mode=mode, workers=4, queue_size=8)
+    await analyzer.start()
+    monitor = LoopLagMonitor(interval=0.005)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    monitor.reset()
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(analyzer.perceptual_hashes(data) for data in images))
+    elapsed = time.perf_counter() - start
+    # Let the monitor wake up once more so a loop blocked until now is recorded
+    await asyncio.sleep(monitor.interval * 2)
+    
+    lag = monitor.stats()
+    await monitor.stop()
+    await analyzer.close()
+    print(f"{mode:<8} {elapsed:6.2f}s  {IMAGES / elapsed:5.1f} img/s  "
+          f"loop lag p99 {lag['p99_ms']:7.1f} ms  max {lag['max_ms']:7.1f} ms")
+    return results
+
+async def main():
+    images = make_images()
+    print(f"{IMAGES} PNGs of {SIDE}x{SIDE} (~{sum(map(len, images)) // IMAGES // 1024} KiB each), "
+          f"4 workers, queue 8")
+    baseline = await run_mode('inline', images)
+    for mode in ('thread', 'process'):
+        assert await run_mode(mode, images) == baseline, f"{mode} hashes differ"
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hash + second buffered download per upload vs one download spooled and streamed as multipart (fake Discord)
+Run from the telegram_reader directory: python benchmarks/bench_media_upload.py
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from telethon.tl import types
+
+from fake_discord import FakeDiscord
+
+MB = 1024 * 1024
+MESSAGES = 60
+PAIRS = 4
+CONCURRENT = 4
+# Simulated Telegram download speed per file
+DOWNLOAD_RATE = 40 * MB
+# The fake server accepts less than the reader's default limit, so the 413 fallback is exercised
+DISCORD_UPLOAD_LIMIT = 8 * MB
+SOURCE_BLOCK = os.urandom(MB)
+
+class FakeDownloadIter:
+    """Telethon download iterator stand-in: DOWNLOAD_RATE bytes/s in request_size chunks"""
+    
+    def __init__(self, client: 'FakeClient', size: int, request_size: int):
+        self.client = client
+        self.position = 0
+        self.size = size
+        self.request_size = request_size
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        if self.position >= self.size:
+            raise StopAsyncIteration
+        n = min(self.request_size, self.size - self.position)
+        offset = self.position % len(SOURCE_BLOCK)
+        self.position += n
+        self.client.bytes_downloaded += n
+        await asyncio.sleep(n / DOWNLOAD_RATE)
+        return SOURCE_BLOCK[offset:offset + n]
+    
+    async def close(self):
+        self.position = self.size
+
+class FakeClient:
+    def __init__(self):
+        self.bytes_downloaded = 0
+    
+    def iter_download(self, location, request_size: int = 128 * 1024, **kwargs):
+        return FakeDownloadIter(self, location.size, request_size)
+
+def make_messages(client: FakeClient):
+    """Mostly photos-as-files of 0.3-3 MB, some clips of 2-7 MB and a few videos near or over the upload limit"""
+    rng = random.Random(11)
+    messages = []
+    for message_id in range(1, MESSAGES + 1):
+        roll = rng.random()
+        if roll < 0.7:
+            size, mime_type, name = int(rng.uniform(0.3, 3) * MB), 'image/jpeg', f"chart_{message_id}.jpg"
+        elif roll < 0.9:
+            size, mime_type, name = int(rng.uniform(2, 7) * MB), 'video/mp4', f"clip_{message_id}.mp4"
+        elif roll < 0.95:
+            # Under the reader's 10 MB default but over what this server accepts: 413, then no file
+            size, mime_type, name = int(rng.uniform(8.5, 9.5) * MB), 'video/mp4', f"replay_{message_id}.mp4"
+        else:
+            size, mime_type, name = int(rng.uniform(12, 20) * MB), 'video/mp4', f"session_{message_id}.mp4"
+        document = types.Document(
+            id=message_id, access_hash=message_id, file_reference=b'', date=None, mime_type=mime_type,
+            size=size, dc_id=2, attributes=[types.DocumentAttributeFilename(name)]
+        )
+        messages.append(SimpleNamespace(
+            id=message_id, chat_id=-1001234567890, text=f"Signal {message_id}", entities=None,
+            date=datetime.now(), media=types.MessageMediaDocument(document=document), client=client
+        ))
+    return messages
+
+def make_pairs(reader_main, fake: FakeDiscord):
+    return [
+        reader_main.PairConfig(
+            pair_name=f"media_{index}", source_tg_channel='@media', discord_webhook=fake.webhook_url(index + 1),
+            destination_tg_channel='@dest', bot_token='', session='bench'
+        )
+        for index in range(PAIRS)
+    ]
+
+CHAT = SimpleNamespace(id=1234567890, username='media', title='Media Channel')
+
+async def run_twice(reader_main, messages, fake: FakeDiscord):
+    """Hash with the streamer, then download_media(bytes) again and upload that buffer"""
+    import aiohttp
+    reader = reader_main.TelegramMessageReader()
+    pairs = make_pairs(reader_main, fake)
+    
+    async def handle(message):
+        pair = pairs[message.id % PAIRS]
+        await reader.media_streamer.digest(message.client, message.media)
+        data = b''.join([chunk async for chunk in message.client.iter_download(message.media.document)])
+        form = aiohttp.FormData()
+        form.add_field('payload_json', '{"content": "%s"}' % message.text, content_type='application/json')
+        if len(data) <= reader.media_spool.upload_limit:
+            form.add_field('files[0]', data, filename=f"{message.id}.bin")
+        response = await reader_main.webhook_scheduler.execute(pair.pair_name, pair.discord_webhook, data=form)
+        if response.status == 413:
+            await reader_main.webhook_scheduler.execute(pair.pair_name, pair.discord_webhook,
+                                                         json={'content': message.text})
+    
+    await run_concurrently(messages, handle)
+    reader.webhook_messages.close()
+
+async def run_spooled(reader_main, messages, fake: FakeDiscord):
+    """The reader's path: one download hashes and spools, the outbox posts the file as multipart"""
+    reader = reader_main.TelegramMessageReader()
+    pairs = make_pairs(reader_main, fake)
+    await reader.outbox.start()
+    
+    async def handle(message):
+        pair = pairs[message.id % PAIRS]
+        message_data = await reader.process_message_content(message, CHAT, pair)
+        await reader.forward_to_discord(message_data, pair)
+    
+    await run_concurrently(messages, handle)
+    while reader.outbox.pending():
+        await asyncio.sleep(0.01)
+    await reader.outbox.close()
+    reader.webhook_messages.close()
+    return reader
+
+async def run_concurrently(messages, handle):
+    semaphore = asyncio.Semaphore(CONCURRENT)
+    
+    async def one(message):
+        async with semaphore:
+            await handle(message)
+    
+    await asyncio.gather(*(one(message) for message in messages))
+
+async def measure(name: str, run, reader_main, messages):
+    client = messages[0].client
+    client.bytes_downloaded = 0
+    fake = FakeDiscord(limit=100000, upload_limit=DISCORD_UPLOAD_LIMIT)
+    await fake.start()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await run(reader_main, messages, fake)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    files = sum(len(message['payload'].get('files') or []) for message in fake.delivered)
+    print(f"  {name:<28} {len(fake.delivered) / elapsed:6.1f} msg/s  uploaded {files:>2} files "
+          f"{fake.bytes_uploaded / MB / elapsed:6.1f} MB/s  downloaded {client.bytes_downloaded / MB:7.1f} MB  "
+          f"413s {fake.too_large}  peak Python memory {peak / MB:6.1f} MB")
+    await fake.stop()
+    return result
+
+async def main():
+    client = FakeClient()
+    messages = make_messages(client)
+    total = sum(message.media.document.size for message in messages)
+    print(f"{MESSAGES} media messages ({total / MB:.0f} MB) over {PAIRS} pairs, {CONCURRENT} at a time, "
+          f"Telegram at {DOWNLOAD_RATE // MB} MB/s, fake Discord upload limit {DISCORD_UPLOAD_LIMIT // MB} MB")
+    with tempfile.TemporaryDirectory() as tmp:
+        # main.py creates config/ and logs to logs/ under the working directory
+        os.chdir(tmp)
+        Path('logs').mkdir()
+        os.environ['DISCORD_GLOBAL_RATE'] = '100000'
+        os.environ['PERCEPTUAL_HASHING'] = 'false'
+        import main as reader_main
+        logging.getLogger().setLevel(logging.WARNING)
+        
+        await measure('hash, then download again', run_twice, reader_main, messages)
+        reader = await measure('one download, spooled', run_spooled, reader_main, messages)
+        print(f"spool: {reader.media_spool.stats()}  learned upload limits: {reader.upload_limits}")
+        await reader_main.webhook_scheduler.close()
+        await reader_main.http_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
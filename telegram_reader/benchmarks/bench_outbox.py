@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark: log-and-drop webhook posts vs the durable outbox against a flaky fake Discord
+Run from the telegram_reader directory: python benchmarks/bench_outbox.py
+"""
+
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from discord_webhook import WebhookScheduler
+from fake_discord import FakeDiscord
+from http_client import HttpClient
+from outbox import DeliveryError, Outbox, PermanentDeliveryError
+
+PAIRS = 4
+MESSAGES_PER_PAIR = 500
+FAILURE_RATE = 0.2
+# Discord answers 503 to everything for this long, starting OUTAGE_AT seconds into the run
+OUTAGE_AT = 0.5
+OUTAGE = 1.5
+SUBMIT_RATE = 1000.0
+COMMIT_MESSAGES = 5000
+COMMIT_SUBMITTERS = 50
+
+def make_sender(scheduler: WebhookScheduler):
+    async def send(pair_name: str, item):
+        response = await scheduler.execute(pair_name, item['url'], json=item['payload'])
+        if response.ok:
+            return
+        if response.status == 429 or response.status >= 500:
+            raise DeliveryError(f"{response.status}")
+        raise PermanentDeliveryError(f"{response.status}")
+    return send
+
+async def outage(fake: FakeDiscord):
+    await asyncio.sleep(OUTAGE_AT)
+    fake.down = True
+    await asyncio.sleep(OUTAGE)
+    fake.down = False
+
+async def produce(fake: FakeDiscord, deliver):
+    """Each pair emits messages at SUBMIT_RATE / PAIRS per second, in order, like a pipeline lane"""
+    async def lane(pair: int):
+        for seq in range(MESSAGES_PER_PAIR):
+            await deliver(f"pair{pair}", {'url': fake.webhook_url(pair + 1), 'payload': {'content': f"{pair}-{seq}"}})
+            await asyncio.sleep(PAIRS / SUBMIT_RATE)
+    await asyncio.gather(*(lane(pair) for pair in range(PAIRS)))
+
+def report(name: str, fake: FakeDiscord, elapsed: float, extra: str = ''):
+    total = PAIRS * MESSAGES_PER_PAIR
+    contents = [message['payload']['content'] for message in fake.delivered]
+    unique = set(contents)
+    in_order = all(
+        [int(c.split('-')[1]) for c in contents if c.startswith(f"{pair}-")] ==
+        sorted(int(c.split('-')[1]) for c in unique if c.startswith(f"{pair}-"))
+        for pair in range(PAIRS)
+    )
+    print(f"  {name:<22} delivered {len(unique):>4}/{total}  lost {total - len(unique):>4}  "
+          f"duplicates {len(contents) - len(unique):>3}  {len(unique) / elapsed:7.1f} delivered/s  "
+          f"in order {'yes' if in_order else 'no'}{extra}")
+
+async def run_direct(client: HttpClient):
+    """Old behaviour: one attempt through the scheduler, log and drop on failure"""
+    fake = FakeDiscord(limit=100000, failure_rate=FAILURE_RATE)
+    await fake.start()
+    scheduler = WebhookScheduler(client, global_rate=100000)
+    send = make_sender(scheduler)
+    
+    async def deliver(pair_name, item):
+        try:
+            await send(pair_name, item)
+        except Exception:
+            pass
+    
+    start = time.perf_counter()
+    await asyncio.gather(produce(fake, deliver), outage(fake))
+    report('log and drop', fake, time.perf_counter() - start)
+    await scheduler.close()
+    await fake.stop()
+
+async def run_outbox(client: HttpClient, directory: Path, restart: bool):
+    """Outbox delivery; with restart=True the process 'crashes' mid-outage and a new outbox replays"""
+    fake = FakeDiscord(limit=100000, failure_rate=FAILURE_RATE)
+    await fake.start()
+    scheduler = WebhookScheduler(client, global_rate=100000)
+    path = directory / f"outbox-{'restart' if restart else 'steady'}.db"
+    
+    def open_outbox():
+        outbox = Outbox(path, backoff_base=0.05, backoff_max=0.5, max_attempts=100)
+        outbox.register('discord', make_sender(scheduler))
+        return outbox
+    
+    box = {'outbox': open_outbox()}
+    await box['outbox'].start()
+    ready = asyncio.Event()
+    ready.set()
+    crash = {}
+    start = time.perf_counter()
+    
+    async def deliver(pair_name, item):
+        await ready.wait()
+        await box['outbox'].submit('discord', pair_name, item)
+    
+    async def crash_and_restart():
+        """Halfway through the outage: stop without draining and open a fresh outbox on the same file"""
+        await asyncio.sleep(OUTAGE_AT + OUTAGE / 2)
+        ready.clear()
+        old = box['outbox']
+        crash['left'] = old.pending()
+        crash['before'] = old.stats()
+        await old.close(timeout=0)
+        box['outbox'] = open_outbox()
+        await box['outbox'].start()
+        crash['replayed'] = box['outbox'].replayed
+        ready.set()
+    
+    tasks = [produce(fake, deliver), outage(fake)]
+    if restart:
+        tasks.append(crash_and_restart())
+    await asyncio.gather(*tasks)
+    outbox = box['outbox']
+    while outbox.pending():
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stats = outbox.stats()
+    commits = crash.get('before', stats)
+    await outbox.close()
+    
+    extra = (f"\n  {'':<22} submits {commits['enqueued']} in {commits['commits']} commits "
+             f"({commits['ops_per_commit']} ops/commit, {commits['avg_commit_ms']} ms each)  "
+             f"retried {stats['retried']}  dead {stats['dead']}")
+    if restart:
+        extra += f"  left at crash {crash['left']}  replayed {crash['replayed']}"
+    report('outbox + restart' if restart else 'outbox', fake, elapsed, extra)
+    await scheduler.close()
+    await fake.stop()
+
+async def run_commit_throughput(directory: Path, submitters: int):
+    """Submit rate with an instant sender: one awaiting submitter (a commit each) vs many (grouped commits)"""
+    outbox = Outbox(directory / f"outbox-commit-{submitters}.db")
+    
+    async def send(pair_name, item):
+        return None
+    
+    outbox.register('discord', send)
+    await outbox.start()
+    
+    async def submitter(index: int):
+        for seq in range(index, COMMIT_MESSAGES, submitters):
+            await outbox.submit('discord', f"pair{index % PAIRS}", {'content': f"{seq}"})
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(submitter(index) for index in range(submitters)))
+    elapsed = time.perf_counter() - start
+    await outbox.close()
+    stats = outbox.stats()
+    print(f"  {submitters:>3} submitter(s)  {COMMIT_MESSAGES / elapsed:8.0f} durable submits/s  "
+          f"{stats['commits']:>5} commits  {stats['ops_per_commit']:>6} ops/commit  delivered {stats['delivered']}")
+
+async def main():
+    print(f"{PAIRS} pairs x {MESSAGES_PER_PAIR} messages at {SUBMIT_RATE:.0f} msg/s, "
+          f"{FAILURE_RATE:.0%} random 503s, full outage {OUTAGE_AT}-{OUTAGE_AT + OUTAGE}s")
+    # Every retry logs a warning; only the summary lines matter here
+    logging.getLogger('outbox').setLevel(logging.CRITICAL)
+    client = HttpClient()
+    try:
+        await run_direct(client)
+        with tempfile.TemporaryDirectory() as tmp:
+            await run_outbox(client, Path(tmp), restart=False)
+            await run_outbox(client, Path(tmp), restart=True)
+            print(f"group commit (synchronous=FULL): {COMMIT_MESSAGES} submits, no-op sender")
+            await run_commit_throughput(Path(tmp), 1)
+            await run_commit_throughput(Path(tmp), COMMIT_SUBMITTERS)
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: Aho-Corasick PatternMatcher vs per-pattern substring loop
+Run from the telegram_reader directory: python benchmarks/bench_pattern_matcher.py
+"""
+
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pattern_matcher import BLOCKLIST_TRAP_TYPE, BUILTIN_TRAP_PATTERNS, build_trap_matcher
+
+PATTERN_COUNTS = [10, 100, 1000, 10000]
+MESSAGE_COUNT = 2000
+MESSAGE_WORDS = 60
+
+def random_word(rng: random.Random, min_len: int = 4, max_len: int = 10) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+def legacy_scan(text: str, blocked_text, trap_patterns):
+    """The previous detection path: blocklist loop, then trap pattern loop"""
+    text_lower = text.lower()
+    for blocked in blocked_text:
+        if blocked.lower() in text_lower:
+            return BLOCKLIST_TRAP_TYPE
+    text_lower = text_lower.strip()
+    for pattern, trap_type, _ in trap_patterns:
+        if pattern in text_lower:
+            return trap_type
+    return None
+
+def run(pattern_count: int, rng: random.Random):
+    blocked_text = [random_word(rng, 6, 12) for _ in range(pattern_count)]
+    # Signal-style messages without digits so the built-in '1' pattern does not short-circuit
+    messages = [
+        ' '.join(random_word(rng, 2, 8) for _ in range(MESSAGE_WORDS)).upper()
+        for _ in range(MESSAGE_COUNT)
+    ]
+    
+    start = time.perf_counter()
+    matcher = build_trap_matcher(blocked_text)
+    build_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    legacy_results = [legacy_scan(m, blocked_text, BUILTIN_TRAP_PATTERNS) for m in messages]
+    legacy_s = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    matcher_results = []
+    for message in messages:
+        hit = matcher.best_hit(message)
+        matcher_results.append(hit.trap_type if hit else None)
+    matcher_s = time.perf_counter() - start
+    
+    assert legacy_results == matcher_results, "matcher disagrees with legacy loop"
+    
+    print(f"{pattern_count:>7} | {build_ms:>9.1f} | "
+          f"{legacy_s / MESSAGE_COUNT * 1e6:>11.1f} | {matcher_s / MESSAGE_COUNT * 1e6:>12.1f} | "
+          f"{legacy_s / matcher_s:>6.1f}x")
+
+def main():
+    rng = random.Random(42)
+    print(f"{MESSAGE_COUNT} messages of {MESSAGE_WORDS} words each")
+    print(f"{'patterns':>7} | {'build ms':>9} | {'loop us/msg':>11} | {'match us/msg':>12} | speedup")
+    for count in PATTERN_COUNTS:
+        run(count, rng)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: near-duplicate lookup over 100k blocked perceptual hashes (multi-index vs linear scan)
+and hash robustness to recompression, rescaling and cropping
+Run from the telegram_reader directory: python benchmarks/bench_perceptual_hash.py
+"""
+
+import io
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from perceptual_hash import HASH_TYPES, PerceptualBlocklist, compute_hashes, hamming
+
+BLOCKED = 100_000
+QUERIES = 2000
+PHASH_RADIUS = 8
+DHASH_RADIUS = 10
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+def linear_match(entries, phash: int, dhash: int):
+    best = None
+    for entry in entries:
+        distance = hamming(phash, entry[0])
+        if distance <= PHASH_RADIUS and hamming(dhash, entry[1]) <= DHASH_RADIUS:
+            if best is None or distance < best:
+                best = distance
+    return best
+
+def bench_lookup():
+    rng = random.Random(7)
+    raw = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(BLOCKED)]
+    start = time.perf_counter()
+    blocklist = PerceptualBlocklist(
+        {'phash': format(p, '016x'), 'dhash': format(d, '016x'), 'md5': str(i)} for i, (p, d) in enumerate(raw)
+    )
+    print(f"index build: {BLOCKED} hashes in {time.perf_counter() - start:.2f}s")
+    
+    queries = []
+    for i in range(QUERIES):
+        if i % 2:
+            phash, dhash = rng.choice(raw)
+            queries.append((flip_bits(phash, rng.randint(0, PHASH_RADIUS), rng),
+                            flip_bits(dhash, rng.randint(0, DHASH_RADIUS), rng)))
+        else:
+            queries.append((rng.getrandbits(64), rng.getrandbits(64)))
+    
+    timings = []
+    found = 0
+    for phash, dhash in queries:
+        hashes = {'phash': format(phash, '016x'), 'dhash': format(dhash, '016x')}
+        start = time.perf_counter()
+        match = blocklist.match(hashes, PHASH_RADIUS, DHASH_RADIUS)
+        timings.append(time.perf_counter() - start)
+        found += match is not None
+    
+    timings.sort()
+    print(f"multi-index: {found}/{QUERIES} matched, mean {statistics.mean(timings) * 1e6:.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us, max {timings[-1] * 1e6:.0f} us")
+    
+    sample = queries[:100]
+    start = time.perf_counter()
+    linear_found = sum(linear_match(raw, p, d) is not None for p, d in sample)
+    linear = (time.perf_counter() - start) / len(sample)
+    index_found = sum(
+        blocklist.match({'phash': format(p, '016x'), 'dhash': format(d, '016x')}, PHASH_RADIUS, DHASH_RADIUS)
+        is not None for p, d in sample
+    )
+    assert linear_found == index_found, 'index and linear scan disagree'
+    print(f"linear scan: mean {linear * 1e6:.0f} us per query ({linear / statistics.mean(timings):.0f}x slower)")
+
+def sample_image(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, 640)[None, :] * np.linspace(0.3, 1.0, 480)[:, None]
+    image = Image.fromarray(gradient.astype(np.uint8)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.integers(0, 560), rng.integers(0, 400)
+        draw.ellipse((x, y, x + rng.integers(30, 120), y + rng.integers(30, 120)),
+                     fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+    draw.text((40, 40), "VIP SIGNAL 1.2345", fill=(255, 255, 255))
+    return image
+
+def encode(image: Image.Image, quality: int = 95) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+def bench_robustness():
+    original = sample_image(1)
+    blocked = compute_hashes(encode(original))
+    width, height = original.size
+    variants = {
+        'recompressed q40': encode(original, 40),
+        'rescaled 50%': encode(original.resize((width // 2, height // 2))),
+        'cropped 5%': encode(original.crop((width // 40, height // 40, width - width // 40, height - height // 40))),
+        'different image': encode(sample_image(2))
+    }
+    
+    start = time.perf_counter()
+    compute_hashes(variants['recompressed q40'])
+    print(f"\nhashing one 640x480 JPEG: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"{'variant':<18}" + ''.join(f"{name:>8}" for name in HASH_TYPES))
+    for name, data in variants.items():
+        hashes = compute_hashes(data)
+        distances = [hamming(int(hashes[t], 16), int(blocked[t], 16)) for t in HASH_TYPES]
+        print(f"{name:<18}" + ''.join(f"{d:>8}" for d in distances))
+
+if __name__ == "__main__":
+    bench_lookup()
+    bench_robustness()
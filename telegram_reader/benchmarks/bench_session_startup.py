@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sequential vs concurrent session startup against stub Telegram clients
+Run from the telegram_reader directory: python benchmarks/bench_session_startup.py
+"""
+
+import asyncio
+import random
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telethon.tl import types
+
+from session_startup import SessionStartup
+
+SESSIONS = 40
+SOURCES_PER_SESSION = 3
+# Scaled-down latencies: connect + auth per data center, one of them slow
+DC_CONNECT_SECONDS = {1: 0.08, 2: 0.1, 3: 0.12, 4: 0.6, 5: 0.09}
+RESOLVE_SECONDS = 0.03
+# Every source channel posts this often, so a session's first message follows soon after it is ready
+MESSAGE_INTERVAL = 0.05
+
+class StubClient:
+    """Just enough of TelegramClient for startup: start, entity lookup, handlers, updates"""
+    
+    def __init__(self, session_name: str, rng: random.Random):
+        self.dc_id = zlib.crc32(session_name.encode()) % len(DC_CONNECT_SECONDS) + 1
+        self.rng = rng
+        self.handlers = []
+        self.updates = None
+    
+    async def start(self):
+        await asyncio.sleep(DC_CONNECT_SECONDS[self.dc_id] * self.rng.uniform(0.8, 1.2))
+    
+    async def get_input_entity(self, lookup):
+        await asyncio.sleep(RESOLVE_SECONDS * self.rng.uniform(0.8, 1.2))
+        return types.InputPeerChannel(channel_id=zlib.crc32(str(lookup).encode()), access_hash=1)
+    
+    def add_event_handler(self, handler, event=None):
+        self.handlers.append(handler)
+        if self.updates is None:
+            self.updates = asyncio.create_task(self._emit())
+    
+    async def _emit(self):
+        while True:
+            await asyncio.sleep(MESSAGE_INTERVAL * self.rng.random())
+            for handler in self.handlers:
+                handler()
+    
+    async def disconnect(self):
+        if self.updates is not None:
+            self.updates.cancel()
+
+async def run_case(concurrency: int):
+    rng = random.Random(3)
+    # The stub factory ignores session configs
+    sessions = {f"session_{i}": None for i in range(SESSIONS)}
+    startup = SessionStartup(lambda name, config: StubClient(name, rng), concurrency=concurrency)
+    clients = {}
+    first_messages = asyncio.Event()
+    
+    async def connect(session_name, session_config):
+        sources = {f"@chan_{session_name}_{j}": f"chan_{session_name}_{j}" for j in range(SOURCES_PER_SESSION)}
+        client = await startup.start(session_name, session_config, sources)
+        clients[session_name] = client
+        
+        def on_message():
+            startup.first_message(session_name)
+            if all(t.first_message_at for t in startup.timings.values()):
+                first_messages.set()
+        client.add_event_handler(on_message)
+    
+    start = time.perf_counter()
+    await startup.run(sessions, connect)
+    ready = time.perf_counter() - start
+    await first_messages.wait()
+    for client in clients.values():
+        await client.disconnect()
+    
+    first = sorted(t['time_to_first_message_ms'] for t in startup.session_stats().values())
+    print(f"concurrency {concurrency:>3}  all ready {ready:6.2f}s  "
+          f"first message p50 {first[len(first) // 2] / 1000:6.2f}s  max {first[-1] / 1000:6.2f}s")
+
+async def main():
+    print(f"{SESSIONS} stub sessions, {SOURCES_PER_SESSION} sources each, "
+          f"connect {min(DC_CONNECT_SECONDS.values())}-{max(DC_CONNECT_SECONDS.values())}s per data center")
+    for concurrency in (1, 4, 8, 16):
+        await run_case(concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
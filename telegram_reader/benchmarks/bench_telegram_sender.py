@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: unpaced sendMessage vs TelegramSender against a flood-controlled fake Bot API
+Run from the telegram_reader directory: python benchmarks/bench_telegram_sender.py
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_telegram import FakeTelegram
+from http_client import HttpClient
+from telegram_sender import SendResult, TelegramSender
+
+MESSAGES = 40
+CHAT = '-100123'
+# Scaled-down Telegram limits so the run takes seconds: 5 msg/s per (bot, chat)
+CHAT_LIMIT = 5
+CHAT_WINDOW = 1.0
+TOKENS = ['111:aaa', '222:bbb', '333:ccc']
+
+async def naive(fake: FakeTelegram, client: HttpClient, tokens):
+    """Old behaviour: one POST per message with the first token, non-200 is final"""
+    async def send(i: int):
+        url = f"{fake.api_base}/bot{tokens[0]}/sendMessage"
+        async with client.get_session().post(url, json={'chat_id': CHAT, 'text': f"msg {i}"}) as response:
+            await response.read()
+            return response.status == 200
+    
+    results = await asyncio.gather(*(send(i) for i in range(MESSAGES)))
+    return sum(results), MESSAGES
+
+async def paced(fake: FakeTelegram, client: HttpClient, tokens, coalesce: bool):
+    sender = TelegramSender(client, api_base=fake.api_base, chat_rate_per_minute=CHAT_LIMIT * 60 / CHAT_WINDOW,
+                            chat_burst=CHAT_LIMIT, coalesce=coalesce)
+    results = await asyncio.gather(*(
+        sender.send_message(CHAT, f"msg {i}", list(tokens)) for i in range(MESSAGES)
+    ), return_exceptions=True)
+    stats = sender.stats()
+    await sender.close()
+    return sum(1 for r in results if isinstance(r, SendResult)), stats['requests_sent']
+
+async def run_case(name: str, runner, tokens, **kwargs):
+    fake = FakeTelegram(chat_limit=CHAT_LIMIT, chat_window=CHAT_WINDOW)
+    await fake.start()
+    client = HttpClient()
+    start = time.perf_counter()
+    try:
+        delivered, requests = await runner(fake, client, tokens, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        await client.close()
+        await fake.stop()
+    print(f"{name:<28} delivered {delivered:>3}/{MESSAGES}  requests {requests:>3}  "
+          f"429s {fake.rate_limited:>3}  {delivered / elapsed:>6.1f} msg/s")
+
+async def main():
+    print(f"{MESSAGES} messages to one chat, limit {CHAT_LIMIT}/{CHAT_WINDOW}s per bot per chat")
+    await run_case('naive, 1 token', naive, TOKENS[:1])
+    await run_case('paced, 1 token', paced, TOKENS[:1], coalesce=False)
+    await run_case('paced, 3 tokens', paced, TOKENS, coalesce=False)
+    await run_case('paced + coalesce, 1 token', paced, TOKENS[:1], coalesce=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one webhook post per message vs adaptive micro-batching for bursty signal channels (fake Discord)
+Run from the telegram_reader directory: python benchmarks/bench_webhook_batching.py
+"""
+
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_discord import FakeDiscord
+
+BURSTS = 12
+BURST_SIZE = (5, 10)
+BURST_SPREAD = 0.8
+BURST_GAP = 1.5
+# Discord allows about 5 webhook posts per 2 s; the fake uses the same shape
+LIMIT = 5
+WINDOW = 2.0
+CEILINGS_MS = (250, 1000)
+
+def burst_schedule():
+    """(send time, message id) for bursts of 5-10 messages spread over under a second"""
+    rng = random.Random(3)
+    schedule = []
+    message_id = 0
+    for burst in range(BURSTS):
+        start = burst * BURST_GAP
+        for offset in sorted(rng.uniform(0, BURST_SPREAD) for _ in range(rng.randint(*BURST_SIZE))):
+            message_id += 1
+            schedule.append((start + offset, message_id))
+    return schedule
+
+def message_data(message_id: int):
+    return {
+        'text': f"BUY XAUUSD @ {1900 + message_id} TP {1910 + message_id} SL {1890 + message_id}",
+        'message_id': message_id,
+        'chat_id': -1001234567890,
+        'edited': False,
+        'channel': 'signals',
+        'channel_title': 'VIP Signals',
+        'timestamp': datetime.now().isoformat(),
+        'has_media': False,
+        'formatting': {'entities': [], 'has_formatting': False}
+    }
+
+async def run_case(reader_main, name: str, ceiling_ms: int):
+    fake = FakeDiscord(limit=LIMIT, window=WINDOW)
+    await fake.start()
+    pair = reader_main.PairConfig(
+        pair_name=f"signals_{ceiling_ms}", source_tg_channel='@signals', discord_webhook=fake.webhook_url(),
+        destination_tg_channel='@dest', bot_token='', session='bench', batch_window_ms=ceiling_ms
+    )
+    reader = reader_main.TelegramMessageReader()
+    reader.pairs = [pair]
+    reader.rebuild_routing()
+    await reader.outbox.start()
+    
+    schedule = burst_schedule()
+    sent_at = {}
+    start = time.monotonic()
+    for at, message_id in schedule:
+        delay = start + at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent_at[message_id] = time.monotonic()
+        await reader.forward_to_discord(message_data(message_id), pair)
+    while reader.outbox.pending():
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - start
+    
+    latencies = []
+    for message in fake.delivered:
+        for embed in message['payload'].get('embeds') or []:
+            message_id = int(embed['footer']['text'].rsplit('ID: ', 1)[1])
+            latencies.append((message['received_at'] - sent_at[message_id]) * 1000)
+    latencies.sort()
+    print(f"  {name:<24} posts {len(fake.delivered):>3}  429s {fake.rate_limited:>3}  "
+          f"delivered {len(latencies):>3}/{len(schedule)}  latency p50 {statistics.median(latencies):7.0f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.0f} ms  max {latencies[-1]:7.0f} ms  "
+          f"done after {elapsed:5.1f} s")
+    
+    await reader.outbox.close()
+    reader.webhook_messages.close()
+    await fake.stop()
+
+async def main():
+    print(f"{BURSTS} bursts of {BURST_SIZE[0]}-{BURST_SIZE[1]} messages within {BURST_SPREAD}s, "
+          f"every {BURST_GAP}s; webhook limit {LIMIT} per {WINDOW}s")
+    with tempfile.TemporaryDirectory() as tmp:
+        # main.py creates config/ and logs to logs/ under the working directory
+        os.chdir(tmp)
+        Path('logs').mkdir()
+        import main as reader_main
+        logging.getLogger().setLevel(logging.WARNING)
+        # 429s are expected in the unbatched run; the scheduler retries them
+        logging.getLogger('discord_webhook').setLevel(logging.ERROR)
+        
+        await run_case(reader_main, 'one post per message', 0)
+        for ceiling_ms in CEILINGS_MS:
+            await run_case(reader_main, f"batched, ceiling {ceiling_ms} ms", ceiling_ms)
+        await reader_main.webhook_scheduler.close()
+        await reader_main.http_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: naive webhook POSTs vs WebhookScheduler against a rate-limited fake Discord
+Run from the telegram_reader directory: python benchmarks/bench_webhook_scheduler.py
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from discord_webhook import WebhookScheduler
+from fake_discord import FakeDiscord
+from http_client import HttpClient
+
+PAIRS = 3
+MESSAGES_PER_PAIR = 10
+LIMIT = 5
+WINDOW = 1.0
+
+async def naive(fake: FakeDiscord, client: HttpClient):
+    """Old behaviour: POST immediately, log and drop anything that is not a success"""
+    url = fake.webhook_url()
+    
+    async def send(pair: int, seq: int):
+        payload = {'content': f"pair{pair}-{seq}"}
+        async with client.get_session().post(url, json=payload) as response:
+            await response.read()
+            return response.status in (200, 204)
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        send(pair, seq) for seq in range(MESSAGES_PER_PAIR) for pair in range(PAIRS)
+    ))
+    return sum(results), time.perf_counter() - start
+
+async def scheduled(fake: FakeDiscord, client: HttpClient):
+    scheduler = WebhookScheduler(client, max_retries=10)
+    url = fake.webhook_url()
+    
+    async def pair_sender(pair: int):
+        ok = 0
+        for seq in range(MESSAGES_PER_PAIR):
+            response = await scheduler.execute(f"pair{pair}", url, json={'content': f"pair{pair}-{seq}"})
+            ok += response.ok
+        return ok
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(pair_sender(pair) for pair in range(PAIRS)))
+    elapsed = time.perf_counter() - start
+    await scheduler.close()
+    return sum(results), elapsed
+
+def fairness(fake: FakeDiscord) -> str:
+    """Largest lead any pair had over another at any point in delivery order"""
+    counts = [0] * PAIRS
+    worst = 0
+    for message in fake.delivered:
+        counts[int(message['payload']['content'][4:].split('-')[0])] += 1
+        worst = max(worst, max(counts) - min(counts))
+    return f"max lead {worst}"
+
+async def run_case(name: str, runner):
+    fake = FakeDiscord(limit=LIMIT, window=WINDOW)
+    await fake.start()
+    client = HttpClient()
+    try:
+        delivered, elapsed = await runner(fake, client)
+    finally:
+        await client.close()
+        await fake.stop()
+    total = PAIRS * MESSAGES_PER_PAIR
+    print(f"{name:<10} delivered {delivered:>3}/{total}  429s {fake.rate_limited:>3}  "
+          f"{delivered / elapsed:>5.2f} msg/s  {fairness(fake)}")
+
+async def main():
+    print(f"{PAIRS} pairs x {MESSAGES_PER_PAIR} messages on one webhook, "
+          f"limit {LIMIT}/{WINDOW}s (ceiling {LIMIT / WINDOW:.1f} msg/s)")
+    await run_case('naive', naive)
+    await run_case('scheduler', scheduled)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+"""
+Local fake Discord webhook server for benchmarks
+Enforces a fixed-window per-webhook limit and an optional global limit,
+answering with the same X-RateLimit-* headers and 429 bodies Discord uses
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+class FakeDiscord:
+    """aiohttp app emulating webhook execute/edit/delete with rate limits"""
+    
+    def __init__(self, limit: int = 5, window: float = 2.0, global_limit: Optional[int] = None,
+                 failure_rate: float = 0.0, latency: float = 0.0, seed: int = 1,
+                 upload_limit: Optional[int] = None, listener: Optional[Callable[[dict], Awaitable[None]]] = None):
+        self.limit = limit
+        self.window = window
+        self.global_limit = global_limit
+        self.failure_rate = failure_rate
+        self.latency = latency
+        # Largest accepted attachment; bigger uploads get 413 like on Discord
+        self.upload_limit = upload_limit
+        # Called (as a task) with every new message, like a gateway MESSAGE_CREATE for a bot
+        self.listener = listener
+        self._listener_tasks = set()
+        # Set to simulate an outage: every request gets a 503 until cleared
+        self.down = False
+        self.windows: Dict[str, List[float]] = {}
+        self.global_window: List[float] = [0.0, 0]
+        self.messages: Dict[str, dict] = {}
+        self.delivered: List[dict] = []
+        self.requests = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.too_large = 0
+        self.bytes_uploaded = 0
+        self._ids = itertools.count(1)
+        self._rng = random.Random(seed)
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+    
+    def _check_limits(self, route: str) -> Tuple[Optional[web.Response], Dict[str, str]]:
+        now = time.monotonic()
+        
+        if self.global_limit is not None:
+            started, count = self.global_window
+            if now - started >= 1.0:
+                self.global_window = [now, 0]
+                started, count = now, 0
+            if count >= self.global_limit:
+                self.rate_limited += 1
+                retry_after = round(1.0 - (now - started), 3)
+                return web.json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': True},
+                    status=429, headers={'X-RateLimit-Global': 'true', 'Retry-After': str(retry_after)}
+                ), {}
+            self.global_window[1] = count + 1
+        
+        started, count = self.windows.get(route, (now, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+        reset_after = max(0.0, self.window - (now - started))
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Bucket': f"bucket-{route}",
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}"
+        }
+        if count >= self.limit:
+            self.rate_limited += 1
+            headers['X-RateLimit-Remaining'] = '0'
+            headers['X-RateLimit-Scope'] = 'user'
+            return web.json_response(
+                {'message': 'You are being rate limited.', 'retry_after': round(reset_after, 3), 'global': False},
+                status=429, headers=headers
+            ), headers
+        self.windows[route] = [started, count + 1]
+        headers['X-RateLimit-Remaining'] = str(self.limit - count - 1)
+        return None, headers
+    
+    async def _prepare(self, request) -> Tuple[Optional[web.Response], Dict[str, str]]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.down or (self.failure_rate and self._rng.random() < self.failure_rate):
+            self.failed += 1
+            return web.Response(status=503, text='upstream unavailable'), {}
+        return self._check_limits(request.match_info['id'])
+    
+    async def execute(self, request):
+        rejected, headers = await self._prepare(request)
+        if rejected is not None:
+            return rejected
+        
+        if request.content_type.startswith('multipart/'):
+            payload = {'files': []}
+            reader = await request.multipart()
+            async for part in reader:
+                if part.filename:
+                    size = 0
+                    while True:
+                        chunk = await part.read_chunk()
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                    payload['files'].append({'filename': part.filename, 'size': size})
+                elif part.name == 'payload_json':
+                    payload.update(json.loads(await part.text()))
+                else:
+                    payload[part.name] = await part.text()
+            if self.upload_limit is not None and any(f['size'] > self.upload_limit for f in payload['files']):
+                self.too_large += 1
+                return web.json_response({'message': 'Request entity too large', 'code': 40005}, status=413)
+            self.bytes_uploaded += sum(f['size'] for f in payload['files'])
+        else:
+            payload = await request.json()
+        
+        message_id = str(next(self._ids))
+        message = {'id': message_id, 'payload': payload, 'route': request.match_info['id'], 'received_at': time.monotonic()}
+        self.messages[message_id] = message
+        self.delivered.append(message)
+        if self.listener is not None:
+            task = asyncio.create_task(self.listener(message))
+            self._listener_tasks.add(task)
+            task.add_done_callback(self._listener_tasks.discard)
+        
+        if request.query.get('wait') == 'true':
+            return web.json_response({'id': message_id}, headers=headers)
+        return web.Response(status=204, headers=headers)
+    
+    async def edit(self, request):
+        rejected, headers = await self._prepare(request)
+        if rejected is not None:
+            return rejected
+        message = self.messages.get(request.match_info['message_id'])
+        if message is None:
+            return web.json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        message['payload'] = await request.json()
+        message['edits'] = message.get('edits', 0) + 1
+        return web.json_response({'id': message['id']}, headers=headers)
+    
+    async def delete(self, request):
+        rejected, headers = await self._prepare(request)
+        if rejected is not None:
+            return rejected
+        if self.messages.pop(request.match_info['message_id'], None) is None:
+            return web.json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return web.Response(status=204, headers=headers)
+    
+    async def start(self) -> str:
+        """Start on an ephemeral localhost port and return the webhook base URL"""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/api/webhooks/{id}/{token}', self.execute)
+        app.router.add_patch('/api/webhooks/{id}/{token}/messages/{message_id}', self.edit)
+        app.router.add_delete('/api/webhooks/{id}/{token}/messages/{message_id}', self.delete)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/api/webhooks"
+        return self.base_url
+    
+    def webhook_url(self, webhook_id: int = 1) -> str:
+        return f"{self.base_url}/{webhook_id}/token{webhook_id}"
+    
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
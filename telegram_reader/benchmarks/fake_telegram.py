@@ -0,0 +1,89 @@
+"""
+Local fake Telegram Bot API server for benchmarks
+Enforces fixed-window limits per bot token and per (token, chat) and answers
+429 with parameters.retry_after like the real API
+"""
+
+import asyncio
+import itertools
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+class FakeTelegram:
+    """aiohttp app emulating sendMessage with flood control"""
+    
+    def __init__(self, chat_limit: int = 20, chat_window: float = 60.0, token_limit: int = 30,
+                 token_window: float = 1.0, unauthorized: Optional[List[Tuple[str, str]]] = None,
+                 latency: float = 0.0):
+        self.chat_limit = chat_limit
+        self.chat_window = chat_window
+        self.token_limit = token_limit
+        self.token_window = token_window
+        self.unauthorized = set(unauthorized or [])
+        self.latency = latency
+        self.windows: Dict[tuple, List[float]] = {}
+        self.sent: List[dict] = []
+        self.rate_limited = 0
+        self._ids = itertools.count(1)
+        self.runner: Optional[web.AppRunner] = None
+        self.api_base = ''
+    
+    def _hit(self, key: tuple, limit: int, window: float) -> Optional[float]:
+        """Count a request in a fixed window; return retry_after if over the limit"""
+        now = time.monotonic()
+        started, count = self.windows.get(key, (now, 0))
+        if now - started >= window:
+            started, count = now, 0
+        if count >= limit:
+            return window - (now - started)
+        self.windows[key] = [started, count + 1]
+        return None
+    
+    async def send_message(self, request):
+        token = request.match_info['token']
+        payload = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        chat_id = str(payload.get('chat_id'))
+        
+        if (token, chat_id) in self.unauthorized:
+            return web.json_response(
+                {'ok': False, 'error_code': 403, 'description': 'Forbidden: bot is not a member of the channel chat'},
+                status=403
+            )
+        
+        retry_after = (self._hit(('token', token), self.token_limit, self.token_window)
+                       or self._hit(('chat', token, chat_id), self.chat_limit, self.chat_window))
+        if retry_after is not None:
+            self.rate_limited += 1
+            seconds = max(1, math.ceil(retry_after))
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {seconds}",
+                'parameters': {'retry_after': seconds}
+            }, status=429)
+        
+        message_id = next(self._ids)
+        self.sent.append({'token': token, 'chat_id': chat_id, 'text': payload.get('text', ''),
+                          'message_id': message_id, 'received_at': time.monotonic()})
+        return web.json_response({'ok': True, 'result': {'message_id': message_id, 'chat': {'id': chat_id}}})
+    
+    async def start(self) -> str:
+        """Start on an ephemeral localhost port and return the API base URL"""
+        app = web.Application()
+        app.router.add_post('/bot{token}/sendMessage', self.send_message)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.api_base = f"http://127.0.0.1:{port}"
+        return self.api_base
+    
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
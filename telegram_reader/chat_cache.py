@@ -0,0 +1,165 @@
+"""
+Chat metadata cache for AutoForwardX
+Keeps the id/username/title of source chats per session, keyed by marked peer
+id, so the message hot path does not call get_chat() for every update
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from telethon import utils
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ChatInfo:
+    """The parts of a chat entity the reader uses; duck-types as the entity for routing"""
+    id: int
+    username: Optional[str]
+    title: Optional[str]
+    fetched_at: float
+    
+    @classmethod
+    def from_entity(cls, entity) -> 'ChatInfo':
+        return cls(
+            id=entity.id,
+            username=getattr(entity, 'username', None),
+            title=getattr(entity, 'title', None),
+            fetched_at=time.monotonic()
+        )
+
+class ChatCache:
+    """Per-session chat metadata with TTL refresh and LRU eviction
+    
+    Entries past their TTL are still served while a background refresh runs,
+    so an update never waits on the network for metadata the cache has seen.
+    """
+    
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('CHAT_CACHE_TTL', '3600'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('CHAT_CACHE_SIZE', '5000'))
+        self.sessions: Dict[str, 'OrderedDict[int, ChatInfo]'] = {}
+        self._refreshing: Set[Tuple[str, int]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+        self.saved_seconds = 0.0
+    
+    @property
+    def avg_fetch_seconds(self) -> float:
+        """Mean cost of one metadata round trip (misses, warm-up batches, refreshes)"""
+        return self.fetch_seconds / self.fetches if self.fetches else 0.0
+    
+    async def _fetch(self, fetch):
+        started = time.perf_counter()
+        try:
+            return await fetch
+        finally:
+            self.fetches += 1
+            self.fetch_seconds += time.perf_counter() - started
+    
+    def get(self, session_name: str, peer_id: Optional[int]) -> Optional[ChatInfo]:
+        entries = self.sessions.get(session_name)
+        if entries is None or peer_id is None:
+            return None
+        info = entries.get(peer_id)
+        if info is not None:
+            entries.move_to_end(peer_id)
+        return info
+    
+    def put(self, session_name: str, entity) -> ChatInfo:
+        info = ChatInfo.from_entity(entity)
+        peer_id = utils.get_peer_id(entity)
+        entries = self.sessions.setdefault(session_name, OrderedDict())
+        entries[peer_id] = info
+        entries.move_to_end(peer_id)
+        while self.max_entries and len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return info
+    
+    def invalidate(self, session_name: str, peer_id: int):
+        self.sessions.get(session_name, {}).pop(peer_id, None)
+    
+    def forget(self, session_name: str):
+        self.sessions.pop(session_name, None)
+    
+    async def chat_for(self, session_name: str, event) -> ChatInfo:
+        """Metadata for an update's chat: cached if possible, else fetched once via get_chat()"""
+        info = self.get(session_name, event.chat_id)
+        if info is not None:
+            self.hits += 1
+            # Credit the cache with what an average get_chat() miss costs
+            self.saved_seconds += self.avg_fetch_seconds
+            if self.ttl and time.monotonic() - info.fetched_at > self.ttl:
+                self.stale_hits += 1
+                self.refresh(session_name, event.client, event.chat_id)
+            return info
+        
+        self.misses += 1
+        return self.put(session_name, await self._fetch(event.get_chat()))
+    
+    async def warm(self, session_name: str, client, entities: Iterable[Any]) -> int:
+        """Fetch full entities for a session's sources in one batch at startup"""
+        entities = list(entities)
+        if not entities:
+            return 0
+        try:
+            fetched = await self._fetch(client.get_entity(entities))
+        except Exception as e:
+            logger.warning(f"Could not warm chat metadata for session {session_name}: {e}")
+            return 0
+        for entity in fetched:
+            self.put(session_name, entity)
+        return len(fetched)
+    
+    def refresh(self, session_name: str, client, peer_id: int):
+        """Re-fetch one chat in the background (title/username changed or TTL passed)"""
+        key = (session_name, peer_id)
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(session_name, client, peer_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _refresh(self, session_name: str, client, peer_id: int):
+        try:
+            self.put(session_name, await self._fetch(client.get_entity(peer_id)))
+            self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"Could not refresh chat {peer_id} for session {session_name}: {e}")
+            # Drop it rather than keep serving metadata that may be wrong
+            self.invalidate(session_name, peer_id)
+        finally:
+            self._refreshing.discard((session_name, peer_id))
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': sum(len(entries) for entries in self.sessions.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+            'evictions': self.evictions,
+            'avg_fetch_ms': round(self.avg_fetch_seconds * 1000, 2),
+            'saved_ms': round(self.saved_seconds * 1000, 1)
+        }
+    
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -5,10 +5,16 @@ Handles loading and validation of pairs, sessions, and blocklists
 
 import json
 import os
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
 
+from config_writer import ConfigWriter, atomic_write_json, file_lock
+from pattern_matcher import BLOCKLIST_TRAP_TYPE, PatternHit, PatternMatcher, build_trap_matcher
+from perceptual_hash import PerceptualBlocklist, PerceptualMatch
+
 @dataclass
 class PairConfig:
     pair_name: str
@@ -19,6 +25,9 @@ class PairConfig:
     session: str
     status: str = "active"
     enable_ai: bool = False
+    pipeline_workers: int = 0
+    batch_window_ms: int = 0
+    direct_telegram: bool = False
 
 @dataclass
 class SessionConfig:
@@ -29,8 +38,51 @@ class SessionConfig:
 
 @dataclass
 class BlocklistConfig:
-    global_blocklist: Dict[str, List[str]]
-    pair_blocklist: Dict[str, Dict[str, List[str]]]
+    global_blocklist: Dict[str, List[Any]]
+    pair_blocklist: Dict[str, Dict[str, List[Any]]]
+
+@dataclass
+class BlocklistSnapshot:
+    """Precompiled in-memory view of blocklist.json used on the message hot path"""
+    global_text: Tuple[str, ...] = ()
+    global_images: FrozenSet[str] = frozenset()
+    pair_text: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    pair_images: Dict[str, FrozenSet[str]] = field(default_factory=dict)
+    global_perceptual: PerceptualBlocklist = field(default_factory=PerceptualBlocklist)
+    pair_perceptual: Dict[str, PerceptualBlocklist] = field(default_factory=dict)
+    _matchers: Dict[str, PatternMatcher] = field(default_factory=dict, repr=False)
+    
+    @classmethod
+    def from_config(cls, blocklist: BlocklistConfig) -> "BlocklistSnapshot":
+        """Lowercase text patterns and index image hashes (exact and perceptual) once per reload"""
+        def compile_text(patterns: List[str]) -> Tuple[str, ...]:
+            return tuple(dict.fromkeys(p.lower() for p in patterns if p))
+        
+        pair_text = {}
+        pair_images = {}
+        pair_perceptual = {}
+        for pair_name, rules in blocklist.pair_blocklist.items():
+            pair_text[pair_name] = compile_text(rules.get("text", []))
+            pair_images[pair_name] = frozenset(rules.get("images", []))
+            if rules.get("perceptual"):
+                pair_perceptual[pair_name] = PerceptualBlocklist(rules["perceptual"])
+        
+        return cls(
+            global_text=compile_text(blocklist.global_blocklist.get("text", [])),
+            global_images=frozenset(blocklist.global_blocklist.get("images", [])),
+            pair_text=pair_text,
+            pair_images=pair_images,
+            global_perceptual=PerceptualBlocklist(blocklist.global_blocklist.get("perceptual", [])),
+            pair_perceptual=pair_perceptual
+        )
+    
+    def matcher_for(self, pair_name: str) -> PatternMatcher:
+        """Return the combined global + pair + built-in trap automaton for a pair"""
+        matcher = self._matchers.get(pair_name)
+        if matcher is None:
+            matcher = build_trap_matcher(self.global_text + self.pair_text.get(pair_name, ()))
+            self._matchers[pair_name] = matcher
+        return matcher
 
 class ConfigManager:
     """Manages configuration files and provides centralized access"""
@@ -43,6 +95,21 @@ class ConfigManager:
         self.sessions_file = self.config_dir / "sessions.json"
         self.blocklist_file = self.config_dir / "blocklist.json"
         
+        # Resident blocklist snapshot, reloaded only when the file changes on disk
+        self.blocklist_check_interval = float(os.getenv('BLOCKLIST_CHECK_INTERVAL', '1.0'))
+        self.blocklist_reload_count = 0
+        self.blocklist_last_reload: Optional[datetime] = None
+        self._blocklist_snapshot: Optional[BlocklistSnapshot] = None
+        self._blocklist_stamp: Optional[Tuple[int, int, int]] = None
+        self._blocklist_checked_at = 0.0
+        
+        # Hamming-distance thresholds for near-duplicate image matches (64-bit hashes)
+        self.phash_max_distance = int(os.getenv('PHASH_MAX_DISTANCE', '8'))
+        self.dhash_max_distance = int(os.getenv('DHASH_MAX_DISTANCE', '10'))
+        
+        # Status flips and blocklist additions are batched and written off the caller's thread
+        self.writer = ConfigWriter()
+        
         # Initialize default configs if files don't exist
         self._init_default_configs()
     
@@ -88,22 +155,31 @@ class ConfigManager:
             self._save_json(self.blocklist_file, default_blocklist)
     
     def _load_json(self, file_path: Path) -> dict:
-        """Load JSON file with error handling"""
+        """Load JSON file with error handling, including this process's not yet written updates"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                data = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError) as e:
             print(f"Error loading {file_path}: {e}")
-            return {}
+            data = {}
+        return self.writer.view(file_path, data)
     
     def _save_json(self, file_path: Path, data: dict):
-        """Save data to JSON file with error handling"""
+        """Replace a JSON file atomically (temp file + rename) under the cross-process lock"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with file_lock(file_path):
+                atomic_write_json(file_path, data)
         except Exception as e:
             print(f"Error saving {file_path}: {e}")
     
+    def _update_json(self, file_path: Path, mutate, default):
+        """Queue an in-place change; updates made close together share one write"""
+        return self.writer.update(file_path, mutate, default)
+    
+    def flush(self):
+        """Write queued updates now and stop the writer thread (on shutdown)"""
+        self.writer.close()
+    
     def get_pairs(self) -> List[PairConfig]:
         """Load and return all pair configurations"""
         pairs_data = self._load_json(self.pairs_file)
@@ -124,13 +200,14 @@ class ConfigManager:
     
     def update_pair_status(self, pair_name: str, status: str):
         """Update the status of a specific pair"""
-        pairs_data = self._load_json(self.pairs_file)
-        if isinstance(pairs_data, list):
-            for pair in pairs_data:
-                if pair.get("pair_name") == pair_name:
-                    pair["status"] = status
-                    break
-            self._save_json(self.pairs_file, pairs_data)
+        def set_status(pairs_data):
+            if isinstance(pairs_data, list):
+                for pair in pairs_data:
+                    if pair.get("pair_name") == pair_name:
+                        pair["status"] = status
+                        break
+        
+        self._update_json(self.pairs_file, set_status, [])
     
     def get_sessions(self) -> Dict[str, SessionConfig]:
         """Load and return all session configurations"""
@@ -149,10 +226,11 @@ class ConfigManager:
     
     def update_session_status(self, session_name: str, status: str):
         """Update the status of a specific session"""
-        sessions_data = self._load_json(self.sessions_file)
-        if session_name in sessions_data:
-            sessions_data[session_name]["status"] = status
-            self._save_json(self.sessions_file, sessions_data)
+        def set_status(sessions_data):
+            if session_name in sessions_data:
+                sessions_data[session_name]["status"] = status
+        
+        self._update_json(self.sessions_file, set_status, {})
     
     def get_blocklist(self) -> BlocklistConfig:
         """Load and return blocklist configuration"""
@@ -162,71 +240,113 @@ class ConfigManager:
             pair_blocklist=blocklist_data.get("pair_blocklist", {})
         )
     
+    def _blocklist_file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """Return (inode, mtime_ns, size) of blocklist.json, or None if missing"""
+        try:
+            st = os.stat(self.blocklist_file)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def get_blocklist_snapshot(self) -> BlocklistSnapshot:
+        """Return the resident blocklist snapshot, reloading it if the file changed"""
+        now = time.monotonic()
+        if (self._blocklist_snapshot is not None
+                and now - self._blocklist_checked_at < self.blocklist_check_interval):
+            return self._blocklist_snapshot
+        
+        self._blocklist_checked_at = now
+        stamp = self._blocklist_file_stamp()
+        if self._blocklist_snapshot is None or stamp != self._blocklist_stamp:
+            self._blocklist_snapshot = BlocklistSnapshot.from_config(self.get_blocklist())
+            self._blocklist_stamp = stamp
+            self.blocklist_reload_count += 1
+            self.blocklist_last_reload = datetime.now()
+        
+        return self._blocklist_snapshot
+    
+    def get_blocklist_version(self) -> int:
+        """Counter that changes whenever a new blocklist snapshot is loaded"""
+        self.get_blocklist_snapshot()
+        return self.blocklist_reload_count
+    
+    def invalidate_blocklist(self):
+        """Force the next lookup to reload blocklist.json from disk"""
+        self._blocklist_snapshot = None
+    
+    def get_blocklist_stats(self) -> Dict[str, Any]:
+        """Return reload counter and last reload time of the blocklist snapshot"""
+        return {
+            'reload_count': self.blocklist_reload_count,
+            'last_reload': self.blocklist_last_reload.isoformat() if self.blocklist_last_reload else None
+        }
+    
     def add_blocked_text(self, text: str, pair_name: Optional[str] = None):
         """Add text to blocklist (global or pair-specific)"""
-        blocklist_data = self._load_json(self.blocklist_file)
-        
-        if pair_name:
-            # Add to pair-specific blocklist
-            if pair_name not in blocklist_data.get("pair_blocklist", {}):
-                blocklist_data.setdefault("pair_blocklist", {})[pair_name] = {"text": [], "images": []}
-            if text not in blocklist_data["pair_blocklist"][pair_name]["text"]:
-                blocklist_data["pair_blocklist"][pair_name]["text"].append(text)
-        else:
-            # Add to global blocklist
-            if text not in blocklist_data.get("global_blocklist", {}).get("text", []):
-                blocklist_data.setdefault("global_blocklist", {}).setdefault("text", []).append(text)
-        
-        self._save_json(self.blocklist_file, blocklist_data)
-    
-    def add_blocked_image(self, image_hash: str, pair_name: Optional[str] = None):
-        """Add image hash to blocklist (global or pair-specific)"""
-        blocklist_data = self._load_json(self.blocklist_file)
+        def add(blocklist_data):
+            if pair_name:
+                # Add to pair-specific blocklist
+                if pair_name not in blocklist_data.get("pair_blocklist", {}):
+                    blocklist_data.setdefault("pair_blocklist", {})[pair_name] = {"text": [], "images": []}
+                if text not in blocklist_data["pair_blocklist"][pair_name]["text"]:
+                    blocklist_data["pair_blocklist"][pair_name]["text"].append(text)
+            else:
+                # Add to global blocklist
+                if text not in blocklist_data.get("global_blocklist", {}).get("text", []):
+                    blocklist_data.setdefault("global_blocklist", {}).setdefault("text", []).append(text)
         
-        if pair_name:
-            # Add to pair-specific blocklist
-            if pair_name not in blocklist_data.get("pair_blocklist", {}):
-                blocklist_data.setdefault("pair_blocklist", {})[pair_name] = {"text": [], "images": []}
-            if image_hash not in blocklist_data["pair_blocklist"][pair_name]["images"]:
-                blocklist_data["pair_blocklist"][pair_name]["images"].append(image_hash)
-        else:
-            # Add to global blocklist
-            if image_hash not in blocklist_data.get("global_blocklist", {}).get("images", []):
-                blocklist_data.setdefault("global_blocklist", {}).setdefault("images", []).append(image_hash)
+        self._update_json(self.blocklist_file, add, {})
+        self.invalidate_blocklist()
+    
+    def add_blocked_image(self, image_hash: str, pair_name: Optional[str] = None,
+                          perceptual: Optional[Dict[str, str]] = None):
+        """Add image hash (and optional perceptual hashes) to blocklist (global or pair-specific)"""
+        def add(blocklist_data):
+            if pair_name:
+                # Add to pair-specific blocklist
+                if pair_name not in blocklist_data.get("pair_blocklist", {}):
+                    blocklist_data.setdefault("pair_blocklist", {})[pair_name] = {"text": [], "images": []}
+                rules = blocklist_data["pair_blocklist"][pair_name]
+            else:
+                # Add to global blocklist
+                rules = blocklist_data.setdefault("global_blocklist", {})
+            
+            if image_hash not in rules.setdefault("images", []):
+                rules["images"].append(image_hash)
+            if perceptual and not any(e.get("md5") == image_hash for e in rules.get("perceptual", [])):
+                rules.setdefault("perceptual", []).append({"md5": image_hash, **perceptual})
         
-        self._save_json(self.blocklist_file, blocklist_data)
+        self._update_json(self.blocklist_file, add, {})
+        self.invalidate_blocklist()
     
     def is_text_blocked(self, text: str, pair_name: str) -> bool:
         """Check if text is blocked (global or pair-specific)"""
-        blocklist = self.get_blocklist()
-        
-        # Check global blocklist
-        for blocked_text in blocklist.global_blocklist.get("text", []):
-            if blocked_text.lower() in text.lower():
-                return True
-        
-        # Check pair-specific blocklist
-        pair_blocklist = blocklist.pair_blocklist.get(pair_name, {})
-        for blocked_text in pair_blocklist.get("text", []):
-            if blocked_text.lower() in text.lower():
-                return True
-        
-        return False
+        hit = self.get_blocklist_snapshot().matcher_for(pair_name).best_hit(text)
+        return hit is not None and hit.trap_type == BLOCKLIST_TRAP_TYPE
+    
+    def match_text(self, text: str, pair_name: str) -> List[PatternHit]:
+        """Scan text once against blocklist and built-in trap patterns for a pair"""
+        return self.get_blocklist_snapshot().matcher_for(pair_name).find_all(text)
     
     def is_image_blocked(self, image_hash: str, pair_name: str) -> bool:
         """Check if image hash is blocked (global or pair-specific)"""
-        blocklist = self.get_blocklist()
-        
-        # Check global blocklist
-        if image_hash in blocklist.global_blocklist.get("images", []):
-            return True
+        blocklist = self.get_blocklist_snapshot()
         
-        # Check pair-specific blocklist
-        pair_blocklist = blocklist.pair_blocklist.get(pair_name, {})
-        if image_hash in pair_blocklist.get("images", []):
+        if image_hash in blocklist.global_images:
             return True
         
-        return False
+        return image_hash in blocklist.pair_images.get(pair_name, frozenset())
+    
+    def match_perceptual(self, hashes: Dict[str, str], pair_name: str) -> Optional[PerceptualMatch]:
+        """Find a blocked image (global or pair-specific) that these perceptual hashes are near"""
+        blocklist = self.get_blocklist_snapshot()
+        for index in (blocklist.global_perceptual, blocklist.pair_perceptual.get(pair_name)):
+            if index is None:
+                continue
+            match = index.match(hashes, self.phash_max_distance, self.dhash_max_distance)
+            if match is not None:
+                return match
+        return None
 
 # Global config manager instance
 config_manager = ConfigManager()
\ No newline at end of file
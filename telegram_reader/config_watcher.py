@@ -0,0 +1,96 @@
+"""
+Config file watcher for AutoForwardX
+Polls pairs.json, sessions.json and blocklist.json so a running reader picks up
+changes (admin bot, auto-pause, manual edits) without a restart, and diffs
+named config entries so changes can be applied incrementally
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+def file_stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    """(inode, mtime_ns, size) of a file, or None if it is missing; a rename-replace changes the inode"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+@dataclass
+class ConfigDiff:
+    """Names added, removed and changed between two {name: config} mappings"""
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+    
+    def summary(self) -> str:
+        return f"+{len(self.added)} -{len(self.removed)} ~{len(self.changed)}"
+
+def diff_named(old: Dict[str, Any], new: Dict[str, Any]) -> ConfigDiff:
+    """Compare config entries by name; entries are dataclasses, so == compares every field"""
+    return ConfigDiff(
+        added=[name for name in new if name not in old],
+        removed=[name for name in old if name not in new],
+        changed=[name for name in new if name in old and new[name] != old[name]]
+    )
+
+class ConfigWatcher:
+    """Poll config files and report the ones that changed
+    
+    A change is only reported once the file's stamp has been the same for two
+    polls in a row, so a file caught halfway through being written is not read.
+    """
+    
+    def __init__(self, paths: Iterable[Path], on_change: Callable[[Set[Path]], None],
+                 interval: Optional[float] = None):
+        self.paths = [Path(path) for path in paths]
+        self.on_change = on_change
+        self.interval = interval if interval is not None else float(os.getenv('CONFIG_WATCH_INTERVAL', '1.0'))
+        self.changes = 0
+        self._applied: Dict[Path, Optional[Tuple[int, int, int]]] = {}
+        self._seen: Dict[Path, Optional[Tuple[int, int, int]]] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if not self.interval or self._task is not None:
+            return
+        for path in self.paths:
+            self._applied[path] = self._seen[path] = file_stamp(path)
+        self._task = asyncio.create_task(self._run(), name="config-watcher")
+    
+    def poll(self) -> Set[Path]:
+        settled = set()
+        for path in self.paths:
+            stamp = file_stamp(path)
+            if stamp != self._applied[path] and stamp == self._seen[path]:
+                settled.add(path)
+                self._applied[path] = stamp
+            self._seen[path] = stamp
+        return settled
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                self.changes += 1
+                logger.info(f"🔁 Config files changed: {sorted(path.name for path in changed)}")
+                try:
+                    self.on_change(changed)
+                except Exception as e:
+                    logger.error(f"Error applying config change: {e}")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,167 @@
+"""
+Atomic, coalesced JSON config writes for AutoForwardX
+Read-modify-write under an exclusive lock shared by every process that writes
+the same file, temp file + rename so readers never see a half-written file,
+and updates made in quick succession folded into one write on a background thread
+"""
+
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes stay atomic, only the cross-process lock is lost
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive advisory lock on <file>.lock, held across read-modify-write"""
+    lock_path = path.with_name(path.name + '.lock')
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def atomic_write_json(path: Path, data: Any):
+    """Write to a temp file in the same directory, fsync it, then rename it over the target"""
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def read_json(path: Path, default: Any) -> Any:
+    """Parse a JSON file; a missing file gives the default, a corrupt one raises"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return copy.deepcopy(default)
+
+Mutation = Callable[[Any], None]
+
+class ConfigWriter:
+    """Batches in-place mutations of JSON config files
+    
+    update() queues a mutation and returns at once. After `delay` seconds a
+    background thread takes the lock, re-reads the file, applies every
+    mutation queued for it meanwhile and writes the result once. Mutations are
+    re-applied to whatever is on disk at that point, so changes made by other
+    processes in between are kept. view() applies pending mutations to a fresh
+    read, so the writing process sees its own updates straight away.
+    """
+    
+    def __init__(self, delay: Optional[float] = None):
+        self.delay = delay if delay is not None else float(os.getenv('CONFIG_WRITE_DELAY', '0.05'))
+        self._lock = threading.Lock()
+        self._pending: Dict[Path, List[Tuple[Mutation, Any, Future]]] = {}
+        # Taken off _pending but not on disk yet: view() must still apply these
+        self._writing: Dict[Path, List[Tuple[Mutation, Any, Future]]] = {}
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='config-writer')
+        
+        self.updates = 0
+        self.writes = 0
+        self.failed = 0
+        self.write_seconds = 0.0
+    
+    def update(self, path: Path, mutate: Mutation, default: Any = None) -> Future:
+        """Queue mutate(data) for path; the future resolves once it is on disk"""
+        future: Future = Future()
+        with self._lock:
+            self.updates += 1
+            batch = self._pending.setdefault(path, [])
+            batch.append((mutate, default, future))
+            if len(batch) == 1:
+                self._executor.submit(self._flush_later, path)
+        return future
+    
+    def view(self, path: Path, data: Any) -> Any:
+        """data (as read from path) with the mutations still waiting to be written applied"""
+        with self._lock:
+            batch = self._writing.get(path, []) + self._pending.get(path, [])
+        if not batch:
+            return data
+        data = copy.deepcopy(data)
+        for mutate, _, _ in batch:
+            mutate(data)
+        return data
+    
+    def _flush_later(self, path: Path):
+        if self.delay:
+            time.sleep(self.delay)
+        self.flush(path)
+    
+    def flush(self, path: Optional[Path] = None):
+        """Write pending mutations now (all files if path is None); runs on the caller's thread"""
+        with self._lock:
+            paths = [path] if path is not None else list(self._pending)
+            batches = [(p, self._pending.pop(p, [])) for p in paths]
+            for target, batch in batches:
+                if batch:
+                    self._writing[target] = self._writing.get(target, []) + batch
+        
+        for target, batch in batches:
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                with file_lock(target):
+                    data = read_json(target, batch[0][1])
+                    for mutate, _, _ in batch:
+                        mutate(data)
+                    atomic_write_json(target, data)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error saving {target}: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self.write_seconds += time.perf_counter() - started
+                with self._lock:
+                    written = {id(future) for _, _, future in batch}
+                    writing = [item for item in self._writing.get(target, []) if id(item[2]) not in written]
+                    if writing:
+                        self._writing[target] = writing
+                    else:
+                        self._writing.pop(target, None)
+            self.writes += 1
+            for _, _, future in batch:
+                future.set_result(None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'updates': self.updates,
+            'writes': self.writes,
+            'failed': self.failed,
+            'updates_per_write': round(self.updates / self.writes, 2) if self.writes else 0.0,
+            'avg_write_ms': round(self.write_seconds / self.writes * 1000, 2) if self.writes else 0.0
+        }
+    
+    def close(self):
+        """Finish queued writes and stop the writer thread"""
+        self._executor.shutdown(wait=True)
+        self.flush()
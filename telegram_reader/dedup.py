@@ -0,0 +1,171 @@
+"""
+Duplicate suppression for AutoForwardX
+Digests a message's normalized text and media id and remembers recent digests
+per destination, so crossposts and no-op edits are dropped before any download
+or webhook call
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from telethon.tl import types
+
+from media_cache import media_key
+
+def normalize_text(text: Optional[str]) -> str:
+    """Collapse every run of whitespace to one space and trim the ends"""
+    return ' '.join((text or '').split())
+
+def media_identity(media) -> Optional[str]:
+    """What makes this media distinct without downloading anything, or None if unknown
+    
+    Photos and documents go by their Telegram id (the access hash is per
+    account, so it is left out); locations, polls, contacts and dice by their
+    own fields. A link preview adds nothing the message text does not hold.
+    """
+    key = media_key(media)
+    if key:
+        return key.rsplit(':', 1)[0]
+    if isinstance(media, types.MessageMediaWebPage):
+        return 'webpage'
+    if isinstance(media, types.MessageMediaVenue) and isinstance(media.geo, types.GeoPoint):
+        return f"venue:{media.geo.lat}:{media.geo.long}:{media.title}:{media.address}"
+    if isinstance(media, (types.MessageMediaGeo, types.MessageMediaGeoLive)) and isinstance(media.geo, types.GeoPoint):
+        return f"geo:{media.geo.lat}:{media.geo.long}"
+    if isinstance(media, types.MessageMediaPoll):
+        return f"poll:{media.poll.id}"
+    if isinstance(media, types.MessageMediaContact):
+        return f"contact:{media.phone_number}:{media.user_id}:{media.first_name}:{media.last_name}"
+    if isinstance(media, types.MessageMediaDice):
+        return f"dice:{media.emoticon}:{media.value}"
+    return None
+
+def content_digest(text: Optional[str], media=None) -> Optional[bytes]:
+    """16-byte digest of normalized text + media identity
+    
+    None for an empty message, and for media whose identity is unknown, since
+    different media of the same kind must not be mistaken for duplicates.
+    """
+    if media is not None:
+        media_part = media_identity(media)
+        if media_part is None:
+            return None
+    else:
+        media_part = ''
+    normalized = normalize_text(text)
+    if not normalized and not media_part:
+        return None
+    return hashlib.blake2b(f"{normalized}\0{media_part}".encode('utf-8'), digest_size=16).digest()
+
+class DuplicateFilter:
+    """Per-destination set of digests forwarded within the last `window` seconds
+    
+    A digest's time is when it was first forwarded and is not refreshed by
+    duplicates, so content that legitimately repeats gets through again once a
+    window has passed. Each destination keeps an insertion-ordered dict: expired
+    digests are popped from the front, and the oldest go first once
+    `max_entries` is reached.
+    
+    Edits are compared with the latest content of the same source message
+    rather than with the destination's set, because forwarded edits now replace
+    the earlier post: an edit back to earlier text must go out, and one that
+    changes nothing must not.
+    """
+    
+    def __init__(self, window: Optional[float] = None, max_entries: Optional[int] = None):
+        self.window = window if window is not None else float(os.getenv('DEDUP_WINDOW', '3600'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('DEDUP_MAX_ENTRIES', '10000'))
+        self.destinations: Dict[str, 'OrderedDict[bytes, float]'] = {}
+        # (chat_id, message_id) -> (latest digest, first seen), per destination
+        self.sources: Dict[str, 'OrderedDict[Tuple[int, int], Tuple[bytes, float]]'] = {}
+        self.suppressed: Dict[str, int] = {}
+        
+        self.checked = 0
+        self.evicted = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_entries > 0
+    
+    def _expire(self, seen: 'OrderedDict[bytes, float]', now: float):
+        cutoff = now - self.window
+        while seen:
+            digest = next(iter(seen))
+            if seen[digest] >= cutoff:
+                break
+            del seen[digest]
+    
+    def _expire_sources(self, latest: 'OrderedDict[Tuple[int, int], Tuple[bytes, float]]', now: float):
+        cutoff = now - self.window
+        while latest:
+            source = next(iter(latest))
+            if latest[source][1] >= cutoff:
+                break
+            del latest[source]
+    
+    def _remember(self, seen: 'OrderedDict[bytes, float]', digest: bytes, now: float):
+        seen[digest] = now
+        if len(seen) > self.max_entries:
+            seen.popitem(last=False)
+            self.evicted += 1
+    
+    def is_duplicate(self, destination: str, digest: Optional[bytes], pair_name: str,
+                     source: Optional[Tuple[int, int]] = None, edited: bool = False,
+                     now: Optional[float] = None) -> bool:
+        """Record digest for destination; True (and counted against pair_name) if it was already there
+        
+        source is the message's (chat_id, message_id); with edited=True a
+        message seen before is only a duplicate if its content did not change.
+        """
+        if digest is None or not self.enabled:
+            return False
+        now = time.monotonic() if now is None else now
+        self.checked += 1
+        
+        seen = self.destinations.get(destination)
+        if seen is None:
+            seen = self.destinations[destination] = OrderedDict()
+        self._expire(seen, now)
+        
+        if source is not None:
+            latest = self.sources.get(destination)
+            if latest is None:
+                latest = self.sources[destination] = OrderedDict()
+            self._expire_sources(latest, now)
+            previous = latest.get(source)
+            if edited and previous is not None:
+                if previous[0] == digest:
+                    self.suppressed[pair_name] = self.suppressed.get(pair_name, 0) + 1
+                    return True
+                latest[source] = (digest, previous[1])
+                if digest not in seen:
+                    self._remember(seen, digest, now)
+                return False
+        
+        if digest in seen:
+            self.suppressed[pair_name] = self.suppressed.get(pair_name, 0) + 1
+            return True
+        self._remember(seen, digest, now)
+        if source is not None:
+            latest[source] = (digest, now)
+            if len(latest) > self.max_entries:
+                latest.popitem(last=False)
+        return False
+    
+    def forget(self, destination: str):
+        """Drop a destination that no pair uses any more"""
+        self.destinations.pop(destination, None)
+        self.sources.pop(destination, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'checked': self.checked,
+            'suppressed': sum(self.suppressed.values()),
+            'by_pair': dict(self.suppressed),
+            'digests': sum(len(seen) for seen in self.destinations.values()),
+            'destinations': len(self.destinations),
+            'evicted': self.evicted
+        }
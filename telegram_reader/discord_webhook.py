@@ -0,0 +1,261 @@
+"""
+Discord webhook scheduler for AutoForwardX
+Tracks per-webhook rate-limit buckets and the global limit, delays sends
+pre-emptively and shares each webhook fairly between the pairs that use it
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from http_client import HttpClient, http_client
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class WebhookResponse:
+    """Outcome of a scheduled webhook request"""
+    status: int
+    text: str = ''
+    data: Optional[Any] = None
+    attempts: int = 1
+    
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+@dataclass
+class RateLimitBucket:
+    """State of one Discord rate-limit bucket, updated from X-RateLimit-* headers"""
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset_at: float = 0.0
+    bucket_id: Optional[str] = None
+    
+    def delay(self, now: float) -> float:
+        if self.remaining is not None and self.remaining <= 0 and now < self.reset_at:
+            return self.reset_at - now
+        return 0.0
+    
+    def update(self, headers, now: float):
+        if 'X-RateLimit-Bucket' in headers:
+            self.bucket_id = headers['X-RateLimit-Bucket']
+        if 'X-RateLimit-Limit' in headers:
+            self.limit = int(headers['X-RateLimit-Limit'])
+        if 'X-RateLimit-Remaining' in headers:
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+        if 'X-RateLimit-Reset-After' in headers:
+            self.reset_at = now + float(headers['X-RateLimit-Reset-After'])
+    
+    def consume(self, now: float):
+        """Account for a request about to be sent"""
+        if now >= self.reset_at and self.limit is not None:
+            self.remaining = self.limit
+        if self.remaining is not None:
+            self.remaining -= 1
+
+@dataclass
+class _WebhookJob:
+    pair_name: str
+    method: str
+    url: str
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    attempts: int = 0
+
+@dataclass
+class _WebhookRoute:
+    """Per-webhook queues (one per pair) served round-robin by a single dispatcher"""
+    bucket: RateLimitBucket = field(default_factory=RateLimitBucket)
+    queues: Dict[str, Deque[_WebhookJob]] = field(default_factory=OrderedDict)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+    sent: int = 0
+    rate_limited: int = 0
+
+def webhook_route_key(url: str) -> str:
+    """Rate-limit key for a webhook URL: /api/webhooks/{id}/{token}, ignoring sub-paths"""
+    parts = urlsplit(url).path.rstrip('/').split('/')
+    try:
+        index = parts.index('webhooks')
+        return '/'.join(parts[index:index + 3])
+    except ValueError:
+        return url
+
+def webhook_message_url(url: str, message_id: str) -> str:
+    """Edit/delete URL for a message posted through a webhook, keeping any query (thread_id)"""
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=f"{parts.path.rstrip('/')}/messages/{message_id}"))
+
+def with_wait(url: str) -> str:
+    """Execute URL that makes Discord return the created message (and its id)"""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query['wait'] = 'true'
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+class WebhookScheduler:
+    """Send Discord webhook requests without bouncing off 429s"""
+    
+    def __init__(self, client: HttpClient = http_client, max_retries: Optional[int] = None,
+                 global_rate: Optional[float] = None):
+        self.client = client
+        self.max_retries = (max_retries if max_retries is not None
+                            else int(os.getenv('DISCORD_MAX_RETRIES', '5')))
+        rate = global_rate if global_rate is not None else float(os.getenv('DISCORD_GLOBAL_RATE', '50'))
+        self.global_bucket = TokenBucket(rate=rate, capacity=rate)
+        self.routes: Dict[str, _WebhookRoute] = {}
+    
+    async def execute(self, pair_name: str, url: str, method: str = 'POST', **kwargs) -> WebhookResponse:
+        """Queue a request on the webhook's route and wait for its final response
+        
+        A multipart body can only be sent once, so `data` may be a function
+        that builds it; it is called again for every attempt.
+        """
+        route_key = webhook_route_key(url)
+        route = self.routes.get(route_key)
+        if route is None:
+            route = _WebhookRoute()
+            self.routes[route_key] = route
+        if route.task is None or route.task.done():
+            route.task = asyncio.create_task(self._dispatch(route_key, route), name=f"webhook:{route_key}")
+        
+        job = _WebhookJob(pair_name, method, url, kwargs, asyncio.get_running_loop().create_future())
+        route.queues.setdefault(pair_name, deque()).append(job)
+        route.wakeup.set()
+        return await job.future
+    
+    def _next_job(self, route: _WebhookRoute) -> Optional[_WebhookJob]:
+        """Round-robin across pairs sharing the webhook"""
+        for pair_name in list(route.queues):
+            queue = route.queues[pair_name]
+            if not queue:
+                del route.queues[pair_name]
+                continue
+            job = queue.popleft()
+            # Move this pair to the back so the next pair gets the next slot
+            route.queues.move_to_end(pair_name)
+            if not queue:
+                del route.queues[pair_name]
+            return job
+        return None
+    
+    async def _dispatch(self, route_key: str, route: _WebhookRoute):
+        while True:
+            job = self._next_job(route)
+            if job is None:
+                route.wakeup.clear()
+                await route.wakeup.wait()
+                continue
+            
+            # Pre-emptive waits: route bucket first, then the process-wide budget
+            wait = route.bucket.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.global_bucket.acquire()
+            
+            try:
+                result = await self._send(route, job)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            
+            if result is None:
+                # Rate limited: retry this job before anything else from its pair
+                route.queues.setdefault(job.pair_name, deque()).appendleft(job)
+                route.queues.move_to_end(job.pair_name, last=False)
+                continue
+            
+            if not job.future.done():
+                job.future.set_result(result)
+    
+    async def _send(self, route: _WebhookRoute, job: _WebhookJob) -> Optional[WebhookResponse]:
+        """Send once; return None if the job should be retried after a 429"""
+        job.attempts += 1
+        route.bucket.consume(time.monotonic())
+        session = self.client.get_session()
+        kwargs = job.kwargs
+        if callable(kwargs.get('data')):
+            kwargs = dict(kwargs, data=kwargs['data']())
+        
+        async with session.request(job.method, job.url, **kwargs) as response:
+            now = time.monotonic()
+            route.bucket.update(response.headers, now)
+            text = await response.text()
+            
+            if response.status != 429:
+                route.sent += 1
+                data = None
+                if text and response.content_type == 'application/json':
+                    data = await response.json()
+                return WebhookResponse(response.status, text, data, job.attempts)
+            
+            route.rate_limited += 1
+            retry_after = self._retry_after(response, text)
+            is_global = response.headers.get('X-RateLimit-Global', '').lower() == 'true'
+            if is_global:
+                self.global_bucket.penalize(retry_after)
+            else:
+                route.bucket.remaining = 0
+                route.bucket.reset_at = max(route.bucket.reset_at, now + retry_after)
+            
+            if job.attempts > self.max_retries:
+                logger.error(f"Discord rate limit: giving up after {job.attempts} attempts ({job.pair_name})")
+                return WebhookResponse(response.status, text, None, job.attempts)
+            
+            logger.warning(
+                f"Discord 429 for {job.pair_name} ({'global' if is_global else 'bucket'}), "
+                f"retrying in {retry_after:.2f}s"
+            )
+            return None
+    
+    @staticmethod
+    def _retry_after(response, text: str) -> float:
+        try:
+            return float(json.loads(text).get('retry_after', 1.0))
+        except (ValueError, AttributeError):
+            return float(response.headers.get('Retry-After', '1'))
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-webhook sent/429 counters and queue depth"""
+        return {
+            key: {
+                'sent': route.sent,
+                'rate_limited': route.rate_limited,
+                'queued': sum(len(q) for q in route.queues.values()),
+                'remaining': route.bucket.remaining
+            }
+            for key, route in self.routes.items()
+        }
+    
+    async def close(self):
+        for route in self.routes.values():
+            if route.task is not None:
+                route.task.cancel()
+        await asyncio.gather(
+            *(route.task for route in self.routes.values() if route.task is not None),
+            return_exceptions=True
+        )
+        # Nothing will send what is still queued; fail it so callers of execute() do not wait forever
+        for route in self.routes.values():
+            for queue in route.queues.values():
+                for job in queue:
+                    if not job.future.done():
+                        job.future.set_exception(RuntimeError("Webhook scheduler closed"))
+            route.queues.clear()
+        self.routes.clear()
+
+# Global webhook scheduler instance
+webhook_scheduler = WebhookScheduler()
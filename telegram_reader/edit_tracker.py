@@ -0,0 +1,81 @@
+"""
+Edit tracking for AutoForwardX
+Counts edits per (chat_id, message_id) over a sliding time window with a hard
+cap on tracked messages, so a long-running reader's memory stays flat
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+class MessageTracker:
+    """Track message edits and detect excessive editing
+    
+    "Excessive" means more than `threshold` edits within `window` seconds. Each
+    message keeps only its last threshold + 1 edit times, and messages sit in an
+    OrderedDict ordered by their last edit: messages with no edit inside the
+    window are popped from the front as new edits arrive (O(1) amortized), and
+    the least recently edited go first once `max_entries` is reached.
+    """
+    
+    def __init__(self, threshold: Optional[int] = None, window: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.edit_threshold = threshold if threshold is not None else int(os.getenv('EDIT_THRESHOLD', '3'))
+        self.window = window if window is not None else float(os.getenv('EDIT_WINDOW', '3600'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('EDIT_TRACKER_MAX', '100000'))
+        self.edits: 'OrderedDict[int, List[float]]' = OrderedDict()
+        
+        self.tracked = 0
+        self.expired = 0
+        self.evicted = 0
+    
+    @staticmethod
+    def key(chat_id: Optional[int], message_id: int) -> int:
+        """Pack (chat_id, message_id) into one int; message ids are 32-bit per chat"""
+        return ((chat_id or 0) << 32) | (message_id & 0xFFFFFFFF)
+    
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        edits = self.edits
+        while edits:
+            key = next(iter(edits))
+            if edits[key][-1] >= cutoff:
+                break
+            del edits[key]
+            self.expired += 1
+    
+    def track_edit(self, chat_id: Optional[int], message_id: int, now: Optional[float] = None) -> bool:
+        """Track message edit and return True if threshold exceeded within the window"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        self.tracked += 1
+        
+        key = self.key(chat_id, message_id)
+        times = self.edits.get(key)
+        if times is None:
+            times = self.edits[key] = [now]
+            if len(self.edits) > self.max_entries:
+                self.edits.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.edits.move_to_end(key)
+            times.append(now)
+            if len(times) > self.edit_threshold + 1:
+                del times[0]
+        return len(times) > self.edit_threshold and now - times[0] <= self.window
+    
+    def reset_tracking(self, chat_id: Optional[int], message_id: int):
+        """Reset edit tracking for a message"""
+        self.edits.pop(self.key(chat_id, message_id), None)
+    
+    def __len__(self) -> int:
+        return len(self.edits)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'messages': len(self.edits),
+            'edits': self.tracked,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
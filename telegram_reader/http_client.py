@@ -0,0 +1,56 @@
+"""
+Shared outbound HTTP client for AutoForwardX
+One pooled aiohttp ClientSession per process with keep-alive and DNS caching
+"""
+
+import logging
+import os
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class HttpClient:
+    """Process-wide pooled aiohttp session, created lazily inside the running event loop"""
+    
+    def __init__(self, limit: Optional[int] = None, limit_per_host: Optional[int] = None,
+                 dns_ttl: Optional[int] = None, keepalive_timeout: Optional[float] = None,
+                 request_timeout: Optional[float] = None):
+        self.limit = limit if limit is not None else int(os.getenv('HTTP_POOL_LIMIT', '100'))
+        self.limit_per_host = (limit_per_host if limit_per_host is not None
+                               else int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20')))
+        self.dns_ttl = dns_ttl if dns_ttl is not None else int(os.getenv('HTTP_DNS_TTL', '300'))
+        self.keepalive_timeout = (keepalive_timeout if keepalive_timeout is not None
+                                  else float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30')))
+        self.request_timeout = (request_timeout if request_timeout is not None
+                                else float(os.getenv('HTTP_TIMEOUT', '30')))
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating the connection pool on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+            logger.info(
+                f"HTTP pool created (limit={self.limit}, per_host={self.limit_per_host}, "
+                f"dns_ttl={self.dns_ttl}s)"
+            )
+        return self._session
+    
+    async def close(self):
+        """Close the pooled session and all kept-alive connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+# Global HTTP client instance
+http_client = HttpClient()
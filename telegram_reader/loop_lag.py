@@ -0,0 +1,54 @@
+"""
+Event loop lag monitor for AutoForwardX
+Schedules a short sleep repeatedly and records how late each wakeup is;
+anything blocking the loop (CPU work, sync I/O) shows up as lag
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+class LoopLagMonitor:
+    """Samples wakeup delay of the running loop every ``interval`` seconds"""
+    
+    def __init__(self, interval: Optional[float] = None, window: int = 3000):
+        self.interval = interval if interval is not None else float(os.getenv('LOOP_LAG_INTERVAL', '0.1'))
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+    
+    def reset(self):
+        self.samples.clear()
+        self.max_lag = 0.0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Lag over the sample window in milliseconds (max is since start/reset)"""
+        if not self.samples:
+            return {'samples': 0, 'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': round(self.max_lag * 1000, 2)}
+        ordered = sorted(self.samples)
+        return {
+            'samples': len(ordered),
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+            'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+            'max_ms': round(self.max_lag * 1000, 2)
+        }
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
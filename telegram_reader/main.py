@@ -7,19 +7,41 @@ import asyncio
 import json
 import logging
 import os
+import signal
 import sys
-import hashlib
-from typing import Dict, List, Optional, Any
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, FrozenSet, List, Optional, Any, Tuple
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, utils
 from telethon.sessions import StringSession
-from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
+from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument, PeerChannel, UpdateChannel
 import aiohttp
 import aiofiles
 
+from chat_cache import ChatCache, ChatInfo
 from config import config_manager, PairConfig
+from config_watcher import ConfigWatcher, diff_named
+from dedup import DuplicateFilter, content_digest
+from discord_webhook import WebhookResponse, webhook_message_url, webhook_route_key, webhook_scheduler, with_wait
+from edit_tracker import MessageTracker
+from http_client import http_client
+from loop_lag import LoopLagMonitor
+from mapping_store import WebhookMessageStore
+from media_cache import MediaCache, media_key
+from media_offload import MediaAnalyzer
+from media_spool import MB, MediaSpool
+from media_stream import MediaStreamer, media_filename
+from outbox import DeliveryError, Outbox, PermanentDeliveryError
+from perceptual_hash import PERCEPTUAL_HASH_AVAILABLE
+from pipeline import ForwardingPipeline
+from session_startup import SessionStartup
+from supervisor import HealthReporter, ReaderSupervisor, ShardAssignment
+from telegram_sender import TelegramSendError, TelegramSender, clean_for_telegram
+from webhook_batcher import BatchWindow, pack_count, render_batch
+from pattern_matcher import BLOCKLIST_TRAP_TYPE
 
 # Configure logging
 logging.basicConfig(
@@ -48,36 +70,26 @@ class TrapDetector:
         if not text:
             return result
         
-        # Check against blocklist
-        if config_manager.is_text_blocked(text, pair_name):
+        # Single pass over blocklist and known trap patterns
+        hits = config_manager.match_text(text, pair_name)
+        if hits:
+            best = hits[0]
+            if best.trap_type == BLOCKLIST_TRAP_TYPE:
+                details = ['Text matches blocklist pattern']
+            else:
+                details = [f'Detected pattern: {best.pattern}']
             result.update({
                 'is_trap': True,
-                'trap_type': 'blocklist',
-                'confidence': 1.0,
-                'details': ['Text matches blocklist pattern']
+                'trap_type': best.trap_type,
+                'confidence': best.confidence,
+                'details': details,
+                'hits': [
+                    {'pattern': hit.pattern, 'trap_type': hit.trap_type, 'confidence': hit.confidence}
+                    for hit in hits
+                ]
             })
             return result
         
-        # Known trap patterns
-        trap_patterns = [
-            ('/ *', 'forward_slash_trap', 0.9),
-            ('1', 'single_digit_trap', 0.8),
-            ('trap', 'explicit_trap', 0.95),
-            ('leak', 'leak_warning', 0.9),
-            ('copy warning', 'copy_warning', 0.85)
-        ]
-        
-        text_lower = text.lower().strip()
-        for pattern, trap_type, confidence in trap_patterns:
-            if pattern in text_lower:
-                result.update({
-                    'is_trap': True,
-                    'trap_type': trap_type,
-                    'confidence': confidence,
-                    'details': [f'Detected pattern: {pattern}']
-                })
-                return result
-        
         # Suspicious short messages
         if len(text.strip()) <= 3 and text.strip().isdigit():
             result.update({
@@ -90,20 +102,17 @@ class TrapDetector:
         return result
     
     @staticmethod
-    async def detect_image_traps(media_data: bytes, pair_name: str) -> Dict[str, Any]:
-        """Detect image-based traps using hash comparison"""
+    async def detect_image_traps(image_hash: str, pair_name: str,
+                                 perceptual: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Detect image-based traps by exact hash, then by perceptual near-duplicate"""
         result = {
             'is_trap': False,
             'trap_type': None,
-            'image_hash': None,
+            'image_hash': image_hash,
             'details': []
         }
         
         try:
-            # Calculate MD5 hash of image
-            image_hash = hashlib.md5(media_data).hexdigest()
-            result['image_hash'] = image_hash
-            
             # Check against blocklist
             if config_manager.is_image_blocked(image_hash, pair_name):
                 result.update({
@@ -111,150 +120,635 @@ class TrapDetector:
                     'trap_type': 'blocklist_image',
                     'details': ['Image hash matches blocklist']
                 })
+            elif perceptual:
+                match = config_manager.match_perceptual(perceptual, pair_name)
+                if match is not None:
+                    result.update({
+                        'is_trap': True,
+                        'trap_type': 'blocklist_image_similar',
+                        'details': [f'Near-duplicate of blocked image (pHash distance {match.phash_distance}, '
+                                    f'dHash distance {match.dhash_distance})'],
+                        'matched_hash': match.md5
+                    })
             
         except Exception as e:
             logger.error(f"Error detecting image traps: {e}")
         
         return result
 
-class MessageTracker:
-    """Track message edits and detect excessive editing"""
+def normalize_channel_ref(ref: str) -> Tuple[Optional[int], Optional[str]]:
+    """Normalize a configured source channel to (chat_id, username)
+    
+    Numeric ids are reduced to the bare id Telethon exposes as ``chat.id``
+    (``-100`` channel prefix and group sign stripped); anything else is treated
+    as a case-insensitive username without ``@`` or ``t.me/`` prefix.
+    """
+    ref = (ref or '').strip()
+    for prefix in ('https://t.me/', 'http://t.me/', 't.me/'):
+        if ref.startswith(prefix):
+            ref = ref[len(prefix):]
+    ref = ref.lstrip('@')
     
-    def __init__(self):
-        self.edit_counts: Dict[int, int] = {}
-        self.edit_threshold = 3
+    try:
+        value = int(ref)
+    except ValueError:
+        return None, ref.lower() or None
     
-    def track_edit(self, message_id: int) -> bool:
-        """Track message edit and return True if threshold exceeded"""
-        self.edit_counts[message_id] = self.edit_counts.get(message_id, 0) + 1
-        return self.edit_counts[message_id] > self.edit_threshold
+    if ref.startswith('-100'):
+        return int(ref[4:]), None
+    return abs(value), None
+
+class PairRouter:
+    """Immutable channel -> pairs routing index, rebuilt whenever the pair config changes"""
+    
+    def __init__(self, pairs: List[PairConfig], resolved_ids: Optional[Dict[str, int]] = None):
+        resolved_ids = resolved_ids or {}
+        by_id: Dict[int, List[PairConfig]] = {}
+        by_username: Dict[str, List[PairConfig]] = {}
+        session_ids: Dict[str, set] = {}
+        unresolved_sessions = set()
+        
+        for pair in pairs:
+            chat_id, username = normalize_channel_ref(pair.source_tg_channel)
+            if chat_id is not None:
+                by_id.setdefault(chat_id, []).append(pair)
+            elif username:
+                by_username.setdefault(username, []).append(pair)
+                chat_id = resolved_ids.get(username)
+            
+            if pair.status != "active":
+                continue
+            if chat_id is not None:
+                session_ids.setdefault(pair.session, set()).add(chat_id)
+            else:
+                unresolved_sessions.add(pair.session)
+        
+        self._by_id: Dict[int, Tuple[PairConfig, ...]] = {k: tuple(v) for k, v in by_id.items()}
+        self._by_username: Dict[str, Tuple[PairConfig, ...]] = {k: tuple(v) for k, v in by_username.items()}
+        self._session_ids: Dict[str, FrozenSet[int]] = {k: frozenset(v) for k, v in session_ids.items()}
+        self._unresolved_sessions = frozenset(unresolved_sessions)
+        self.pair_count = len(pairs)
+    
+    def route(self, chat, session_name: Optional[str] = None) -> Tuple[PairConfig, ...]:
+        """Return every active pair fed by this chat (fan-out), in config order"""
+        pairs = self._by_id.get(getattr(chat, 'id', None), ())
+        
+        username = getattr(chat, 'username', None)
+        if username:
+            by_username = self._by_username.get(username.lower(), ())
+            if by_username:
+                pairs = pairs + tuple(p for p in by_username if p not in pairs)
+        
+        return tuple(
+            pair for pair in pairs
+            if pair.status == "active" and (session_name is None or pair.session == session_name)
+        )
+    
+    def accepts(self, session_name: str, chat_id: Optional[int]) -> bool:
+        """Cheap pre-filter on the update's marked chat id, before any entity lookup"""
+        if session_name in self._unresolved_sessions:
+            # A source could not be resolved to an id, so only the slow path can tell
+            return True
+        if chat_id is None:
+            return False
+        return utils.resolve_id(chat_id)[0] in self._session_ids.get(session_name, ())
+    
+    def unresolved_sessions(self) -> FrozenSet[str]:
+        """Sessions whose filter falls back to accepting every update"""
+        return self._unresolved_sessions
+
+class SharedContent:
+    """Message content computed once and shared by every pair the message fans out to"""
+    
+    def __init__(self, factory):
+        self._factory = factory
+        self._task: Optional[asyncio.Future] = None
+    
+    async def get(self) -> Dict[str, Any]:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._factory())
+        return await asyncio.shield(self._task)
+
+@dataclass
+class UpdateStats:
+    """Per-session counters for the Telethon chat pre-filter"""
+    received: int = 0
+    routed: int = 0
     
-    def reset_tracking(self, message_id: int):
-        """Reset edit tracking for a message"""
-        self.edit_counts.pop(message_id, None)
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'received': self.received,
+            'routed': self.routed,
+            'filtered_ratio': round(1 - self.routed / self.received, 4) if self.received else 0.0
+        }
 
 class TelegramMessageReader:
     """Enhanced main class for handling multiple Telegram sessions and message forwarding"""
     
-    def __init__(self):
+    def __init__(self, client_factory=None):
         self.clients: Dict[str, TelegramClient] = {}
         self.pairs: List[PairConfig] = []
+        self.router = PairRouter([])
+        self.resolved_ids: Dict[str, int] = {}
+        self.update_stats: Dict[str, UpdateStats] = {}
+        self.stats_log_interval = int(os.getenv('STATS_LOG_INTERVAL', '300'))
+        self.active_pair_names: set = set()
+        # Pairs removed from config whose queued messages are still being delivered
+        self.draining_pair_names: set = set()
+        # Last config of pairs deleted from pairs.json, for the Telegram posts they still have queued
+        self.deleted_pairs: Dict[str, PairConfig] = {}
+        self.session_configs: Dict[str, Any] = {}
+        self.pipeline = ForwardingPipeline(
+            self.classify_message,
+            self.deliver_message,
+            workers=int(os.getenv('PIPELINE_WORKERS', '2')),
+            queue_size=int(os.getenv('PIPELINE_QUEUE_SIZE', '100')),
+            overflow=os.getenv('PIPELINE_OVERFLOW', 'block')
+        )
+        self.pipeline_drain_timeout = float(os.getenv('PIPELINE_DRAIN_TIMEOUT', '30'))
+        self.shard = ShardAssignment.from_env()
+        self.health = HealthReporter()
+        self.health_interval = float(os.getenv('READER_HEALTH_INTERVAL', '10'))
+        self._reload_task: Optional[asyncio.Task] = None
+        self._reload_pending = False
+        self._retire_tasks: set = set()
+        self.config_watcher = ConfigWatcher(
+            [config_manager.pairs_file, config_manager.sessions_file, config_manager.blocklist_file],
+            self.on_config_change
+        )
+        self.media_streamer = MediaStreamer()
+        cache_path = os.getenv('MEDIA_CACHE_PATH')
+        self.media_cache = MediaCache(path=self.shard.local_path(Path(cache_path)) if cache_path else None)
+        # Media to upload to Discord is spooled here by the download that hashes it
+        self.media_spool = MediaSpool(self.shard.local_path(Path(os.getenv('MEDIA_SPOOL_DIR', 'config/media_spool'))))
+        # Per-webhook upload limit learned from 413s (boosted servers allow more than the default)
+        self.upload_limits: Dict[str, int] = {}
+        # Webhook posts are committed here before sending, so a Discord outage delays them instead of dropping them
+        self.outbox = Outbox(self.shard.local_path(Path(os.getenv('OUTBOX_PATH', 'config/outbox.db'))))
+        # Pairs with batch_window_ms set have bursts coalesced into one post
+        self.batch_window = BatchWindow()
+        self.outbox.register('discord', self.send_to_discord, batch_sender=self.send_batch_to_discord,
+                             batch_window=self.discord_batch_window)
+        # Pairs with direct_telegram post to their destination channel themselves, on their own lane
+        self.telegram_sender = TelegramSender(http_client)
+        self.outbox.register('telegram', self.send_to_telegram)
+        self.outbox_drain_timeout = float(os.getenv('OUTBOX_DRAIN_TIMEOUT', '5'))
+        # Source message -> webhook message, so edits and deletes reach the post made for it
+        self.webhook_messages = WebhookMessageStore(
+            self.shard.local_path(Path(os.getenv('WEBHOOK_MAPPINGS_PATH', 'config/webhook_messages.db')))
+        )
+        self.webhook_mapping_ttl = float(os.getenv('WEBHOOK_MAPPING_TTL_DAYS', '7'))
+        self.perceptual_hashing = (PERCEPTUAL_HASH_AVAILABLE
+                                   and os.getenv('PERCEPTUAL_HASHING', 'true').lower() == 'true')
+        self.media_analyzer = MediaAnalyzer()
+        self.loop_lag = LoopLagMonitor()
+        # A stub factory lets startup run (and be benchmarked) without Telegram
+        self.startup = SessionStartup(client_factory or self.create_client)
+        self.chat_cache = ChatCache()
         self.running = False
         self.trap_detector = TrapDetector()
         self.message_tracker = MessageTracker()
+        self.duplicates = DuplicateFilter()
         self.admin_bot_token = os.getenv('ADMIN_BOT_TOKEN')
         
     async def load_config(self):
         """Load sessions and pairs configuration"""
         try:
-            self.pairs = config_manager.get_active_pairs()
+            self.pairs = self.owned_pairs()
+            self.rebuild_routing()
             logger.info(f"Loaded {len(self.pairs)} active pairs")
             
-            sessions = config_manager.get_active_sessions()
+            sessions = self.owned_sessions()
             logger.info(f"Loaded {len(sessions)} active sessions")
+            if self.shard.sharded:
+                logger.info(f"🧩 Reader shard {self.shard.index}/{self.shard.count}: "
+                            f"sessions {sorted(sessions)}")
             
         except Exception as e:
             logger.error(f"Error loading configuration: {e}")
             raise
     
+    def owned_sessions(self) -> Dict[str, Any]:
+        """Active sessions assigned to this reader process"""
+        return {
+            name: session for name, session in config_manager.get_active_sessions().items()
+            if self.shard.owns(name)
+        }
+    
+    def owned_pairs(self) -> List[PairConfig]:
+        """Active pairs fed by sessions this reader process owns"""
+        return [pair for pair in config_manager.get_active_pairs() if self.shard.owns(pair.session)]
+    
+    def create_client(self, session_name: str, session_config) -> TelegramClient:
+        """Default client factory: a Telethon client on the session file"""
+        return TelegramClient(
+            f"sessions/{session_config.session_file}",
+            api_id=int(os.getenv('TELEGRAM_API_ID', '0')),
+            api_hash=os.getenv('TELEGRAM_API_HASH', '')
+        )
+    
     async def create_clients(self):
-        """Create Telethon clients for each active session"""
-        sessions = config_manager.get_active_sessions()
+        """Start every active session concurrently, SESSION_STARTUP_CONCURRENCY at a time"""
+        sessions = self.owned_sessions()
         
-        for session_name, session_config in sessions.items():
+        elapsed = await self.startup.run(sessions, self.connect_session)
+        logger.info(f"⏱️ Started {len(self.clients)}/{len(sessions)} sessions in {elapsed:.1f}s "
+                    f"(concurrency {self.startup.concurrency})")
+        
+        self.rebuild_routing()
+        for session_name in self.router.unresolved_sessions():
+            logger.warning(f"Session {session_name} has unresolved sources; chat filter disabled")
+    
+    async def connect_session(self, session_name: str, session_config):
+        """Start one client, pre-resolve its source entities and register its handlers"""
+        try:
+            client = await self.startup.start(session_name, session_config, self.source_lookups(session_name))
+            self.clients[session_name] = client
+            self.session_configs[session_name] = session_config
+            
+            # Username sources become chat ids so updates can be filtered by chat id
+            await self.resolve_sources(session_name, client)
+            await self.chat_cache.warm(session_name, client, self.startup.entities.get(session_name, {}).values())
+            
+            # Register event handlers, restricted to this session's source chats
+            chat_filter = self.make_chat_filter(session_name)
+            client.add_event_handler(
+                partial(self.handle_new_message, session_name=session_name),
+                events.NewMessage(func=chat_filter)
+            )
+            client.add_event_handler(
+                partial(self.handle_message_edit, session_name=session_name),
+                events.MessageEdited(func=chat_filter)
+            )
+            client.add_event_handler(
+                partial(self.handle_message_delete, session_name=session_name),
+                events.MessageDeleted(func=lambda event: self.router.accepts(session_name, event.chat_id))
+            )
+            # Title/photo/username changes keep the chat metadata cache current
+            client.add_event_handler(
+                partial(self.handle_chat_action, session_name=session_name),
+                events.ChatAction(func=lambda event: self.router.accepts(session_name, event.chat_id))
+            )
+            client.add_event_handler(
+                partial(self.handle_channel_update, session_name=session_name, client=client),
+                events.Raw(UpdateChannel)
+            )
+            
+            timing = self.startup.timings[session_name].as_dict()
+            logger.info(f"Successfully connected session: {session_name} "
+                        f"(connect {timing['connect_ms']} ms, {timing['entities']} sources resolved)")
+        
+        except Exception as e:
+            logger.error(f"Failed to connect session {session_name}: {e}")
+            config_manager.update_session_status(session_name, "error")
+    
+    def on_config_change(self, paths):
+        """Config watcher callback: the blocklist reloads lazily, pairs/sessions are diffed and applied"""
+        if config_manager.blocklist_file in paths:
+            config_manager.invalidate_blocklist()
+        if config_manager.pairs_file in paths or config_manager.sessions_file in paths:
+            self.request_reload()
+    
+    async def reload_config(self):
+        """Apply pairs/sessions changes incrementally without dropping in-flight messages
+        
+        New sessions are connected and sources resolved before the new routing
+        table is swapped in. Sessions that go away stop receiving updates at once,
+        but are only disconnected after the lanes of the pairs they fed have
+        delivered what was already queued (media is downloaded through them).
+        The exception is a session reconnected on the same session file: its old
+        client is disconnected first, since two clients cannot share the file's
+        SQLite database or its auth key.
+        """
+        sessions = self.owned_sessions()
+        pairs = self.owned_pairs()
+        old_pairs = {pair.pair_name: pair for pair in self.pairs}
+        session_diff = diff_named(self.session_configs, sessions)
+        pair_diff = diff_named(old_pairs, {pair.pair_name: pair for pair in pairs})
+        if not session_diff and not pair_diff:
+            return
+        logger.info(f"🔁 Applying config change: sessions {session_diff.summary()}, pairs {pair_diff.summary()}")
+        
+        # A session whose settings changed is retired and connected again
+        added = {name: sessions[name] for name in session_diff.added + session_diff.changed}
+        reused_files = {session.session_file for session in added.values()}
+        retired_clients = {}
+        for session_name in session_diff.removed + session_diff.changed:
+            client = self.clients.pop(session_name, None)
+            old_session = self.session_configs.pop(session_name, None)
+            if client is not None:
+                for callback, event in client.list_event_handlers():
+                    client.remove_event_handler(callback, event)
+                if old_session is not None and old_session.session_file in reused_files:
+                    await self.disconnect_client(session_name, client)
+                else:
+                    retired_clients[session_name] = client
+        
+        # Paused pairs skip their queued messages as before; deleted or moved pairs deliver them
+        still_configured = {pair.pair_name for pair in config_manager.get_pairs()}
+        retired_pairs = [name for name in pair_diff.removed if name not in still_configured]
+        self.draining_pair_names.update(retired_pairs)
+        self.deleted_pairs.update((name, old_pairs[name]) for name in retired_pairs)
+        for pair in pairs:
+            self.deleted_pairs.pop(pair.pair_name, None)
+        
+        self.pairs = pairs
+        if added:
+            await self.startup.run(added, self.connect_session)
+        for session_name, client in self.clients.items():
+            if session_name not in added:
+                await self.resolve_sources(session_name, client)
+        self.rebuild_routing()
+        
+        if retired_pairs or retired_clients:
+            task = asyncio.create_task(self.retire(retired_pairs, retired_clients))
+            self._retire_tasks.add(task)
+            task.add_done_callback(self._retire_tasks.discard)
+    
+    async def retire(self, pair_names: List[str], clients: Dict[str, TelegramClient]):
+        """Drain the lanes of retired pairs, then disconnect retired sessions"""
+        await asyncio.gather(*(self.pipeline.remove_lane(name) for name in pair_names), return_exceptions=True)
+        self.draining_pair_names.difference_update(pair_names)
+        
+        # Lanes that stay open may still hold messages whose media comes through a retired client
+        if clients:
+            lanes = [lane for name, lane in self.pipeline.lanes.items() if name not in pair_names]
             try:
-                # Create client with session file
-                session_file = f"sessions/{session_config.session_file}"
-                client = TelegramClient(
-                    session_file,
-                    api_id=int(os.getenv('TELEGRAM_API_ID', '0')),
-                    api_hash=os.getenv('TELEGRAM_API_HASH', '')
+                await asyncio.wait_for(
+                    asyncio.gather(*(lane.deliver_queue.join() for lane in lanes)), timeout=self.pipeline_drain_timeout
                 )
-                
-                await client.start()
-                self.clients[session_name] = client
-                
-                # Register event handlers
-                client.add_event_handler(self.handle_new_message, events.NewMessage())
-                client.add_event_handler(self.handle_message_edit, events.MessageEdited())
-                
-                logger.info(f"Successfully connected session: {session_name}")
-                
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Lanes still busy, disconnecting retired sessions anyway")
+        
+        for session_name, client in clients.items():
+            if session_name not in self.clients:
+                self.startup.forget(session_name)
+                self.chat_cache.forget(session_name)
+            await self.disconnect_client(session_name, client)
+    
+    async def disconnect_client(self, session_name: str, client: TelegramClient):
+        try:
+            await client.disconnect()
+            logger.info(f"✅ Disconnected session: {session_name}")
+        except Exception as e:
+            logger.error(f"❌ Error disconnecting session {session_name}: {e}")
+    
+    def health_report(self) -> Dict[str, Any]:
+        """Counters sent to the supervisor on every health interval"""
+        updates = self.update_stats.values()
+        return {
+            'shard': self.shard.index,
+            'pid': os.getpid(),
+            'sessions': len(self.clients),
+            'session_names': sorted(self.clients),
+            'pairs': len(self.pairs),
+            'received': sum(stats.received for stats in updates),
+            'routed': sum(stats.routed for stats in updates),
+            'delivered': sum(
+                lane.stages['deliver'].count for lane in self.pipeline.lanes.values()
+            ),
+            'loop_lag': self.loop_lag.stats(),
+            'startup': self.startup.stats(),
+            'suppressed': self.duplicates.stats()['suppressed'],
+            'outbox': self.outbox.stats()
+        }
+    
+    def request_reload(self):
+        """Schedule reload_config; requests made while one runs are folded into a single rerun"""
+        self._reload_pending = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_loop())
+    
+    async def _reload_loop(self):
+        while self._reload_pending:
+            self._reload_pending = False
+            try:
+                await self.reload_config()
             except Exception as e:
-                logger.error(f"Failed to connect session {session_name}: {e}")
-                config_manager.update_session_status(session_name, "error")
+                logger.error(f"Error reloading configuration: {e}")
     
-    async def handle_new_message(self, event):
-        """Handle new messages with comprehensive processing"""
+    def stop(self):
+        """Leave the run loop; cleanup drains the pipeline"""
+        self.running = False
+    
+    def source_lookups(self, session_name: str) -> Dict[str, Any]:
+        """Source ref -> get_input_entity key (username or marked id) for a session's pairs"""
+        lookups = {}
+        for pair in self.pairs:
+            if pair.session != session_name:
+                continue
+            chat_id, username = normalize_channel_ref(pair.source_tg_channel)
+            if username:
+                lookups[pair.source_tg_channel] = username
+            elif chat_id is not None:
+                try:
+                    lookups[pair.source_tg_channel] = int(pair.source_tg_channel.strip())
+                except ValueError:
+                    continue
+        return lookups
+    
+    def record_resolved(self, peer_ids: Dict[str, int]):
+        """Remember the bare chat id of every username source that resolved"""
+        for ref, peer_id in peer_ids.items():
+            _, username = normalize_channel_ref(ref)
+            if username:
+                self.resolved_ids[username] = utils.resolve_id(peer_id)[0]
+    
+    async def resolve_sources(self, session_name: str, client: TelegramClient):
+        """Resolve sources added since startup; entities already cached are not looked up again"""
+        self.record_resolved(await self.startup.resolve(session_name, client, self.source_lookups(session_name)))
+    
+    def make_chat_filter(self, session_name: str):
+        """Build the Telethon event filter for a session, reading the live router"""
+        stats = self.update_stats.setdefault(session_name, UpdateStats())
+        
+        def chat_filter(event) -> bool:
+            stats.received += 1
+            if self.router.accepts(session_name, event.chat_id):
+                stats.routed += 1
+                return True
+            return False
+        
+        return chat_filter
+    
+    async def refresh_pairs(self):
+        """Reload active pairs and swap in new routing and chat filters"""
         try:
+            self.pairs = self.owned_pairs()
+            for session_name, client in self.clients.items():
+                await self.resolve_sources(session_name, client)
+            self.rebuild_routing()
+        except Exception as e:
+            logger.error(f"Error refreshing pairs: {e}")
+    
+    def get_update_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return received vs routed update counters per session"""
+        return {name: stats.as_dict() for name, stats in self.update_stats.items()}
+    
+    async def handle_new_message(self, event, session_name: Optional[str] = None, edited: bool = False):
+        """Ingest stage: route the update (a new message, or an edit of one) and queue it on each matching pair's lane"""
+        try:
+            first_after = self.startup.first_message(session_name)
+            if first_after is not None:
+                logger.info(f"⏱️ Session {session_name} first message {first_after:.1f}s after startup began")
+            
             message = event.message
-            chat = await event.get_chat()
+            chat = await self.chat_cache.chat_for(session_name, event)
             
-            # Find matching pair
-            matching_pair = self.find_matching_pair(chat)
-            if not matching_pair:
+            # Find every pair fed by this chat
+            matching_pairs = self.find_matching_pairs(chat, session_name)
+            if not matching_pairs:
                 return
             
-            # Process message content
-            message_data = await self.process_message_content(message, chat, matching_pair)
-            
-            # Detect traps
-            trap_result = await self.detect_traps(message_data, matching_pair)
-            
-            if trap_result['is_trap']:
-                await self.handle_trap_detection(trap_result, matching_pair, message_data)
+            # Crossposts and edits that change nothing (or only whitespace) stop here, before any download
+            digest = content_digest(message.text, message.media)
+            source = (message.chat_id, message.id)
+            matching_pairs = [
+                pair for pair in matching_pairs
+                if not self.duplicates.is_duplicate(self.destination_key(pair), digest, pair.pair_name,
+                                                    source=source, edited=edited)
+            ]
+            if not matching_pairs:
+                logger.info(f"♻️ Duplicate message {message.id} suppressed")
                 return
             
-            # Forward to Discord if clean
-            await self.forward_to_discord(message_data, matching_pair)
+            # Content is processed once, by whichever lane gets to it first
+            content = SharedContent(
+                lambda: self.process_message_content(message, chat, matching_pairs[0], edited=edited)
+            )
+            
+            for pair in matching_pairs:
+                await self.pipeline.submit(pair.pair_name, (pair, content), pair.pipeline_workers or None)
             
         except Exception as e:
             logger.error(f"Error handling new message: {e}")
     
-    async def handle_message_edit(self, event):
+    async def classify_message(self, job) -> Tuple[PairConfig, Dict[str, Any], Dict[str, Any]]:
+        """Classify stage: build message data and run trap detection for one pair"""
+        pair, content = job
+        message_data = dict(await content.get(), pair_name=pair.pair_name)
+        trap_result = await self.detect_traps(message_data, pair)
+        return pair, message_data, trap_result
+    
+    async def deliver_message(self, classified):
+        """Deliver stage: act on the trap verdict or forward to Discord, in arrival order"""
+        pair, message_data, trap_result = classified
+        
+        # The pair may have been auto-paused while this message was queued
+        if pair.pair_name not in self.active_pair_names and pair.pair_name not in self.draining_pair_names:
+            logger.info(f"Skipping queued message for inactive pair {pair.pair_name}")
+            return
+        
+        if trap_result['is_trap']:
+            await self.handle_trap_detection(trap_result, pair, message_data)
+            return
+        
+        if pair.direct_telegram:
+            # Both submits share one outbox commit; Discord is only a mirror and cannot hold Telegram back
+            await asyncio.gather(self.forward_to_telegram(message_data, pair),
+                                 self.forward_to_discord(message_data, pair))
+            return
+        
+        # Forward to Discord if clean
+        await self.forward_to_discord(message_data, pair)
+    
+    def get_pipeline_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return queue depth and stage latency per pair lane"""
+        return self.pipeline.metrics()
+    
+    async def handle_message_edit(self, event, session_name: Optional[str] = None):
         """Handle message edits and detect excessive editing"""
         try:
             message = event.message
-            chat = await event.get_chat()
+            chat = await self.chat_cache.chat_for(session_name, event)
             
             # Check if edit threshold exceeded
-            if self.message_tracker.track_edit(message.id):
-                matching_pair = self.find_matching_pair(chat)
-                if matching_pair:
-                    await self.handle_excessive_edits(message, matching_pair)
+            if self.message_tracker.track_edit(event.chat_id, message.id):
+                for pair in self.find_matching_pairs(chat, session_name):
+                    await self.handle_excessive_edits(message, pair)
                 return
             
-            # Process edited message normally
-            await self.handle_new_message(event)
+            # Forwarded as an edit of the webhook post made for the original
+            await self.handle_new_message(event, session_name, edited=True)
             
         except Exception as e:
             logger.error(f"Error handling message edit: {e}")
     
-    def find_matching_pair(self, chat) -> Optional[PairConfig]:
-        """Find matching pair configuration for a chat"""
-        for pair in self.pairs:
-            if pair.status != "active":
-                continue
-                
-            source_channel = pair.source_channel.replace('@', '')
-            if hasattr(chat, 'username') and chat.username == source_channel:
-                return pair
-            elif str(chat.id) == pair.source_channel:
-                return pair
+    async def handle_message_delete(self, event, session_name: Optional[str] = None):
+        """Delete the webhook posts made for deleted source messages"""
+        try:
+            # Telegram only names the chat for channel and supergroup deletions
+            if event.chat_id is None:
+                return
+            chat = (self.chat_cache.get(session_name, event.chat_id)
+                    or ChatInfo(utils.resolve_id(event.chat_id)[0], None, None, 0.0))
+            for pair in self.find_matching_pairs(chat, session_name):
+                if not pair.discord_webhook:
+                    continue
+                for message_id in event.deleted_ids:
+                    await self.submit_to_discord(pair.pair_name, {
+                        'action': 'delete',
+                        'url': pair.discord_webhook,
+                        'source': [event.chat_id, message_id]
+                    })
         
-        return None
+        except Exception as e:
+            logger.error(f"Error handling message delete: {e}")
+    
+    async def handle_chat_action(self, event, session_name: Optional[str] = None):
+        """A source chat changed (title, photo, members...): refresh its cached metadata"""
+        if self.chat_cache.get(session_name, event.chat_id) is not None:
+            self.chat_cache.refresh(session_name, event.client, event.chat_id)
+    
+    async def handle_channel_update(self, update, session_name: Optional[str] = None, client=None):
+        """UpdateChannel carries no details, only that the channel (e.g. its username) changed"""
+        peer_id = utils.get_peer_id(PeerChannel(update.channel_id))
+        if self.chat_cache.get(session_name, peer_id) is not None:
+            self.chat_cache.refresh(session_name, client, peer_id)
+    
+    def rebuild_routing(self):
+        """Rebuild the routing index from self.pairs and swap it in atomically"""
+        self.router = PairRouter(self.pairs, self.resolved_ids)
+        self.active_pair_names = {pair.pair_name for pair in self.pairs if pair.status == "active"}
+        self.batch_window.configure(self.pairs)
+        destinations = {self.destination_key(pair) for pair in self.pairs}
+        for destination in list(self.duplicates.destinations):
+            if destination not in destinations:
+                self.duplicates.forget(destination)
+    
+    @staticmethod
+    def destination_key(pair: PairConfig) -> str:
+        """Where a pair's messages end up; pairs sharing a webhook share duplicate suppression"""
+        key = pair.discord_webhook or f"pair:{pair.pair_name}"
+        if pair.direct_telegram:
+            # Direct pairs also post to their own channel, which a shared mirror webhook must not suppress
+            key = f"{key}|tg:{pair.destination_tg_channel}"
+        return key
+    
+    def find_matching_pairs(self, chat, session_name: Optional[str] = None) -> Tuple[PairConfig, ...]:
+        """Find all pair configurations fed by a chat"""
+        return self.router.route(chat, session_name)
     
-    async def process_message_content(self, message, chat, pair: PairConfig) -> Dict[str, Any]:
+    def find_matching_pair(self, chat, session_name: Optional[str] = None) -> Optional[PairConfig]:
+        """Find the first matching pair configuration for a chat"""
+        pairs = self.router.route(chat, session_name)
+        return pairs[0] if pairs else None
+    
+    async def process_message_content(self, message, chat, pair: PairConfig, edited: bool = False) -> Dict[str, Any]:
         """Process and extract message content"""
         message_data = {
             'text': message.text or "",
             'message_id': message.id,
-            'channel': chat.username if hasattr(chat, 'username') else str(chat.id),
-            'channel_title': chat.title if hasattr(chat, 'title') else 'Unknown',
+            'chat_id': message.chat_id,
+            'edited': edited,
+            'channel': chat.username or str(chat.id),
+            'channel_title': chat.title or 'Unknown',
             'timestamp': message.date.isoformat(),
             'pair_name': pair.pair_name,
             'has_media': bool(message.media),
-            'media_data': None,
+            'media_hash': None,
+            'media_size': None,
+            'media_perceptual': None,
             'formatting': self.extract_formatting(message)
         }
         
@@ -262,16 +756,57 @@ class TelegramMessageReader:
         if message.media:
             message_data['media_type'] = type(message.media).__name__
             
-            # Download media for trap detection
+            # Stream media through the hasher for trap detection (never buffered whole)
             if isinstance(message.media, (MessageMediaPhoto, MessageMediaDocument)):
-                try:
-                    media_bytes = await message.download_media(bytes)
-                    message_data['media_data'] = media_bytes
-                except Exception as e:
-                    logger.error(f"Error downloading media: {e}")
+                key = media_key(message.media)
+                message_data['media_key'] = key
+                # Edits keep the file uploaded with the original post
+                upload = self.media_spool.enabled and not edited
+                cached = self.media_cache.get(key)
+                spooled = self.media_spool.get(cached.md5) if cached is not None and upload else None
+                if cached is not None and (spooled is not None or not upload or not self.media_spool.fits(cached.size)):
+                    # Same photo/document already hashed (repost or another pair), and spooled if it is to be uploaded: no download
+                    message_data['media_hash'] = cached.md5
+                    message_data['media_size'] = cached.size
+                    message_data['media_perceptual'] = cached.perceptual
+                    message_data['media_status'] = 'cached'
+                    if spooled is not None:
+                        message_data['media_file'] = self.media_attachment(message.media, spooled, cached.size)
+                    elif upload:
+                        message_data['media_upload'] = 'too_large'
+                    return message_data
+                
+                # One download feeds the hash, the perceptual hash and the upload
+                digest = await self.media_streamer.digest(
+                    message.client, message.media, keep_photo=self.perceptual_hashing,
+                    spool=self.media_spool if upload else None
+                )
+                message_data['media_hash'] = digest.md5
+                message_data['media_size'] = digest.size
+                message_data['media_status'] = digest.status
+                if digest.spooled:
+                    message_data['media_file'] = self.media_attachment(message.media, digest.spooled, digest.size)
+                elif upload and not self.media_spool.fits(digest.size or digest.bytes_read):
+                    message_data['media_upload'] = 'too_large'
+                if digest.data:
+                    try:
+                        message_data['media_perceptual'] = await self.media_analyzer.perceptual_hashes(digest.data)
+                    except Exception as e:
+                        logger.error(f"Error computing perceptual hash: {e}")
+                if digest.status == 'complete':
+                    self.media_cache.put(key, digest.md5, digest.size, message_data['media_perceptual'])
+                elif digest.status in ('skipped', 'too_large'):
+                    logger.info(f"Media not hashed ({digest.status}, {digest.kind}, {digest.size} bytes) "
+                                f"in message {message.id}")
         
         return message_data
     
+    @staticmethod
+    def media_attachment(media, path, size: int) -> Dict[str, Any]:
+        """Outbox-safe description of a spooled file to upload with the post"""
+        filename, content_type = media_filename(media)
+        return {'path': str(path), 'filename': filename, 'content_type': content_type, 'size': size}
+    
     def extract_formatting(self, message) -> Dict[str, Any]:
         """Extract message formatting information"""
         formatting = {
@@ -297,10 +832,15 @@ class TelegramMessageReader:
         
         # Image trap detection
         image_result = {'is_trap': False}
-        if message_data['media_data']:
-            image_result = await self.trap_detector.detect_image_traps(
-                message_data['media_data'], pair.pair_name
-            )
+        if message_data['media_hash']:
+            key = message_data.get('media_key')
+            version = config_manager.get_blocklist_version()
+            image_result = self.media_cache.get_verdict(key, pair.pair_name, version)
+            if image_result is None:
+                image_result = await self.trap_detector.detect_image_traps(
+                    message_data['media_hash'], pair.pair_name, message_data['media_perceptual']
+                )
+                self.media_cache.put_verdict(key, pair.pair_name, version, image_result)
         
         # Combine results
         if text_result['is_trap'] or image_result['is_trap']:
@@ -320,6 +860,7 @@ class TelegramMessageReader:
         # Auto-pause pair if high confidence trap
         if trap_result.get('text_trap', {}).get('confidence', 0) > 0.8:
             config_manager.update_pair_status(pair.pair_name, "paused")
+            await self.refresh_pairs()
             logger.info(f"Auto-paused pair {pair.pair_name} due to trap detection")
             
             # Notify admin bot
@@ -336,11 +877,13 @@ class TelegramMessageReader:
         
         # Pause pair temporarily
         config_manager.update_pair_status(pair.pair_name, "paused")
+        await self.refresh_pairs()
         
         await self.notify_admin_bot(
             f"⚠️ EXCESSIVE EDITS\n"
             f"Pair: {pair.pair_name}\n"
-            f"Message edited >3 times\n"
+            f"Message edited >{self.message_tracker.edit_threshold} times "
+            f"within {self.message_tracker.window:.0f}s\n"
             f"Pair auto-paused"
         )
         
@@ -351,6 +894,7 @@ class TelegramMessageReader:
         """Auto-resume pair after delay"""
         await asyncio.sleep(delay_seconds)
         config_manager.update_pair_status(pair_name, "active")
+        await self.refresh_pairs()
         logger.info(f"Auto-resumed pair {pair_name}")
         
         await self.notify_admin_bot(
@@ -395,22 +939,283 @@ class TelegramMessageReader:
             
             # Add media info
             if message_data['has_media']:
+                media_value = message_data.get('media_type', 'Unknown')
+                if message_data.get('media_upload') == 'too_large' and message_data['media_size']:
+                    media_value += f" ({message_data['media_size'] / MB:.1f} MB, too large to upload)"
                 payload['embeds'][0]['fields'].append({
                     'name': 'Media',
-                    'value': message_data.get('media_type', 'Unknown'),
+                    'value': media_value,
                     'inline': True
                 })
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(webhook_url, json=payload) as response:
-                    if response.status == 204:
-                        logger.info(f"✅ Forwarded to Discord: {pair.pair_name}")
-                    else:
-                        logger.error(f"❌ Discord webhook failed {response.status}: {await response.text()}")
+            item = {
+                'action': 'edit' if message_data.get('edited') else 'post',
+                'url': webhook_url,
+                'payload': payload,
+                'source': [message_data.get('chat_id'), message_data['message_id']]
+            }
+            attachment = message_data.get('media_file')
+            if attachment:
+                # Uploaded from the spool file when the post is sent; images show inside the embed
+                item['attachment'] = attachment
+                if attachment['content_type'].startswith('image/'):
+                    payload['embeds'][0]['image'] = {'url': f"attachment://{attachment['filename']}"}
+            
+            if not message_data.get('edited'):
+                self.batch_window.observe(pair.pair_name)
+            await self.submit_to_discord(pair.pair_name, item)
                         
         except Exception as e:
             logger.error(f"Error forwarding to Discord: {e}")
     
+    async def forward_to_telegram(self, message_data: Dict[str, Any], pair: PairConfig):
+        """Direct mode: queue the cleaned text for the pair's destination channel, without the Discord round trip"""
+        if message_data.get('edited'):
+            # Same as the Discord bot path, which only ever sees new webhook posts
+            return
+        if not pair.destination_tg_channel or not pair.bot_token:
+            logger.warning(f"Direct pair {pair.pair_name} has no destination channel or bot token")
+            return
+        text = clean_for_telegram(message_data['text'])
+        if not text:
+            return
+        item = {
+            'text': text,
+            'destination_tg_channel': pair.destination_tg_channel,
+            'source': [message_data.get('chat_id'), message_data['message_id']]
+        }
+        try:
+            await self.outbox.submit('telegram', pair.pair_name, item)
+        except Exception as e:
+            logger.error(f"❌ Outbox unavailable, posting to Telegram directly: {e}")
+            try:
+                await self.send_to_telegram(pair.pair_name, item)
+            except DeliveryError as e:
+                logger.error(f"Error posting to Telegram: {e}")
+    
+    def delivery_pair(self, pair_name: str) -> Optional[PairConfig]:
+        """Config to deliver a queued post with, even if the pair was paused, moved or deleted since"""
+        # Owned active pairs first, then pairs.json as a whole (paused pairs, pairs moved to another shard)
+        for pairs in (self.pairs, config_manager.get_pairs()):
+            pair = next((pair for pair in pairs if pair.pair_name == pair_name), None)
+            if pair is not None:
+                return pair
+        return self.deleted_pairs.get(pair_name)
+    
+    async def send_to_telegram(self, pair_name: str, item: Dict[str, Any]):
+        """Outbox sender for direct pairs: post with the pair's bot token, raising DeliveryError to retry
+        
+        The destination travels in the item like the webhook URL does for
+        Discord, so only the bot token is looked up.
+        """
+        pair = self.delivery_pair(pair_name)
+        destination = item.get('destination_tg_channel') or (pair.destination_tg_channel if pair else None)
+        if pair is None or not destination or not pair.bot_token:
+            raise PermanentDeliveryError(f"pair {pair_name} has no destination channel or bot token")
+        try:
+            await self.telegram_sender.send_message(
+                destination, item['text'], [pair.bot_token],
+                parse_mode='HTML', disable_web_page_preview=True
+            )
+        except TelegramSendError as e:
+            # A bad message or a bot without rights in the chat is dead-lettered instead of blocking the lane
+            error = PermanentDeliveryError if e.permanent else DeliveryError
+            raise error(f"Telegram did not accept the post for {pair_name}: {e}") from e
+        logger.info(f"✅ Forwarded to Telegram: {pair_name}")
+    
+    async def submit_to_discord(self, pair_name: str, item: Dict[str, Any]):
+        """Queue a webhook post, edit or delete on the pair's outbox lane"""
+        try:
+            await self.outbox.submit('discord', pair_name, item)
+        except Exception as e:
+            # Outbox database unusable (disk full, I/O error): fall back to one direct attempt
+            logger.error(f"❌ Outbox unavailable, sending directly: {e}")
+            await self.send_to_discord(pair_name, item)
+    
+    async def send_to_discord(self, pair_name: str, item: Dict[str, Any]):
+        """Outbox sender: post, edit or delete one webhook message, raising DeliveryError to retry
+        
+        Runs in lane order, so by the time an edit or delete is sent the post
+        it refers to has been made and its webhook message id recorded.
+        """
+        action = item.get('action', 'post')
+        source = item.get('source')
+        if source and source[0] is None:
+            source = None
+        mapped = self.webhook_messages.get(pair_name, *source) if source else None
+        url = item['url']
+        
+        if action == 'delete':
+            if not mapped:
+                if mapped is None and source:
+                    # Deleted before its post went out: the tombstone makes the post a no-op
+                    self.webhook_messages.add(pair_name, *source, WebhookMessageStore.TOMBSTONE)
+                return
+            if '#' in mapped:
+                response = await self.update_batched_post(pair_name, url, mapped, None)
+            else:
+                response = await webhook_scheduler.execute(pair_name, webhook_message_url(url, mapped), method='DELETE')
+            # 404: already removed on Discord
+            if response is None or response.ok or response.status == 404:
+                self.webhook_messages.add(pair_name, *source, WebhookMessageStore.TOMBSTONE)
+                logger.info(f"🗑️ Deleted on Discord: {pair_name}")
+                return
+        elif mapped == WebhookMessageStore.TOMBSTONE:
+            logger.info(f"Skipping {action} of a deleted message for {pair_name}")
+            return
+        elif mapped and action == 'post':
+            # Replayed after a crash between the send and its ack: already on Discord
+            return
+        elif mapped:
+            if '#' in mapped:
+                piece = {'content': item['payload'].get('content'), 'embeds': item['payload'].get('embeds')}
+                response = await self.update_batched_post(pair_name, url, mapped, piece)
+            else:
+                # PATCH only accepts message fields, not the webhook's username/avatar
+                payload = {key: value for key, value in item['payload'].items() if key in ('content', 'embeds')}
+                response = await webhook_scheduler.execute(
+                    pair_name, webhook_message_url(url, mapped), method='PATCH', json=payload
+                )
+            # 404: removed on Discord, nothing left to edit
+            if response is None or response.ok or response.status == 404:
+                logger.info(f"✏️ Edited on Discord: {pair_name}")
+                return
+        else:
+            # wait=true makes Discord return the message, whose id later edits and deletes need
+            response = await self.post_to_discord(pair_name, with_wait(url) if source else url, item)
+            if response.ok:
+                if source and isinstance(response.data, dict) and response.data.get('id'):
+                    self.webhook_messages.add(pair_name, *source, str(response.data['id']))
+                logger.info(f"✅ Forwarded to Discord: {pair_name}")
+                return
+        
+        raise self.webhook_error(response)
+    
+    async def post_to_discord(self, pair_name: str, url: str, item: Dict[str, Any]) -> WebhookResponse:
+        """Post a webhook message, uploading the item's spooled media as multipart/form-data
+        
+        The file is streamed from disk into the request. When it is over the
+        webhook's upload limit, or Discord answers 413, or the spool file is
+        gone (a very late retry), the post goes out without it.
+        """
+        payload = item['payload']
+        attachment = item.get('attachment')
+        if attachment:
+            path = Path(attachment['path'])
+            route = webhook_route_key(url)
+            if attachment['size'] > self.upload_limits.get(route, self.media_spool.upload_limit):
+                reason = 'too large to upload'
+            elif not path.exists():
+                reason = 'no longer spooled'
+            else:
+                files = []
+                
+                def form() -> aiohttp.FormData:
+                    # Called again for each attempt: a form's file can only be sent once
+                    files.append(open(path, 'rb'))
+                    return self.upload_form(payload, attachment, files[-1])
+                
+                try:
+                    response = await webhook_scheduler.execute(pair_name, url, data=form)
+                finally:
+                    for file in files:
+                        file.close()
+                if response.status != 413:
+                    return response
+                self.upload_limits[route] = attachment['size'] - 1
+                reason = 'too large to upload'
+            logger.info(f"Posting without {attachment['filename']} ({attachment['size']} bytes) "
+                        f"for {pair_name}: {reason}")
+            payload = self.without_attachment(payload, attachment, reason)
+        return await webhook_scheduler.execute(pair_name, url, json=payload)
+    
+    @staticmethod
+    def upload_form(payload: Dict[str, Any], attachment: Dict[str, Any], file) -> aiohttp.FormData:
+        form = aiohttp.FormData()
+        body = dict(payload, attachments=[{'id': 0, 'filename': attachment['filename']}])
+        form.add_field('payload_json', json.dumps(body), content_type='application/json')
+        form.add_field('files[0]', file, filename=attachment['filename'], content_type=attachment['content_type'])
+        return form
+    
+    @staticmethod
+    def without_attachment(payload: Dict[str, Any], attachment: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Payload for posting without the file: no attachment:// image, and the reason in the Media field"""
+        embeds = []
+        for embed in payload.get('embeds') or []:
+            embed = {key: value for key, value in embed.items()
+                     if not (key == 'image' and value.get('url', '').startswith('attachment://'))}
+            embed['fields'] = [
+                dict(embed_field, value=f"{embed_field['value']} ({attachment['size'] / MB:.1f} MB, {reason})")
+                if embed_field.get('name') == 'Media' else embed_field
+                for embed_field in embed.get('fields') or []
+            ]
+            embeds.append(embed)
+        return dict(payload, embeds=embeds)
+    
+    @staticmethod
+    def webhook_error(response) -> DeliveryError:
+        """Retryable or permanent failure for a webhook response that was not a success"""
+        # 429 here means the scheduler's own retries ran out; 5xx is Discord having trouble
+        if response.status == 429 or response.status >= 500:
+            return DeliveryError(f"Discord webhook {response.status}: {response.text[:200]}")
+        # Other 4xx: malformed payload or deleted webhook, retrying cannot help
+        return PermanentDeliveryError(f"Discord webhook {response.status}: {response.text[:200]}")
+    
+    def discord_batch_window(self, pair_name: str, item: Dict[str, Any]) -> Optional[float]:
+        """Outbox batch window: only new posts (without uploads) of batching pairs are coalesced"""
+        if item.get('action', 'post') != 'post' or item.get('attachment'):
+            return None
+        return self.batch_window.window(pair_name)
+    
+    async def send_batch_to_discord(self, pair_name: str, items: List[Dict[str, Any]]) -> int:
+        """Outbox batch sender: post as many leading items as fit in one webhook message"""
+        # Replays of posts already made, and posts of since-deleted messages, go through the single path
+        count = 0
+        for item in items:
+            source = item.get('source')
+            if item['url'] != items[0]['url'] or (source and source[0] is not None
+                                                  and self.webhook_messages.get(pair_name, *source) is not None):
+                break
+            count += 1
+        count = pack_count([item['payload'] for item in items[:count]])
+        if count <= 1:
+            await self.send_to_discord(pair_name, items[0])
+            return 1
+        
+        batch = items[:count]
+        base = {key: value for key, value in batch[0]['payload'].items() if key not in ('content', 'embeds')}
+        pieces = [{'content': item['payload'].get('content'), 'embeds': item['payload'].get('embeds')} for item in batch]
+        response = await webhook_scheduler.execute(pair_name, with_wait(batch[0]['url']), json=render_batch(base, pieces))
+        if not response.ok:
+            raise self.webhook_error(response)
+        
+        message_id = str(response.data['id']) if isinstance(response.data, dict) and response.data.get('id') else None
+        if message_id:
+            self.webhook_messages.put_batch(message_id, {'base': base, 'pieces': pieces})
+            for index, item in enumerate(batch):
+                source = item.get('source')
+                if source and source[0] is not None:
+                    self.webhook_messages.add(pair_name, *source, f"{message_id}#{index}")
+        logger.info(f"✅ Forwarded {count} messages to Discord in one post: {pair_name}")
+        return count
+    
+    async def update_batched_post(self, pair_name: str, url: str, mapped: str,
+                                  piece: Optional[Dict[str, Any]]):
+        """Replace (or, with piece=None, remove) one message of a batched post; None if nothing to do"""
+        message_id, _, index = mapped.partition('#')
+        batch = self.webhook_messages.get_batch(message_id)
+        if batch is None:
+            logger.info(f"Batched post {message_id} has expired, not updating it: {pair_name}")
+            return None
+        batch['pieces'][int(index)] = piece
+        self.webhook_messages.put_batch(message_id, batch)
+        if not any(batch['pieces']):
+            return await webhook_scheduler.execute(pair_name, webhook_message_url(url, message_id), method='DELETE')
+        body = render_batch({}, batch['pieces'])
+        return await webhook_scheduler.execute(
+            pair_name, webhook_message_url(url, message_id), method='PATCH', json=body
+        )
+    
     async def notify_admin_bot(self, message: str):
         """Send notification to admin bot"""
         if not self.admin_bot_token:
@@ -429,8 +1234,10 @@ class TelegramMessageReader:
                 'parse_mode': 'HTML'
             }
             
-            async with aiohttp.ClientSession() as session:
-                await session.post(url, json=payload)
+            session = http_client.get_session()
+            async with session.post(url, json=payload) as response:
+                if response.status != 200:
+                    logger.error(f"Admin notification failed {response.status}: {await response.text()}")
                 
         except Exception as e:
             logger.error(f"Error notifying admin bot: {e}")
@@ -441,19 +1248,55 @@ class TelegramMessageReader:
         
         try:
             await self.load_config()
+            self.loop_lag.start()
+            # Deliveries left over from the last run go out while sessions connect
+            await self.outbox.start()
+            if self.perceptual_hashing:
+                # Fork analysis workers before any client connection exists
+                await self.media_analyzer.start()
             await self.create_clients()
+            self.config_watcher.start()
             
             if not self.clients:
-                logger.error("❌ No active clients available. Exiting.")
-                return
+                if not self.shard.sharded:
+                    logger.error("❌ No active clients available. Exiting.")
+                    return
+                # Sharded: stay up so a config reload can hand this worker sessions later
+                logger.warning("⚠️ No sessions assigned to this shard; waiting for config reload")
             
             self.running = True
             logger.info(f"✅ Message reader started with {len(self.clients)} active sessions")
             logger.info(f"📊 Monitoring {len(self.pairs)} active pairs")
             
             # Keep running
+            elapsed = 0
             while self.running:
                 await asyncio.sleep(1)
+                elapsed += 1
+                if self.health.enabled and elapsed % max(1, int(self.health_interval)) == 0:
+                    self.health.report(self.health_report())
+                if self.stats_log_interval and elapsed % self.stats_log_interval == 0:
+                    logger.info(f"📈 Update filter stats: {self.get_update_stats()}")
+                    logger.info(f"📈 Session startup: {self.startup.stats()}")
+                    logger.info(f"📈 Chat metadata cache: {self.chat_cache.stats()}")
+                    logger.info(f"📈 Config writes: {config_manager.writer.stats()}")
+                    logger.info(f"📈 Edit tracker: {self.message_tracker.stats()}")
+                    logger.info(f"📈 Duplicate suppression: {self.duplicates.stats()}")
+                    logger.info(f"📈 Pipeline metrics: {self.get_pipeline_metrics()}")
+                    logger.info(f"📈 Discord webhooks: {webhook_scheduler.stats()}")
+                    logger.info(f"📈 Direct Telegram posts: {self.telegram_sender.stats()}")
+                    logger.info(f"📈 Delivery outbox: {self.outbox.stats()}")
+                    logger.info(f"📈 Webhook batching: {self.batch_window.stats()}")
+                    logger.info(f"📈 Media streaming: {self.media_streamer.stats.as_dict()}")
+                    logger.info(f"📈 Media cache: {self.media_cache.stats()}")
+                    logger.info(f"📈 Media spool: {self.media_spool.stats()}")
+                    logger.info(f"📈 Media analysis: {self.media_analyzer.stats()}")
+                    logger.info(f"📈 Event loop lag: {self.loop_lag.stats()}")
+                    self.media_cache.save()
+                if elapsed % 60 == 0:
+                    self.sweep_media_spool()
+                if elapsed % 3600 == 0:
+                    self.expire_webhook_mappings()
                 
         except KeyboardInterrupt:
             logger.info("⚠️ Received interrupt signal, shutting down...")
@@ -462,10 +1305,42 @@ class TelegramMessageReader:
         finally:
             await self.cleanup()
     
+    def expire_webhook_mappings(self):
+        """Forget webhook message ids older than WEBHOOK_MAPPING_TTL_DAYS; their sources are rarely edited again"""
+        try:
+            removed = self.webhook_messages.delete_before(datetime.now() - timedelta(days=self.webhook_mapping_ttl))
+            if removed:
+                self.webhook_messages.checkpoint()
+                logger.info(f"🧹 Expired {removed} webhook message mappings")
+        except Exception as e:
+            logger.error(f"Error expiring webhook message mappings: {e}")
+    
+    def sweep_media_spool(self):
+        """Delete spooled media that no queued Discord post needs any more"""
+        try:
+            keep = [payload['attachment']['path'] for payload in self.outbox.pending_payloads('discord')
+                    if payload.get('attachment')]
+            removed = self.media_spool.sweep(keep)
+            if removed:
+                logger.info(f"🧹 Removed {removed} spooled media files")
+        except Exception as e:
+            logger.error(f"Error sweeping media spool: {e}")
+    
     async def cleanup(self):
         """Enhanced cleanup with proper resource management"""
         logger.info("🧹 Cleaning up resources...")
         
+        await self.config_watcher.stop()
+        if self._retire_tasks:
+            await asyncio.gather(*self._retire_tasks, return_exceptions=True)
+        
+        # Deliver in-flight messages while clients can still download media
+        try:
+            await asyncio.wait_for(self.pipeline.close(), timeout=self.pipeline_drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Pipeline drain timed out, discarding queued messages")
+            await self.pipeline.close(drain=False)
+        
         for session_name, client in self.clients.items():
             try:
                 await client.disconnect()
@@ -473,6 +1348,19 @@ class TelegramMessageReader:
             except Exception as e:
                 logger.error(f"❌ Error disconnecting session {session_name}: {e}")
         
+        await self.chat_cache.close()
+        # Undelivered entries stay on disk and are replayed on the next start
+        await self.outbox.close(timeout=self.outbox_drain_timeout)
+        self.webhook_messages.close()
+        await webhook_scheduler.close()
+        await self.telegram_sender.close()
+        await http_client.close()
+        await self.media_analyzer.close()
+        await self.loop_lag.stop()
+        self.media_cache.save()
+        # Pause/resume flips may still be queued for the writer thread
+        await asyncio.to_thread(config_manager.flush)
+        
         self.running = False
         logger.info("🔒 Cleanup completed")
 
@@ -492,8 +1380,17 @@ async def main():
     
     logger.info("🎯 AutoForwardX System Starting...")
     
+    # READER_WORKERS > 1: this process only supervises sharded worker processes
+    workers = int(os.getenv('READER_WORKERS', '1'))
+    if workers > 1 and 'READER_SHARD_INDEX' not in os.environ:
+        await ReaderSupervisor(workers).run()
+        return
+    
     # Start the enhanced message reader
     reader = TelegramMessageReader()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, reader.stop)
+    loop.add_signal_handler(signal.SIGHUP, reader.request_reload)
     await reader.run()
 
 if __name__ == "__main__":
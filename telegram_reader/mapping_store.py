@@ -0,0 +1,201 @@
+"""
+SQLite-backed message mapping stores for AutoForwardX
+WAL journal, primary-key lookups and an indexed timestamp for expiry,
+so each forwarded message costs one small write instead of a full rewrite
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_mappings (
+    discord_msg_id TEXT PRIMARY KEY,
+    telegram_msg_id TEXT NOT NULL,
+    pair_name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    edit_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_message_mappings_created_at ON message_mappings (created_at);
+"""
+
+WEBHOOK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_messages (
+    pair_name TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    webhook_message_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (pair_name, chat_id, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_webhook_messages_created_at ON webhook_messages (created_at);
+CREATE TABLE IF NOT EXISTS webhook_batches (
+    webhook_message_id TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_webhook_batches_created_at ON webhook_batches (created_at);
+"""
+
+class MappingStore:
+    """Discord message id -> Telegram message id, persisted in SQLite (WAL mode)"""
+    
+    def __init__(self, db_path: Union[str, Path], legacy_json: Optional[Union[str, Path]] = None):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        # WAL + NORMAL: commits are atomic and survive a process crash without an fsync per message
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        if legacy_json is not None:
+            self.import_json(Path(legacy_json))
+    
+    def import_json(self, path: Path) -> int:
+        """One-time migration from the old whole-file message_mappings.json"""
+        if not path.exists():
+            return 0
+        try:
+            with open(path, 'r') as f:
+                mappings = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading legacy message mappings {path}: {e}")
+            return 0
+        
+        rows = []
+        for discord_msg_id, mapping in mappings.items():
+            try:
+                created_at = datetime.fromisoformat(mapping['timestamp']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                created_at = time.time()
+            rows.append((discord_msg_id, str(mapping.get('telegram_msg_id', '')),
+                         mapping.get('pair_name', ''), created_at, int(mapping.get('edit_count', 0))))
+        
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO message_mappings VALUES (?, ?, ?, ?, ?)', rows
+            )
+        path.rename(path.with_suffix(path.suffix + '.migrated'))
+        logger.info(f"Migrated {len(rows)} message mappings from {path}")
+        return len(rows)
+    
+    def add(self, discord_msg_id: str, telegram_msg_id: str, pair_name: str,
+            created_at: Optional[float] = None):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO message_mappings VALUES (?, ?, ?, ?, 0)',
+            (discord_msg_id, telegram_msg_id, pair_name, created_at if created_at is not None else time.time())
+        )
+    
+    def get(self, discord_msg_id: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            'SELECT * FROM message_mappings WHERE discord_msg_id = ?', (discord_msg_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'telegram_msg_id': row['telegram_msg_id'],
+            'pair_name': row['pair_name'],
+            'timestamp': datetime.fromtimestamp(row['created_at']).isoformat(),
+            'edit_count': row['edit_count']
+        }
+    
+    def increment_edit_count(self, discord_msg_id: str) -> int:
+        """Increment edit count and return the new count (0 if unknown)"""
+        # fetchall() steps the statement to completion so the write is committed now
+        rows = self.conn.execute(
+            'UPDATE message_mappings SET edit_count = edit_count + 1 '
+            'WHERE discord_msg_id = ? RETURNING edit_count', (discord_msg_id,)
+        ).fetchall()
+        return rows[0][0] if rows else 0
+    
+    def delete_before(self, cutoff: datetime) -> int:
+        """Range delete on the created_at index; returns the number of rows removed"""
+        cursor = self.conn.execute(
+            'DELETE FROM message_mappings WHERE created_at < ?', (cutoff.timestamp(),)
+        )
+        return cursor.rowcount
+    
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM message_mappings').fetchone()[0]
+    
+    def checkpoint(self):
+        """Fold the WAL back into the main database file"""
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    
+    def close(self):
+        self.conn.close()
+
+class WebhookMessageStore:
+    """(pair, Telegram chat id, message id) -> Discord webhook message id, persisted in SQLite (WAL mode)
+    
+    An empty webhook message id is a tombstone: the source message was deleted
+    before its post went out, so the post is skipped. Messages posted together
+    in one batched post map to "<id>#<index>", and the batch's per-message
+    parts are kept so one of them can be edited or removed later.
+    """
+    
+    TOMBSTONE = ''
+    
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(WEBHOOK_SCHEMA)
+    
+    def get(self, pair_name: str, chat_id: int, message_id: int) -> Optional[str]:
+        row = self.conn.execute(
+            'SELECT webhook_message_id FROM webhook_messages WHERE pair_name = ? AND chat_id = ? AND message_id = ?',
+            (pair_name, chat_id, message_id)
+        ).fetchone()
+        return row[0] if row is not None else None
+    
+    def add(self, pair_name: str, chat_id: int, message_id: int, webhook_message_id: str,
+            created_at: Optional[float] = None):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO webhook_messages VALUES (?, ?, ?, ?, ?)',
+            (pair_name, chat_id, message_id, webhook_message_id,
+             created_at if created_at is not None else time.time())
+        )
+    
+    def get_batch(self, webhook_message_id: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            'SELECT body FROM webhook_batches WHERE webhook_message_id = ?', (webhook_message_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+    
+    def put_batch(self, webhook_message_id: str, body: Dict, created_at: Optional[float] = None):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO webhook_batches VALUES (?, ?, ?)',
+            (webhook_message_id, json.dumps(body, ensure_ascii=False),
+             created_at if created_at is not None else time.time())
+        )
+    
+    def delete_before(self, cutoff: datetime) -> int:
+        """Range delete on the created_at indexes; returns the number of mappings removed"""
+        with self.conn:
+            self.conn.execute('BEGIN')
+            cursor = self.conn.execute(
+                'DELETE FROM webhook_messages WHERE created_at < ?', (cutoff.timestamp(),)
+            )
+            self.conn.execute('DELETE FROM webhook_batches WHERE created_at < ?', (cutoff.timestamp(),))
+        return cursor.rowcount
+    
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM webhook_messages').fetchone()[0]
+    
+    def checkpoint(self):
+        """Fold the WAL back into the main database file"""
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    
+    def close(self):
+        self.conn.close()
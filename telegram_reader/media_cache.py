@@ -0,0 +1,153 @@
+"""
+Media dedup cache for AutoForwardX
+Maps Telegram photo/document ids to their content hash and per-pair trap
+verdicts so media already seen (reposts, fan-out to several pairs) is not
+downloaded again
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from telethon.tl import types
+
+logger = logging.getLogger(__name__)
+
+def media_key(media) -> Optional[str]:
+    """Stable id for a message's photo or document, or None for other media"""
+    if isinstance(media, types.MessageMediaPhoto) and isinstance(media.photo, types.Photo):
+        return f"photo:{media.photo.id}:{media.photo.access_hash}"
+    if isinstance(media, types.MessageMediaDocument) and isinstance(media.document, types.Document):
+        return f"document:{media.document.id}:{media.document.access_hash}"
+    return None
+
+@dataclass
+class MediaCacheEntry:
+    md5: str
+    size: Optional[int]
+    created_at: float
+    perceptual: Optional[Dict[str, str]] = None
+    blocklist_version: int = -1
+    verdicts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+class MediaCache:
+    """LRU + TTL cache of media hashes, optionally persisted to a JSON file"""
+    
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 path: Optional[Union[str, Path]] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('MEDIA_CACHE_SIZE', '10000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('MEDIA_CACHE_TTL', '86400'))
+        if path is None:
+            path = os.getenv('MEDIA_CACHE_PATH') or None
+        self.path = Path(path) if path else None
+        self.entries: 'OrderedDict[str, MediaCacheEntry]' = OrderedDict()
+        self.dirty = False
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes_saved = 0
+        
+        if self.path is not None:
+            self.load()
+    
+    def get(self, key: Optional[str]) -> Optional[MediaCacheEntry]:
+        """Look up a media id; counts a hit (and the bytes it saved) or a miss"""
+        if key is None:
+            return None
+        entry = self.entries.get(key)
+        if entry is not None and self.ttl and time.time() - entry.created_at > self.ttl:
+            del self.entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += entry.size or 0
+        return entry
+    
+    def put(self, key: Optional[str], md5: str, size: Optional[int],
+            perceptual: Optional[Dict[str, str]] = None):
+        if key is None:
+            return
+        self.entries[key] = MediaCacheEntry(md5, size, time.time(), perceptual)
+        self.entries.move_to_end(key)
+        self.dirty = True
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def get_verdict(self, key: Optional[str], pair_name: str, blocklist_version: int) -> Optional[Dict[str, Any]]:
+        """Cached image trap result for a pair, valid only for the blocklist it was computed against"""
+        entry = self.entries.get(key) if key is not None else None
+        if entry is None or entry.blocklist_version != blocklist_version:
+            return None
+        return entry.verdicts.get(pair_name)
+    
+    def put_verdict(self, key: Optional[str], pair_name: str, blocklist_version: int, verdict: Dict[str, Any]):
+        entry = self.entries.get(key) if key is not None else None
+        if entry is None:
+            return
+        if entry.blocklist_version != blocklist_version:
+            entry.verdicts = {}
+            entry.blocklist_version = blocklist_version
+        entry.verdicts[pair_name] = verdict
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'bytes_saved': self.bytes_saved
+        }
+    
+    def load(self):
+        """Load persisted hashes; verdicts are not persisted since the blocklist may have changed"""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading media cache {self.path}: {e}")
+            return
+        
+        now = time.time()
+        rows = sorted(data.items(), key=lambda item: item[1].get('created_at', 0))
+        for key, row in rows[-self.max_entries:]:
+            if self.ttl and now - row.get('created_at', 0) > self.ttl:
+                continue
+            self.entries[key] = MediaCacheEntry(row['md5'], row.get('size'), row['created_at'],
+                                                row.get('perceptual'))
+        logger.info(f"Loaded {len(self.entries)} media cache entries from {self.path}")
+    
+    def save(self):
+        """Write hashes to disk (temp file + rename) if anything changed"""
+        if self.path is None or not self.dirty:
+            return
+        data = {
+            key: {'md5': entry.md5, 'size': entry.size, 'created_at': entry.created_at,
+                  'perceptual': entry.perceptual}
+            for key, entry in self.entries.items()
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            logger.error(f"Error saving media cache {self.path}: {e}")
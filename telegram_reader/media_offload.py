@@ -0,0 +1,176 @@
+"""
+CPU-bound media analysis off the event loop for AutoForwardX
+Runs image decoding and perceptual hashing in a process pool (payload handed
+over through shared memory instead of being pickled), a thread pool, or inline,
+behind a bounded submit queue
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Optional
+
+from perceptual_hash import compute_hashes
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_MODES = ('process', 'thread', 'inline')
+
+class _MemoryViewReader(io.RawIOBase):
+    """Read-only seekable file over a memoryview, so Pillow parses shared memory in place"""
+    
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        count = max(0, min(len(buffer), len(self.view) - self.position))
+        buffer[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+    
+    def tell(self) -> int:
+        return self.position
+
+def _hash_shared_memory(name: str, size: int) -> Dict[str, str]:
+    """Worker entry point: attach to the parent's segment and hash it without copying it over a pipe"""
+    segment = shared_memory.SharedMemory(name=name)
+    # The parent owns (and unlinks) the segment; stop this process's tracker from claiming it too
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    view = segment.buf[:size]
+    reader = _MemoryViewReader(view)
+    try:
+        return compute_hashes(reader)
+    finally:
+        reader.view = None
+        view.release()
+        segment.close()
+
+def _warm_up() -> int:
+    return os.getpid()
+
+def _init_worker(niceness: int):
+    """Run analysis at lower CPU priority than the process serving the event loop"""
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+class MediaAnalyzer:
+    """Bounded offload stage for perceptual hashing"""
+    
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        self.mode = (mode or os.getenv('MEDIA_OFFLOAD_MODE', 'process')).lower()
+        if self.mode not in OFFLOAD_MODES:
+            logger.warning(f"Unknown MEDIA_OFFLOAD_MODE {self.mode!r}, using thread")
+            self.mode = 'thread'
+        self.workers = workers or int(os.getenv('MEDIA_OFFLOAD_WORKERS', str(min(4, os.cpu_count() or 1))))
+        self.queue_size = queue_size or int(os.getenv('MEDIA_OFFLOAD_QUEUE_SIZE', '32'))
+        self.niceness = int(os.getenv('MEDIA_OFFLOAD_NICE', '10'))
+        self._slots = asyncio.Semaphore(self.queue_size)
+        self._executor: Optional[Executor] = None
+        
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == 'process':
+                # fork keeps workers cheap to start and does not re-import the entry script;
+                # start() forks them before the clients open connections
+                method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker, initargs=(self.niceness,)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='media-analysis')
+        return self._executor
+    
+    async def start(self):
+        """Create the pool up front so the first photo does not pay for worker startup"""
+        if self.mode == 'inline':
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._get_executor(), _warm_up) for _ in range(self.workers)
+        ))
+    
+    async def perceptual_hashes(self, data: bytes) -> Dict[str, str]:
+        """Hash an encoded image off the loop; waits for a slot when the queue is full"""
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        
+        self.submitted += 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await self._run(data)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self.in_flight -= 1
+            self._slots.release()
+    
+    async def _run(self, data: bytes) -> Dict[str, str]:
+        if self.mode == 'inline':
+            return compute_hashes(data)
+        
+        loop = asyncio.get_running_loop()
+        if self.mode == 'thread':
+            return await loop.run_in_executor(self._get_executor(), compute_hashes, data)
+        
+        segment = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        try:
+            segment.buf[:len(data)] = data
+            return await loop.run_in_executor(self._get_executor(), _hash_shared_memory, segment.name, len(data))
+        finally:
+            segment.close()
+            segment.unlink()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'workers': self.workers,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'avg_ms': round(self.busy_seconds / self.submitted * 1000, 2) if self.submitted else 0.0
+        }
+    
+    async def close(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            # Joining workers blocks, so do it off the loop
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
@@ -0,0 +1,142 @@
+"""
+Media spool for AutoForwardX
+Keeps media that is to be uploaded to Discord in content-addressed files,
+written chunk by chunk during the same download that hashes it, so the bytes
+are fetched from Telegram once and streamed from disk into the upload
+"""
+
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+class SpoolWriter:
+    """One download being written to a temporary spool file
+    
+    Once more than `limit` bytes arrive the file is dropped and later chunks
+    are ignored: the media cannot be uploaded, but hashing carries on.
+    """
+    
+    def __init__(self, spool: 'MediaSpool', limit: int):
+        self.spool = spool
+        self.limit = limit
+        self.path = spool.directory / f"tmp-{uuid.uuid4().hex}"
+        self.file = open(self.path, 'wb')
+        self.written = 0
+    
+    def write(self, chunk: bytes):
+        if self.file is None:
+            return
+        self.written += len(chunk)
+        if self.written > self.limit:
+            self.spool.oversize += 1
+            self.discard()
+            return
+        self.file.write(chunk)
+    
+    def commit(self, md5: str) -> Optional[Path]:
+        """Move the finished download to its content address; None if it was dropped"""
+        if self.file is None:
+            return None
+        self.file.close()
+        self.file = None
+        path = self.spool.path_for(md5)
+        os.replace(self.path, path)
+        self.spool.spooled += 1
+        self.spool.bytes_spooled += self.written
+        return path
+    
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+class MediaSpool:
+    """Directory of media files awaiting upload, named by MD5
+    
+    Several pairs (and reposts) of the same media share one file. Files are not
+    deleted when one upload finishes, since another pair's post may still need
+    them; sweep() removes those that no pending delivery references once they
+    are older than `grace` seconds.
+    """
+    
+    def __init__(self, directory: Union[str, Path], upload_limit: Optional[int] = None,
+                 grace: Optional[float] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Discord's attachment limit for webhooks on servers without boosts; 0 turns uploads off
+        self.upload_limit = (upload_limit if upload_limit is not None
+                             else int(os.getenv('DISCORD_UPLOAD_LIMIT', str(10 * MB))))
+        self.grace = grace if grace is not None else float(os.getenv('MEDIA_SPOOL_GRACE', '900'))
+        
+        self.spooled = 0
+        self.bytes_spooled = 0
+        self.reused = 0
+        self.oversize = 0
+        self.swept = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.upload_limit > 0
+    
+    def fits(self, size: Optional[int]) -> bool:
+        """Whether media of this size (None: unknown) may be spooled for upload"""
+        return self.enabled and (size is None or size <= self.upload_limit)
+    
+    def path_for(self, md5: str) -> Path:
+        return self.directory / md5
+    
+    def get(self, md5: Optional[str]) -> Optional[Path]:
+        """Spooled file for already hashed media, if it is still there"""
+        if not md5:
+            return None
+        path = self.path_for(md5)
+        try:
+            # A reuse restarts the grace period
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self.reused += 1
+        return path
+    
+    def writer(self) -> SpoolWriter:
+        return SpoolWriter(self, self.upload_limit)
+    
+    def sweep(self, keep: Iterable[str], now: Optional[float] = None) -> int:
+        """Delete files older than the grace period that are not in keep (paths of pending uploads)"""
+        keep = {Path(path).name for path in keep}
+        cutoff = (time.time() if now is None else now) - self.grace
+        removed = 0
+        for path in self.directory.iterdir():
+            if path.name in keep:
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        self.swept += removed
+        return removed
+    
+    def stats(self) -> Dict[str, Any]:
+        files = list(self.directory.iterdir())
+        return {
+            'files': len(files),
+            'bytes': sum(path.stat().st_size for path in files if path.exists()),
+            'spooled': self.spooled,
+            'bytes_spooled': self.bytes_spooled,
+            'reused': self.reused,
+            'oversize': self.oversize,
+            'swept': self.swept
+        }
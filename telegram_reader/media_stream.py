@@ -0,0 +1,221 @@
+"""
+Streaming media hashing for AutoForwardX
+Downloads photos and documents chunk by chunk through an incremental MD5,
+enforcing per-type size caps so a message never holds a whole file in memory;
+the same chunks can be spooled to disk for upload
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from telethon.tl import types
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+MIN_CHUNK_SIZE = 4 * 1024
+MAX_CHUNK_SIZE = 512 * 1024
+
+@dataclass
+class MediaLimits:
+    """Per-type byte caps; a cap of 0 means unlimited"""
+    chunk_size: int = 128 * 1024
+    max_photo_bytes: int = 10 * MB
+    max_video_bytes: int = 50 * MB
+    max_document_bytes: int = 50 * MB
+    skip_documents_above: int = 0
+    
+    def __post_init__(self):
+        # upload.getFile wants a multiple of 4 KB, at most 512 KB, that divides 1 MB: a power of two in that range
+        chunk_size = 1 << (max(self.chunk_size, 1).bit_length() - 1)
+        chunk_size = min(max(chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        if chunk_size != self.chunk_size:
+            logger.warning(f"MEDIA_CHUNK_SIZE {self.chunk_size} is not usable for Telegram downloads, using {chunk_size}")
+            self.chunk_size = chunk_size
+    
+    @classmethod
+    def from_env(cls) -> 'MediaLimits':
+        return cls(
+            chunk_size=int(os.getenv('MEDIA_CHUNK_SIZE', str(128 * 1024))),
+            max_photo_bytes=int(os.getenv('MEDIA_MAX_PHOTO_BYTES', str(10 * MB))),
+            max_video_bytes=int(os.getenv('MEDIA_MAX_VIDEO_BYTES', str(50 * MB))),
+            max_document_bytes=int(os.getenv('MEDIA_MAX_DOCUMENT_BYTES', str(50 * MB))),
+            skip_documents_above=int(os.getenv('MEDIA_SKIP_DOCUMENTS_ABOVE', '0'))
+        )
+    
+    def cap_for(self, kind: str) -> int:
+        return {'photo': self.max_photo_bytes, 'video': self.max_video_bytes}.get(kind, self.max_document_bytes)
+
+@dataclass
+class MediaDigest:
+    """Result of streaming one media item"""
+    kind: str
+    status: str  # complete, skipped, too_large, unsupported, error
+    md5: Optional[str] = None
+    size: Optional[int] = None
+    bytes_read: int = 0
+    data: Optional[bytes] = None
+    spooled: Optional[str] = None
+
+class MediaStats:
+    """Process-wide download counters; in-flight bytes are the chunk buffers of active downloads"""
+    
+    def __init__(self):
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self.skipped = 0
+        self.aborted = 0
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+    
+    def hold(self, nbytes: int):
+        self.in_flight_bytes += nbytes
+        self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes)
+    
+    def release(self, nbytes: int):
+        self.in_flight_bytes -= nbytes
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'downloads': self.downloads,
+            'bytes_downloaded': self.bytes_downloaded,
+            'skipped': self.skipped,
+            'aborted': self.aborted,
+            'in_flight_bytes': self.in_flight_bytes,
+            'peak_in_flight_bytes': self.peak_in_flight_bytes
+        }
+
+def _largest_photo_size(photo) -> Optional[Any]:
+    """Same choice as Telethon's download_media: the biggest real (non-path) size"""
+    def size_of(item):
+        if isinstance(item, (types.PhotoStrippedSize, types.PhotoCachedSize)):
+            return len(item.bytes)
+        if isinstance(item, types.PhotoSize):
+            return item.size
+        if isinstance(item, types.PhotoSizeProgressive):
+            return max(item.sizes)
+        return -1
+    
+    sizes = [s for s in photo.sizes if not isinstance(s, (types.PhotoPathSize, types.PhotoSizeEmpty))]
+    return max(sizes, key=size_of) if sizes else None
+
+def describe_media(media) -> Tuple[str, Optional[Any], Optional[int], Dict[str, Any]]:
+    """Return (kind, download location, declared size, iter_download kwargs) for a message's media"""
+    if isinstance(media, types.MessageMediaPhoto) and isinstance(media.photo, types.Photo):
+        photo = media.photo
+        size = _largest_photo_size(photo)
+        if size is None:
+            return 'photo', None, None, {}
+        if isinstance(size, types.PhotoCachedSize):
+            # Tiny photos ship inline with the message
+            return 'photo', size.bytes, len(size.bytes), {}
+        if isinstance(size, types.PhotoStrippedSize):
+            return 'photo', None, None, {}
+        declared = size.size if isinstance(size, types.PhotoSize) else max(size.sizes)
+        location = types.InputPhotoFileLocation(
+            id=photo.id, access_hash=photo.access_hash,
+            file_reference=photo.file_reference, thumb_size=size.type
+        )
+        return 'photo', location, declared, {'dc_id': photo.dc_id, 'file_size': declared}
+    
+    if isinstance(media, types.MessageMediaDocument) and isinstance(media.document, types.Document):
+        document = media.document
+        kind = 'video' if (document.mime_type or '').startswith('video/') else 'document'
+        return kind, document, document.size, {}
+    
+    return 'other', None, None, {}
+
+def media_filename(media) -> Tuple[str, str]:
+    """Upload file name and content type for a message's photo or document"""
+    if isinstance(media, types.MessageMediaPhoto) and isinstance(media.photo, types.Photo):
+        return f"photo_{media.photo.id}.jpg", 'image/jpeg'
+    document = getattr(media, 'document', None)
+    mime_type = getattr(document, 'mime_type', None) or 'application/octet-stream'
+    for attribute in getattr(document, 'attributes', None) or []:
+        if isinstance(attribute, types.DocumentAttributeFilename) and attribute.file_name:
+            # Discord rewrites other characters, which would break attachment:// references
+            return re.sub(r'[^A-Za-z0-9._-]', '_', attribute.file_name), mime_type
+    extension = mimetypes.guess_extension(mime_type) or ''
+    return f"file_{getattr(document, 'id', 0)}{extension}", mime_type
+
+class MediaStreamer:
+    """Hash message media incrementally with bounded memory"""
+    
+    def __init__(self, limits: Optional[MediaLimits] = None):
+        self.limits = limits or MediaLimits.from_env()
+        self.stats = MediaStats()
+    
+    async def digest(self, client, media, keep_photo: bool = False, spool=None) -> MediaDigest:
+        """Stream media through MD5, refusing or aborting anything over its type's cap
+        
+        With keep_photo, photo bytes (bounded by the photo cap) are also returned
+        for perceptual hashing; videos and documents are never retained. With a
+        MediaSpool, media within its upload limit is also written to a spool
+        file (its path is returned in `spooled`) from the same chunks.
+        """
+        kind, location, declared, kwargs = describe_media(media)
+        if location is None:
+            return MediaDigest(kind, 'unsupported', size=declared)
+        
+        if isinstance(location, bytes):
+            md5_hex = hashlib.md5(location).hexdigest()
+            spooled = None
+            if spool is not None and spool.fits(len(location)):
+                writer = spool.writer()
+                writer.write(location)
+                spooled = writer.commit(md5_hex)
+            return MediaDigest(kind, 'complete', md5_hex, len(location), len(location),
+                               location if keep_photo else None, str(spooled) if spooled else None)
+        
+        cap = self.limits.cap_for(kind)
+        skip_above = self.limits.skip_documents_above
+        if declared is not None:
+            if kind != 'photo' and skip_above and declared > skip_above:
+                self.stats.skipped += 1
+                return MediaDigest(kind, 'skipped', size=declared)
+            if cap and declared > cap:
+                self.stats.skipped += 1
+                return MediaDigest(kind, 'too_large', size=declared)
+        
+        md5 = hashlib.md5()
+        retained = bytearray() if keep_photo and kind == 'photo' else None
+        writer = spool.writer() if spool is not None and spool.fits(declared) else None
+        bytes_read = 0
+        completed = False
+        self.stats.downloads += 1
+        # Each active download holds at most one chunk: that is the per-message memory bound
+        self.stats.hold(self.limits.chunk_size)
+        downloader = client.iter_download(location, request_size=self.limits.chunk_size, **kwargs)
+        try:
+            async for chunk in downloader:
+                md5.update(chunk)
+                if retained is not None:
+                    retained += chunk
+                if writer is not None:
+                    writer.write(chunk)
+                bytes_read += len(chunk)
+                self.stats.bytes_downloaded += len(chunk)
+                if cap and bytes_read > cap:
+                    # Declared size was missing or wrong: stop pulling from Telegram now
+                    self.stats.aborted += 1
+                    await downloader.close()
+                    return MediaDigest(kind, 'too_large', size=declared, bytes_read=bytes_read)
+            completed = True
+        except Exception as e:
+            logger.error(f"Error streaming {kind}: {e}")
+            return MediaDigest(kind, 'error', size=declared, bytes_read=bytes_read)
+        finally:
+            self.stats.release(self.limits.chunk_size)
+            if writer is not None and not completed:
+                # Aborted or failed part-way: the partial file is useless
+                writer.discard()
+        
+        md5_hex = md5.hexdigest()
+        spooled = writer.commit(md5_hex) if writer is not None else None
+        return MediaDigest(kind, 'complete', md5_hex, bytes_read, bytes_read,
+                           bytes(retained) if retained is not None else None, str(spooled) if spooled else None)
@@ -0,0 +1,382 @@
+"""
+Durable delivery outbox for AutoForwardX
+Every Discord/Telegram delivery is committed to SQLite before it is sent and
+deleted once the destination accepts it; failures back off exponentially,
+rows that keep failing become dead letters, and pending rows replay on startup
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_dead ON outbox (dead, id);
+"""
+
+class DeliveryError(Exception):
+    """Send failed in a way that may succeed later (timeout, 5xx, rate limit); the entry is retried"""
+
+class PermanentDeliveryError(DeliveryError):
+    """Send can never succeed (bad payload, deleted webhook); the entry is dead-lettered at once"""
+
+# sender(lane, payload): return on success, raise to fail
+Sender = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+# batch_sender(lane, payloads): deliver a leading run of payloads as one send and return how many it took
+BatchSender = Callable[[str, List[Dict[str, Any]]], Awaitable[int]]
+# batch_window(lane, payload): None if the entry cannot be batched, else how long it may wait for company
+BatchWindow = Callable[[str, Dict[str, Any]], Optional[float]]
+
+@dataclass
+class OutboxEntry:
+    id: int
+    kind: str
+    lane: str
+    payload: Dict[str, Any]
+    created_at: float
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+
+class Outbox:
+    """At-least-once delivery queue persisted in SQLite (WAL mode)
+    
+    submit() returns once the entry is committed. Commits are grouped: while
+    one transaction is being written, everything submitted meanwhile waits and
+    goes into the next one, so a burst costs one fsync instead of one per
+    message. Entries are delivered in submission order per (kind, lane) by one
+    task per lane; a failing head entry is retried with exponential backoff and
+    holds back the entries behind it, so a pair's messages never reorder. Acks
+    ride along with the next commit, so a crash can repeat a delivery but
+    never lose one.
+    
+    A kind registered with a batch sender may have consecutive entries of a
+    lane delivered as one send: the head entry waits up to its batch window
+    (counted from submission) for followers, or until `max_batch` are queued.
+    Retries always go out alone.
+    """
+    
+    def __init__(self, db_path: Union[str, Path], commit_interval: Optional[float] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 max_attempts: Optional[int] = None):
+        self.db_path = Path(db_path)
+        self.commit_interval = commit_interval if commit_interval is not None else float(os.getenv('OUTBOX_COMMIT_INTERVAL', '0'))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv('OUTBOX_BACKOFF_BASE', '1.0'))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv('OUTBOX_BACKOFF_MAX', '300'))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Written from the commit thread only; _db_lock keeps startup/requeue reads off it
+        self.conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # FULL: a commit is on disk before submit() returns; group commit keeps that to one fsync per batch
+        self.conn.execute('PRAGMA synchronous=FULL')
+        self.conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._ids = itertools.count((self.conn.execute('SELECT MAX(id) FROM outbox').fetchone()[0] or 0) + 1)
+        
+        self.senders: Dict[str, Sender] = {}
+        self.batchers: Dict[str, Tuple[BatchSender, BatchWindow, int]] = {}
+        self._lane_wakeups: Dict[Tuple[str, str], asyncio.Event] = {}
+        self.lanes: Dict[Tuple[str, str], Deque[OutboxEntry]] = {}
+        self._lane_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._ops: List[Tuple[str, tuple]] = []
+        self._committed: List[OutboxEntry] = []
+        self._waiters: List[asyncio.Future] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._commit_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._rng = random.Random()
+        
+        self.enqueued = 0
+        self.replayed = 0
+        self.delivered = 0
+        self.batches = 0
+        self.batched = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.dead = 0
+        self.commits = 0
+        self.committed_ops = 0
+        self.commit_seconds = 0.0
+        self.delivery_seconds = 0.0
+    
+    def register(self, kind: str, sender: Sender, batch_sender: Optional[BatchSender] = None,
+                 batch_window: Optional[BatchWindow] = None, max_batch: int = 10):
+        """Route entries of this kind to sender; register before start() so replayed rows can go out"""
+        self.senders[kind] = sender
+        if batch_sender is not None and batch_window is not None:
+            self.batchers[kind] = (batch_sender, batch_window, max_batch)
+    
+    async def start(self):
+        """Start the commit task and replay rows left pending by the previous run"""
+        if self._commit_task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._commit_task = asyncio.create_task(self._commit_loop(), name="outbox-commit")
+        entries, self.dead = await asyncio.to_thread(self._load_pending)
+        for entry in entries:
+            self._enqueue_lane(entry)
+        self.replayed += len(entries)
+        if entries or self.dead:
+            logger.info(f"📮 Outbox: replaying {len(entries)} pending deliveries, {self.dead} dead letters kept")
+    
+    def _load_pending(self) -> Tuple[List[OutboxEntry], int]:
+        with self._db_lock:
+            rows = self.conn.execute(
+                'SELECT id, kind, lane, payload, created_at, attempts, next_attempt_at '
+                'FROM outbox WHERE dead = 0 ORDER BY id'
+            ).fetchall()
+            dead = self.conn.execute('SELECT COUNT(*) FROM outbox WHERE dead = 1').fetchone()[0]
+        entries = [OutboxEntry(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5], row[6]) for row in rows]
+        return entries, dead
+    
+    async def submit(self, kind: str, lane: str, payload: Dict[str, Any]) -> int:
+        """Persist a delivery and return its id once committed; sending happens in the background"""
+        if self._commit_task is None:
+            await self.start()
+        entry = OutboxEntry(next(self._ids), kind, lane, payload, time.time())
+        waiter = asyncio.get_running_loop().create_future()
+        self._queue('INSERT INTO outbox (id, kind, lane, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (entry.id, kind, lane, json.dumps(payload, ensure_ascii=False), entry.created_at))
+        self._committed.append(entry)
+        self._waiters.append(waiter)
+        self.enqueued += 1
+        await waiter
+        return entry.id
+    
+    def _queue(self, sql: str, params: tuple):
+        self._ops.append((sql, params))
+        self._wake.set()
+    
+    async def _commit_loop(self):
+        while True:
+            await self._wake.wait()
+            if self.commit_interval:
+                await asyncio.sleep(self.commit_interval)
+            self._wake.clear()
+            ops, entries, waiters = self._ops, self._committed, self._waiters
+            self._ops, self._committed, self._waiters = [], [], []
+            if ops:
+                try:
+                    await asyncio.to_thread(self._write, ops)
+                except Exception as e:
+                    logger.error(f"Outbox commit of {len(ops)} operations failed: {e}")
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(e)
+                    entries, waiters = [], []
+            # Lanes are filled in id order here, so same-lane entries go out in submission order
+            for entry in entries:
+                self._enqueue_lane(entry)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            if self._closing and not self._ops:
+                return
+    
+    def _write(self, ops: List[Tuple[str, tuple]]):
+        started = time.perf_counter()
+        with self._db_lock:
+            with self.conn:
+                self.conn.execute('BEGIN')
+                for sql, params in ops:
+                    self.conn.execute(sql, params)
+        self.commit_seconds += time.perf_counter() - started
+        self.commits += 1
+        self.committed_ops += len(ops)
+    
+    def _enqueue_lane(self, entry: OutboxEntry):
+        key = (entry.kind, entry.lane)
+        self.lanes.setdefault(key, deque()).append(entry)
+        wakeup = self._lane_wakeups.get(key)
+        if wakeup is not None:
+            wakeup.set()
+        if key not in self._lane_tasks:
+            self._lane_tasks[key] = asyncio.create_task(self._deliver_lane(key), name=f"outbox-{entry.kind}-{entry.lane}")
+    
+    def backoff(self, attempts: int) -> float:
+        """Full-jitter exponential backoff after `attempts` failures"""
+        return self._rng.uniform(0.5, 1.0) * min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+    
+    def _batch_prefix(self, queue: Deque[OutboxEntry], batch_window: BatchWindow, max_batch: int) -> List[OutboxEntry]:
+        batch = []
+        for entry in queue:
+            if len(batch) >= max_batch or entry.attempts or batch_window(entry.lane, entry.payload) is None:
+                break
+            batch.append(entry)
+        return batch
+    
+    async def _collect_batch(self, key: Tuple[str, str], queue: Deque[OutboxEntry]) -> List[OutboxEntry]:
+        """The head entry plus the batchable entries behind it, waiting out the head's batch window"""
+        entry = queue[0]
+        batcher = self.batchers.get(entry.kind)
+        if batcher is None or entry.attempts:
+            return [entry]
+        batch_sender, batch_window, max_batch = batcher
+        window = batch_window(entry.lane, entry.payload)
+        if window is None:
+            return [entry]
+        
+        deadline = entry.created_at + window
+        wakeup = self._lane_wakeups.setdefault(key, asyncio.Event())
+        while True:
+            batch = self._batch_prefix(queue, batch_window, max_batch)
+            remaining = deadline - time.time()
+            # Full, out of time, or cut short by an entry that cannot join (edit, delete, retry)
+            if len(batch) >= max_batch or remaining <= 0 or len(batch) < len(queue):
+                return batch
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _deliver_lane(self, key: Tuple[str, str]):
+        queue = self.lanes[key]
+        try:
+            while queue:
+                entry = queue[0]
+                delay = entry.next_attempt_at - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                
+                batch = await self._collect_batch(key, queue)
+                started = time.perf_counter()
+                try:
+                    sender = self.senders.get(entry.kind)
+                    if sender is None:
+                        raise PermanentDeliveryError(f"no sender registered for {entry.kind}")
+                    if len(batch) > 1:
+                        count = max(1, min(len(batch), await self.batchers[entry.kind][0](
+                            entry.lane, [item.payload for item in batch]
+                        )))
+                        if count > 1:
+                            self.batches += 1
+                            self.batched += count
+                    else:
+                        await sender(entry.lane, entry.payload)
+                        count = 1
+                except asyncio.CancelledError:
+                    raise
+                except PermanentDeliveryError as e:
+                    queue.popleft()
+                    self._dead_letter(entry, e)
+                except Exception as e:
+                    entry.attempts += 1
+                    if entry.attempts >= self.max_attempts:
+                        queue.popleft()
+                        self._dead_letter(entry, e)
+                        continue
+                    entry.next_attempt_at = time.time() + self.backoff(entry.attempts)
+                    self.retried += 1
+                    self._queue('UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                                (entry.attempts, entry.next_attempt_at, str(e)[:500], entry.id))
+                    logger.warning(f"📮 {entry.kind} delivery for {entry.lane} failed "
+                                   f"(attempt {entry.attempts}/{self.max_attempts}): {e}")
+                else:
+                    for _ in range(count):
+                        delivered = queue.popleft()
+                        self._queue('DELETE FROM outbox WHERE id = ?', (delivered.id,))
+                    self.delivered += count
+                    self.delivery_seconds += time.perf_counter() - started
+        finally:
+            self._lane_tasks.pop(key, None)
+            if not queue:
+                self.lanes.pop(key, None)
+                self._lane_wakeups.pop(key, None)
+    
+    def _dead_letter(self, entry: OutboxEntry, error: Exception):
+        self.dead_lettered += 1
+        self.dead += 1
+        self._queue('UPDATE outbox SET dead = 1, attempts = ?, last_error = ? WHERE id = ?',
+                    (entry.attempts, str(error)[:500], entry.id))
+        logger.error(f"☠️ {entry.kind} delivery for {entry.lane} dead-lettered "
+                     f"after {entry.attempts} attempts: {error}")
+    
+    async def requeue_dead(self, lane: Optional[str] = None) -> int:
+        """Give dead letters (of one lane, or all) a fresh set of attempts"""
+        def load():
+            with self._db_lock:
+                with self.conn:
+                    self.conn.execute('BEGIN')
+                    where, params = ('dead = 1 AND lane = ?', (lane,)) if lane is not None else ('dead = 1', ())
+                    rows = self.conn.execute(
+                        f'SELECT id, kind, lane, payload, created_at FROM outbox WHERE {where} ORDER BY id', params
+                    ).fetchall()
+                    self.conn.execute(f'UPDATE outbox SET dead = 0, attempts = 0, next_attempt_at = 0 WHERE {where}', params)
+            return [OutboxEntry(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in rows]
+        
+        entries = await asyncio.to_thread(load)
+        for entry in entries:
+            self._enqueue_lane(entry)
+        self.dead = max(0, self.dead - len(entries))
+        return len(entries)
+    
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self.lanes.values())
+    
+    def pending_payloads(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Payloads of the entries still queued for delivery (of one kind, or all)"""
+        return [entry.payload for queue in self.lanes.values() for entry in queue
+                if kind is None or entry.kind == kind]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': self.pending(),
+            'lanes': len(self.lanes),
+            'enqueued': self.enqueued,
+            'replayed': self.replayed,
+            'delivered': self.delivered,
+            'batches': self.batches,
+            'batched': self.batched,
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+            'dead': self.dead,
+            'commits': self.commits,
+            'ops_per_commit': round(self.committed_ops / self.commits, 2) if self.commits else 0.0,
+            'avg_commit_ms': round(self.commit_seconds / self.commits * 1000, 2) if self.commits else 0.0,
+            'avg_delivery_ms': round(self.delivery_seconds / self.delivered * 1000, 2) if self.delivered else 0.0
+        }
+    
+    async def close(self, timeout: float = 5.0):
+        """Give lanes up to `timeout` seconds to drain, then commit outstanding acks and close
+        
+        Entries still pending stay in the database and are replayed by the next start().
+        """
+        tasks = list(self._lane_tasks.values())
+        if tasks and timeout:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            # Interrupted sends are not acked, so they go out again on the next start
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # The commit task writes whatever is still queued (acks, retries) and exits
+        self._closing = True
+        if self._commit_task is not None:
+            self._wake.set()
+            await self._commit_task
+            self._commit_task = None
+        self.conn.close()
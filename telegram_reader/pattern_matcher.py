@@ -0,0 +1,137 @@
+"""
+Multi-pattern text matcher for AutoForwardX trap detection
+Aho-Corasick automaton shared by the Telegram reader and the Discord bot
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BLOCKLIST_TRAP_TYPE = 'blocklist'
+BLOCKLIST_CONFIDENCE = 1.0
+
+# Known trap patterns: (pattern, trap_type, confidence), checked in this order
+BUILTIN_TRAP_PATTERNS: List[Tuple[str, str, float]] = [
+    ('/ *', 'forward_slash_trap', 0.9),
+    ('1', 'single_digit_trap', 0.8),
+    ('trap', 'explicit_trap', 0.95),
+    ('leak', 'leak_warning', 0.9),
+    ('copy warning', 'copy_warning', 0.85)
+]
+
+# Below this many rules a C-level str.find per rule beats walking the automaton in Python
+LINEAR_SCAN_MAX_RULES = 200
+
+@dataclass(frozen=True)
+class PatternHit:
+    """A single pattern found in a scanned message"""
+    pattern: str
+    trap_type: str
+    confidence: float
+    priority: int
+    end: int
+
+class PatternMatcher:
+    """Case-insensitive Aho-Corasick automaton over (pattern, trap_type, confidence) rules
+    
+    Rules keep their insertion order as priority, so callers that used to walk a
+    pattern list and stop at the first match can take the lowest-priority hit.
+    """
+    
+    def __init__(self, patterns: Iterable[Tuple[str, str, float]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._rules: List[Tuple[str, str, float]] = []
+        
+        for pattern, trap_type, confidence in patterns:
+            if not pattern:
+                continue
+            pattern = pattern.lower()
+            self._add(pattern, len(self._rules))
+            self._rules.append((pattern, trap_type, confidence))
+        
+        self._build_failure_links()
+    
+    def __len__(self) -> int:
+        return len(self._rules)
+    
+    def _add(self, pattern: str, rule_index: int):
+        """Insert a pattern into the trie"""
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = next_node
+        self._out[node] += (rule_index,)
+    
+    def _build_failure_links(self):
+        """Breadth-first construction of failure links with merged outputs"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] += self._out[self._fail[child]]
+    
+    def find_all(self, text: str) -> List[PatternHit]:
+        """Scan text once and return every matching rule, ordered by priority"""
+        if not text or not self._rules:
+            return []
+        
+        if len(self._rules) <= LINEAR_SCAN_MAX_RULES:
+            return self._find_all_linear(text.lower())
+        
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        first_end: Dict[int, int] = {}
+        node = 0
+        
+        for position, ch in enumerate(text.lower()):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for rule_index in out[node]:
+                    if rule_index not in first_end:
+                        first_end[rule_index] = position + 1
+        
+        hits = []
+        for rule_index in sorted(first_end):
+            pattern, trap_type, confidence = self._rules[rule_index]
+            hits.append(PatternHit(pattern, trap_type, confidence, rule_index, first_end[rule_index]))
+        return hits
+    
+    def _find_all_linear(self, text_lower: str) -> List[PatternHit]:
+        """Small rule sets: one str.find per rule over the lowercased text"""
+        hits = []
+        for rule_index, (pattern, trap_type, confidence) in enumerate(self._rules):
+            start = text_lower.find(pattern)
+            if start != -1:
+                hits.append(PatternHit(pattern, trap_type, confidence, rule_index, start + len(pattern)))
+        return hits
+    
+    def best_hit(self, text: str) -> Optional[PatternHit]:
+        """Return the highest-priority hit in text, if any"""
+        hits = self.find_all(text)
+        return hits[0] if hits else None
+
+def build_trap_matcher(blocked_text: Iterable[str],
+                       include_builtin: bool = True) -> PatternMatcher:
+    """Build one automaton from blocklist patterns followed by the built-in trap patterns"""
+    rules = [(text, BLOCKLIST_TRAP_TYPE, BLOCKLIST_CONFIDENCE) for text in blocked_text]
+    if include_builtin:
+        rules.extend(BUILTIN_TRAP_PATTERNS)
+    return PatternMatcher(rules)
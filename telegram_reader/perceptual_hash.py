@@ -0,0 +1,169 @@
+"""
+Perceptual image hashing for AutoForwardX
+aHash/dHash/pHash (64-bit) so recompressed or lightly cropped trap images
+still match the blocklist, plus a multi-index Hamming-distance lookup
+"""
+
+import io
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import numpy as np
+    from PIL import Image
+    PERCEPTUAL_HASH_AVAILABLE = True
+except ImportError:  # Pillow/NumPy are optional: exact MD5 matching still works without them
+    np = None
+    Image = None
+    PERCEPTUAL_HASH_AVAILABLE = False
+
+HASH_BITS = 64
+HASH_TYPES = ('ahash', 'dhash', 'phash')
+
+def _to_int(bits) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+def _dct_matrix(n: int):
+    """Orthonormal DCT-II basis, so pHash does not need SciPy"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT_32 = _dct_matrix(32) if PERCEPTUAL_HASH_AVAILABLE else None
+
+def _grayscale(image, size: Tuple[int, int]):
+    return np.asarray(image.resize(size, Image.LANCZOS), dtype=np.float64)
+
+def average_hash(image) -> int:
+    pixels = _grayscale(image, (8, 8))
+    return _to_int(pixels > pixels.mean())
+
+def difference_hash(image) -> int:
+    pixels = _grayscale(image, (9, 8))
+    return _to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def perceptual_hash(image) -> int:
+    pixels = _grayscale(image, (32, 32))
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    return _to_int(low > np.median(low))
+
+def compute_hashes(data: Union[bytes, BinaryIO]) -> Dict[str, str]:
+    """All three hashes of an encoded image (bytes or a readable file object) as 16-char hex strings"""
+    if not PERCEPTUAL_HASH_AVAILABLE:
+        raise RuntimeError("Perceptual hashing needs Pillow and NumPy")
+    image = Image.open(data if hasattr(data, 'read') else io.BytesIO(data))
+    # JPEG draft mode decodes at a reduced scale: far cheaper and irrelevant at 32x32
+    image.draft('L', (128, 128))
+    image = image.convert('L')
+    return {
+        'ahash': format(average_hash(image), '016x'),
+        'dhash': format(difference_hash(image), '016x'),
+        'phash': format(perceptual_hash(image), '016x')
+    }
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+@lru_cache(maxsize=None)
+def probe_masks(bits: int, sub_radius: int) -> Tuple[int, ...]:
+    """All bits-wide masks with at most sub_radius bits set, fewest bits first"""
+    return tuple(
+        sum(1 << bit for bit in flipped)
+        for count in range(sub_radius + 1)
+        for flipped in combinations(range(bits), count)
+    )
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes
+    
+    Each hash is split into four 16-bit chunks with one lookup table per chunk.
+    Chunk i is probed with every value within r_i bits of the query chunk, where
+    sum(r_i + 1) > r: if two hashes are within distance r, by pigeonhole at least
+    one chunk is within its r_i. Only the few entries found that way are compared
+    in full instead of scanning the whole list.
+    """
+    
+    CHUNKS = 4
+    CHUNK_BITS = HASH_BITS // CHUNKS
+    CHUNK_MASK = (1 << CHUNK_BITS) - 1
+    
+    def __init__(self, items: Iterable[Tuple[int, Any]] = ()):
+        self.hashes: List[int] = []
+        self.values: List[Any] = []
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in range(self.CHUNKS)]
+        for value_hash, value in items:
+            self.add(value_hash, value)
+    
+    def __len__(self) -> int:
+        return len(self.hashes)
+    
+    def add(self, value_hash: int, value: Any):
+        position = len(self.hashes)
+        self.hashes.append(value_hash)
+        self.values.append(value)
+        for chunk, table in enumerate(self.tables):
+            key = (value_hash >> (chunk * self.CHUNK_BITS)) & self.CHUNK_MASK
+            table.setdefault(key, []).append(position)
+    
+    def _sub_radii(self, radius: int) -> List[int]:
+        """Smallest per-chunk probe radii with sum(r_i + 1) = radius + 1"""
+        base, extra = divmod(radius + 1, self.CHUNKS)
+        return [base + (chunk < extra) - 1 for chunk in range(self.CHUNKS)]
+    
+    def query(self, value_hash: int, radius: int) -> List[Tuple[int, Any]]:
+        """(distance, value) for every entry within radius, closest first"""
+        hashes = self.hashes
+        found = {}
+        for chunk, sub_radius in enumerate(self._sub_radii(radius)):
+            if sub_radius < 0:
+                continue
+            table = self.tables[chunk]
+            key = (value_hash >> (chunk * self.CHUNK_BITS)) & self.CHUNK_MASK
+            for mask in probe_masks(self.CHUNK_BITS, sub_radius):
+                bucket = table.get(key ^ mask)
+                if bucket is None:
+                    continue
+                for position in bucket:
+                    distance = (hashes[position] ^ value_hash).bit_count()
+                    if distance <= radius:
+                        found[position] = distance
+        return sorted(((distance, self.values[position]) for position, distance in found.items()),
+                      key=lambda item: item[0])
+
+@dataclass(frozen=True)
+class PerceptualMatch:
+    """A blocked image that a new image is a near-duplicate of"""
+    md5: Optional[str]
+    phash_distance: int
+    dhash_distance: int
+
+class PerceptualBlocklist:
+    """Blocked images indexed by pHash, confirmed by dHash to keep false positives down"""
+    
+    def __init__(self, entries: Iterable[Dict[str, str]] = ()):
+        self.index = HammingIndex()
+        for entry in entries:
+            try:
+                phash = int(entry['phash'], 16)
+                dhash = int(entry['dhash'], 16)
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.index.add(phash, (dhash, entry.get('md5')))
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def match(self, hashes: Dict[str, str], phash_radius: int, dhash_radius: int) -> Optional[PerceptualMatch]:
+        if not len(self.index) or not hashes:
+            return None
+        phash = int(hashes['phash'], 16)
+        dhash = int(hashes['dhash'], 16)
+        for distance, (blocked_dhash, md5) in self.index.query(phash, phash_radius):
+            dhash_distance = hamming(dhash, blocked_dhash)
+            if dhash_distance <= dhash_radius:
+                return PerceptualMatch(md5, distance, dhash_distance)
+        return None
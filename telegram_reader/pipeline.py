@@ -0,0 +1,197 @@
+"""
+Bounded forwarding pipeline for AutoForwardX
+ingest -> classify -> deliver, with one lane of bounded queues per pair
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP = 'drop'
+
+@dataclass
+class StageMetrics:
+    """Latency counters for one pipeline stage"""
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+    
+    def record(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+    
+    def as_dict(self) -> Dict[str, float]:
+        avg = self.total_seconds / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'avg_ms': round(avg * 1000, 2),
+            'max_ms': round(self.max_seconds * 1000, 2),
+            'last_ms': round(self.last_seconds * 1000, 2)
+        }
+
+@dataclass
+class _LaneItem:
+    payload: Any
+    enqueued_at: float
+    result: asyncio.Future
+
+class PairLane:
+    """Bounded classify/deliver lane for one pair
+    
+    Classification runs on ``workers`` concurrent tasks, but every item also
+    takes a slot in an ordered delivery queue at ingest time, so the single
+    deliver task emits results in arrival order regardless of which worker
+    finished first.
+    """
+    
+    def __init__(self, name: str, classify: Callable[[Any], Awaitable[Any]],
+                 deliver: Callable[[Any], Awaitable[None]], workers: int = 2,
+                 queue_size: int = 100, overflow: str = OVERFLOW_BLOCK):
+        self.name = name
+        self.classify = classify
+        self.deliver = deliver
+        self.overflow = overflow
+        self.classify_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.deliver_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.accepting = True
+        self.dropped = 0
+        self.failed = 0
+        self.stages = {
+            'ingest_wait': StageMetrics(),
+            'queue_wait': StageMetrics(),
+            'classify': StageMetrics(),
+            'deliver': StageMetrics(),
+            'end_to_end': StageMetrics()
+        }
+        self._tasks = [
+            asyncio.create_task(self._classify_worker(), name=f"classify:{name}:{i}")
+            for i in range(max(1, workers))
+        ]
+        self._tasks.append(asyncio.create_task(self._deliver_worker(), name=f"deliver:{name}"))
+    
+    async def submit(self, payload: Any) -> bool:
+        """Enqueue a payload; blocks or drops when the lane is full depending on overflow policy"""
+        if not self.accepting:
+            self.dropped += 1
+            return False
+        
+        item = _LaneItem(payload, time.monotonic(), asyncio.get_running_loop().create_future())
+        if self.overflow == OVERFLOW_DROP:
+            if self.classify_queue.full() or self.deliver_queue.full():
+                self.dropped += 1
+                logger.warning(f"Pipeline lane {self.name} full, dropping message")
+                return False
+            self.deliver_queue.put_nowait(item)
+            self.classify_queue.put_nowait(item)
+        else:
+            await self.deliver_queue.put(item)
+            await self.classify_queue.put(item)
+        self.stages['ingest_wait'].record(time.monotonic() - item.enqueued_at)
+        return True
+    
+    async def _classify_worker(self):
+        while True:
+            item = await self.classify_queue.get()
+            started = time.monotonic()
+            self.stages['queue_wait'].record(started - item.enqueued_at)
+            try:
+                result = await self.classify(item.payload)
+                if not item.result.done():
+                    item.result.set_result(result)
+            except Exception as e:
+                if not item.result.done():
+                    item.result.set_exception(e)
+            finally:
+                self.stages['classify'].record(time.monotonic() - started)
+                self.classify_queue.task_done()
+    
+    async def _deliver_worker(self):
+        while True:
+            item = await self.deliver_queue.get()
+            try:
+                result = await item.result
+                started = time.monotonic()
+                await self.deliver(result)
+                self.stages['deliver'].record(time.monotonic() - started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Pipeline lane {self.name} failed to process message: {e}")
+            finally:
+                self.stages['end_to_end'].record(time.monotonic() - item.enqueued_at)
+                self.deliver_queue.task_done()
+    
+    async def drain(self):
+        """Stop accepting new work and wait until queued messages are delivered"""
+        self.accepting = False
+        await self.classify_queue.join()
+        await self.deliver_queue.join()
+    
+    async def close(self, drain: bool = True):
+        """Stop the lane's workers, optionally delivering in-flight messages first"""
+        if drain:
+            await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'classify_depth': self.classify_queue.qsize(),
+            'deliver_depth': self.deliver_queue.qsize(),
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'stages': {name: stage.as_dict() for name, stage in self.stages.items()}
+        }
+
+class ForwardingPipeline:
+    """Per-pair lanes created on first use"""
+    
+    def __init__(self, classify: Callable[[Any], Awaitable[Any]],
+                 deliver: Callable[[Any], Awaitable[None]], workers: int = 2,
+                 queue_size: int = 100, overflow: str = OVERFLOW_BLOCK):
+        self.classify = classify
+        self.deliver = deliver
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.lanes: Dict[str, PairLane] = {}
+    
+    def get_lane(self, pair_name: str, workers: Optional[int] = None) -> PairLane:
+        lane = self.lanes.get(pair_name)
+        if lane is None:
+            lane = PairLane(
+                pair_name, self.classify, self.deliver,
+                workers=workers or self.workers,
+                queue_size=self.queue_size,
+                overflow=self.overflow
+            )
+            self.lanes[pair_name] = lane
+        return lane
+    
+    async def submit(self, pair_name: str, payload: Any, workers: Optional[int] = None) -> bool:
+        return await self.get_lane(pair_name, workers).submit(payload)
+    
+    async def remove_lane(self, pair_name: str, drain: bool = True):
+        """Retire a pair's lane without losing messages already queued"""
+        lane = self.lanes.get(pair_name)
+        if lane is not None:
+            await lane.close(drain=drain)
+            self.lanes.pop(pair_name, None)
+    
+    async def close(self, drain: bool = True):
+        for pair_name in list(self.lanes):
+            await self.remove_lane(pair_name, drain=drain)
+    
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: lane.metrics() for name, lane in self.lanes.items()}
@@ -0,0 +1,55 @@
+"""
+Rate limiting primitives for AutoForwardX outbound senders
+"""
+
+import asyncio
+import time
+from typing import Callable
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, bursts up to ``capacity``"""
+    
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+    
+    def delay(self, tokens: float = 1.0) -> float:
+        """Seconds until ``tokens`` can be consumed (0 if available now)"""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < tokens:
+            wait = max(wait, (tokens - self.tokens) / self.rate)
+        return wait
+    
+    def try_consume(self, tokens: float = 1.0) -> bool:
+        if self.delay(tokens) > 0:
+            return False
+        self.tokens -= tokens
+        return True
+    
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until ``tokens`` are available and consume them"""
+        while True:
+            wait = self.delay(tokens)
+            if wait <= 0:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep(wait)
+    
+    def penalize(self, seconds: float):
+        """Drain the bucket and refuse tokens for ``seconds`` (server-side 429)"""
+        now = self.clock()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
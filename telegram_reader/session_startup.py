@@ -0,0 +1,145 @@
+"""
+Concurrent session startup for AutoForwardX
+Connects Telegram sessions in parallel under a concurrency limit, pre-resolves
+each session's source entities, and records per-session startup timings and
+time-to-first-message
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Union
+
+from telethon import utils
+
+logger = logging.getLogger(__name__)
+
+def _ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 1)
+
+@dataclass
+class SessionTiming:
+    """Monotonic timestamps of one session's startup"""
+    queued_at: float
+    started_at: Optional[float] = None
+    connected_at: Optional[float] = None
+    resolved_at: Optional[float] = None
+    first_message_at: Optional[float] = None
+    entities: int = 0
+    unresolved: int = 0
+    error: Optional[str] = None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'wait_ms': _ms(self.queued_at, self.started_at),
+            'connect_ms': _ms(self.started_at, self.connected_at),
+            'resolve_ms': _ms(self.connected_at, self.resolved_at),
+            'ready_ms': _ms(self.queued_at, self.resolved_at),
+            'time_to_first_message_ms': _ms(self.queued_at, self.first_message_at),
+            'entities': self.entities,
+            'unresolved': self.unresolved,
+            'error': self.error
+        }
+
+class SessionStartup:
+    """Start sessions concurrently and keep their resolved source entities
+    
+    client_factory(session_name, session_config) returns an unstarted client, so
+    startup can run against stub clients offline. Entities are cached per session:
+    access hashes belong to the account that resolved them.
+    """
+    
+    def __init__(self, client_factory: Callable[[str, Any], Any], concurrency: Optional[int] = None):
+        self.client_factory = client_factory
+        self.concurrency = max(1, concurrency if concurrency is not None
+                               else int(os.getenv('SESSION_STARTUP_CONCURRENCY', '8')))
+        self.timings: Dict[str, SessionTiming] = {}
+        self.entities: Dict[str, Dict[str, Any]] = {}
+        self.began_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+    
+    async def run(self, sessions: Mapping[str, Any], connect: Callable[[str, Any], Awaitable[Any]]) -> float:
+        """Run connect(name, config) for every session, at most `concurrency` at a time; returns wall time"""
+        slots = asyncio.Semaphore(self.concurrency)
+        began = self.began_at = time.monotonic()
+        for session_name in sessions:
+            self.timings[session_name] = SessionTiming(queued_at=began)
+        
+        async def start_one(session_name: str, session_config):
+            async with slots:
+                await connect(session_name, session_config)
+        
+        await asyncio.gather(*(start_one(name, config) for name, config in sessions.items()))
+        self.finished_at = time.monotonic()
+        return self.finished_at - began
+    
+    async def start(self, session_name: str, session_config, sources: Mapping[str, Union[int, str]]):
+        """Create, start and warm up one client; sources maps each source ref to its lookup key"""
+        timing = self.timings.setdefault(session_name, SessionTiming(queued_at=time.monotonic()))
+        timing.started_at = time.monotonic()
+        client = self.client_factory(session_name, session_config)
+        try:
+            await client.start()
+        except Exception as e:
+            timing.error = str(e)
+            raise
+        timing.connected_at = time.monotonic()
+        await self.resolve(session_name, client, sources)
+        timing.resolved_at = time.monotonic()
+        return client
+    
+    async def resolve(self, session_name: str, client, sources: Mapping[str, Union[int, str]]) -> Dict[str, int]:
+        """Resolve (concurrently) the sources this session has not cached yet; returns ref -> peer id"""
+        cache = self.entities.setdefault(session_name, {})
+        pending = {ref: lookup for ref, lookup in sources.items() if ref not in cache}
+        
+        async def resolve_one(ref: str, lookup: Union[int, str]):
+            try:
+                cache[ref] = await client.get_input_entity(lookup)
+            except Exception as e:
+                # Bare ids can only be resolved once the account has seen the chat
+                log = logger.warning if isinstance(lookup, str) else logger.debug
+                log(f"Could not pre-resolve source {ref} for session {session_name}: {e}")
+        
+        await asyncio.gather(*(resolve_one(ref, lookup) for ref, lookup in pending.items()))
+        
+        timing = self.timings.get(session_name)
+        if timing is not None:
+            timing.entities = sum(1 for ref in sources if ref in cache)
+            timing.unresolved = len(sources) - timing.entities
+        return {ref: utils.get_peer_id(cache[ref]) for ref in sources if ref in cache}
+    
+    def entity(self, session_name: str, ref: str) -> Optional[Any]:
+        return self.entities.get(session_name, {}).get(ref)
+    
+    def forget(self, session_name: str):
+        self.timings.pop(session_name, None)
+        self.entities.pop(session_name, None)
+    
+    def first_message(self, session_name: str) -> Optional[float]:
+        """Mark a session's first message; returns its time-to-first-message in seconds the first time only"""
+        timing = self.timings.get(session_name)
+        if timing is None or timing.first_message_at is not None:
+            return None
+        timing.first_message_at = time.monotonic()
+        return timing.first_message_at - timing.queued_at
+    
+    def stats(self) -> Dict[str, Any]:
+        ready = [t for t in self.timings.values() if t.resolved_at is not None]
+        first = [t.first_message_at - t.queued_at for t in self.timings.values() if t.first_message_at is not None]
+        return {
+            'concurrency': self.concurrency,
+            'sessions': len(self.timings),
+            'ready': len(ready),
+            'failed': sum(1 for t in self.timings.values() if t.error),
+            'startup_ms': _ms(self.began_at, self.finished_at),
+            'slowest_ready_ms': max((_ms(t.queued_at, t.resolved_at) for t in ready), default=None),
+            'max_time_to_first_message_ms': round(max(first) * 1000, 1) if first else None
+        }
+    
+    def session_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: timing.as_dict() for name, timing in self.timings.items()}
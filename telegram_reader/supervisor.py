@@ -0,0 +1,243 @@
+"""
+Multi-process supervisor for the AutoForwardX Telegram reader
+Shards sessions (and the pairs they feed) across worker processes, restarts
+crashed workers, forwards reload signals and aggregates worker health
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def shard_for(session_name: str, shards: int) -> int:
+    """Stable shard index for a session (crc32, unlike hash() it is the same in every process)"""
+    return zlib.crc32(session_name.encode('utf-8')) % max(1, shards)
+
+@dataclass(frozen=True)
+class ShardAssignment:
+    """Which slice of sessions this reader process owns"""
+    index: int = 0
+    count: int = 1
+    
+    @classmethod
+    def from_env(cls) -> 'ShardAssignment':
+        return cls(
+            index=int(os.getenv('READER_SHARD_INDEX', '0')),
+            count=max(1, int(os.getenv('READER_SHARD_COUNT', '1')))
+        )
+    
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1
+    
+    def owns(self, session_name: str) -> bool:
+        return not self.sharded or shard_for(session_name, self.count) == self.index
+    
+    def local_path(self, path: Path) -> Path:
+        """Per-shard variant of a state file so workers never write the same file"""
+        if not self.sharded:
+            return path
+        return path.with_name(f"{path.stem}.shard{self.index}{path.suffix}")
+
+class HealthReporter:
+    """Worker side: writes one JSON line per report to the pipe the supervisor passed in"""
+    
+    def __init__(self, fd: Optional[int] = None):
+        if fd is None and os.getenv('READER_HEALTH_FD'):
+            fd = int(os.environ['READER_HEALTH_FD'])
+        self.fd = fd
+        if self.fd is not None:
+            # Never let a stalled supervisor block the worker's event loop
+            os.set_blocking(self.fd, False)
+    
+    @property
+    def enabled(self) -> bool:
+        return self.fd is not None
+    
+    def report(self, payload: Dict[str, Any]):
+        if self.fd is None:
+            return
+        try:
+            os.write(self.fd, (json.dumps(payload, default=str) + '\n').encode('utf-8'))
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            logger.warning(f"Health pipe closed: {e}")
+            self.fd = None
+
+@dataclass
+class WorkerState:
+    index: int
+    process: Optional[asyncio.subprocess.Process] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    last_exit: Optional[int] = None
+    health: Dict[str, Any] = field(default_factory=dict)
+    health_at: float = 0.0
+    rate: float = 0.0
+    reader_task: Optional[asyncio.Task] = None
+    
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+class ReaderSupervisor:
+    """Run N sharded reader workers (main.py with READER_SHARD_INDEX set) and keep them up"""
+    
+    def __init__(self, workers: int, script: Optional[Path] = None):
+        self.worker_count = workers
+        self.script = script or Path(__file__).with_name('main.py')
+        self.health_interval = float(os.getenv('READER_HEALTH_INTERVAL', '10'))
+        self.stats_log_interval = int(os.getenv('STATS_LOG_INTERVAL', '300'))
+        self.max_backoff = float(os.getenv('READER_RESTART_MAX_BACKOFF', '60'))
+        self.stable_after = float(os.getenv('READER_RESTART_RESET_AFTER', '300'))
+        self.stop_timeout = float(os.getenv('READER_STOP_TIMEOUT', '45'))
+        self.workers = [WorkerState(index) for index in range(workers)]
+        self.running = False
+    
+    async def start_worker(self, state: WorkerState):
+        read_fd, write_fd = os.pipe()
+        env = dict(os.environ)
+        env.update({
+            'READER_SHARD_INDEX': str(state.index),
+            'READER_SHARD_COUNT': str(self.worker_count),
+            'READER_HEALTH_FD': str(write_fd),
+            'READER_HEALTH_INTERVAL': str(self.health_interval)
+        })
+        try:
+            state.process = await asyncio.create_subprocess_exec(
+                sys.executable, str(self.script), env=env, pass_fds=(write_fd,)
+            )
+        finally:
+            os.close(write_fd)
+        state.started_at = time.monotonic()
+        state.health = {}
+        state.reader_task = asyncio.create_task(self._read_health(state, read_fd), name=f"health:{state.index}")
+        logger.info(f"🧩 Started reader worker {state.index}/{self.worker_count} (pid {state.process.pid})")
+    
+    async def _read_health(self, state: WorkerState, read_fd: int):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, 'rb', 0)
+        )
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    report = json.loads(line)
+                except ValueError:
+                    continue
+                now = time.monotonic()
+                previous, previous_at = state.health.get('routed'), state.health_at
+                if previous is not None and now > previous_at:
+                    state.rate = max(0.0, (report.get('routed', 0) - previous) / (now - previous_at))
+                state.health, state.health_at = report, now
+        finally:
+            transport.close()
+    
+    def signal_workers(self, signum: int):
+        for state in self.workers:
+            if state.alive:
+                state.process.send_signal(signum)
+    
+    def backoff(self, state: WorkerState) -> float:
+        return min(self.max_backoff, 2 ** max(0, state.restarts - 1))
+    
+    async def _supervise(self, state: WorkerState):
+        """Restart a worker whenever it exits while the supervisor is running"""
+        while self.running:
+            if not state.alive:
+                await self.start_worker(state)
+            returncode = await state.process.wait()
+            if state.reader_task is not None:
+                await asyncio.gather(state.reader_task, return_exceptions=True)
+            if not self.running:
+                return
+            
+            state.last_exit = returncode
+            if time.monotonic() - state.started_at > self.stable_after:
+                state.restarts = 0
+            state.restarts += 1
+            delay = self.backoff(state)
+            logger.error(f"💥 Reader worker {state.index} exited with {returncode}; restarting in {delay:.0f}s")
+            await asyncio.sleep(delay)
+    
+    def aggregate(self) -> Dict[str, Any]:
+        """Combined health and throughput of all workers"""
+        now = time.monotonic()
+        workers = []
+        totals = {'sessions': 0, 'pairs': 0, 'received': 0, 'routed': 0, 'delivered': 0}
+        for state in self.workers:
+            health = state.health
+            for key in totals:
+                totals[key] += health.get(key, 0)
+            stale = bool(health) and now - state.health_at > 3 * self.health_interval
+            workers.append({
+                'index': state.index,
+                'pid': state.process.pid if state.process else None,
+                'alive': state.alive,
+                'healthy': state.alive and bool(health) and not stale,
+                'restarts': state.restarts,
+                'last_exit': state.last_exit,
+                'sessions': health.get('sessions', 0),
+                'routed_per_second': round(state.rate, 2),
+                'loop_lag_p99_ms': health.get('loop_lag', {}).get('p99_ms')
+            })
+        totals['routed_per_second'] = round(sum(state.rate for state in self.workers), 2)
+        totals['healthy_workers'] = sum(1 for worker in workers if worker['healthy'])
+        return {'totals': totals, 'workers': workers}
+    
+    def stop(self):
+        self.running = False
+    
+    async def run(self):
+        logger.info(f"🧭 Supervisor starting {self.worker_count} reader workers")
+        self.running = True
+        
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, self.signal_workers, signal.SIGHUP)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+        
+        supervisors = [asyncio.create_task(self._supervise(state)) for state in self.workers]
+        elapsed = 0
+        try:
+            while self.running:
+                await asyncio.sleep(1)
+                elapsed += 1
+                if self.stats_log_interval and elapsed % self.stats_log_interval == 0:
+                    logger.info(f"📈 Supervisor health: {self.aggregate()}")
+        finally:
+            self.running = False
+            await self.shutdown()
+            for task in supervisors:
+                task.cancel()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+            logger.info("🔒 Supervisor stopped")
+    
+    async def shutdown(self):
+        """SIGTERM every worker, then kill the ones that outlive the drain timeout"""
+        self.signal_workers(signal.SIGTERM)
+        alive = [state for state in self.workers if state.alive]
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(state.process.wait() for state in alive)), timeout=self.stop_timeout
+            )
+        except asyncio.TimeoutError:
+            for state in alive:
+                if state.alive:
+                    logger.warning(f"⚠️ Killing reader worker {state.index} after {self.stop_timeout:.0f}s")
+                    state.process.kill()
+            await asyncio.gather(*(state.process.wait() for state in alive), return_exceptions=True)
@@ -0,0 +1,293 @@
+"""
+Telegram Bot API sender for AutoForwardX
+Paces sendMessage per bot token (global limit) and per destination chat,
+honors retry_after on 429, spreads load across every configured bot token
+and, when TELEGRAM_COALESCE is on, merges queued bursts into one message
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from http_client import HttpClient, http_client
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+# 400 descriptions meaning the bot itself cannot post to the chat, as opposed to a bad message
+NO_RIGHTS_MARKERS = ('chat not found', 'not enough rights', 'have no rights', 'need administrator rights',
+                     'chat_write_forbidden', 'chat_admin_required')
+
+def clean_for_telegram(content: str) -> str:
+    """Strip the Discord header formatting and mass mentions, and keep within Telegram's length limit"""
+    content = content.replace('**From ', 'From ')
+    content = content.replace(':**\n', ':\n')
+    content = content.replace('@everyone', '')
+    content = content.replace('@here', '')
+    if len(content) > 4000:
+        content = content[:3900] + "... (message truncated)"
+    return content.strip()
+
+@dataclass
+class SendResult:
+    """Outcome of a paced sendMessage call"""
+    message_id: str
+    bot_token: str
+    coalesced: int = 1
+
+class TelegramSendError(Exception):
+    """sendMessage finally failed; `status` is Telegram's HTTP status when it answered
+    
+    `permanent` means Telegram refused the message itself or the bot may not
+    post to the chat (4xx other than 429), so resending it cannot succeed.
+    """
+    
+    def __init__(self, message: str, status: Optional[int] = None, permanent: Optional[bool] = None):
+        super().__init__(message)
+        self.status = status
+        self.permanent = (permanent if permanent is not None
+                          else status is not None and 400 <= status < 500 and status != 429)
+
+@dataclass
+class _SendJob:
+    text: str
+    tokens: Tuple[str, ...]
+    params: Tuple[Tuple[str, Any], ...]
+    future: asyncio.Future
+    attempts: int = 0
+
+@dataclass
+class _ChatQueue:
+    jobs: Deque[_SendJob] = field(default_factory=deque)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+class TelegramSender:
+    """Token-bucket dispatcher for the Telegram Bot API keyed by bot token and chat"""
+    
+    def __init__(self, client: HttpClient = http_client, api_base: str = 'https://api.telegram.org',
+                 global_rate: Optional[float] = None, chat_rate_per_minute: Optional[float] = None,
+                 chat_burst: Optional[int] = None, coalesce: Optional[bool] = None,
+                 max_retries: Optional[int] = None):
+        self.client = client
+        self.api_base = api_base.rstrip('/')
+        self.global_rate = global_rate if global_rate is not None else float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+        self.chat_rate = (chat_rate_per_minute if chat_rate_per_minute is not None
+                          else float(os.getenv('TELEGRAM_CHAT_RATE', '20'))) / 60.0
+        self.chat_burst = chat_burst if chat_burst is not None else int(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+        # Off by default: merged messages share one message_id, so edits and deletes can no longer map 1:1
+        self.coalesce = (coalesce if coalesce is not None
+                         else os.getenv('TELEGRAM_COALESCE', 'false').lower() == 'true')
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('TELEGRAM_MAX_RETRIES', '5'))
+        
+        self.token_buckets: Dict[str, TokenBucket] = {}
+        self.chat_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.disabled: Dict[Tuple[str, str], float] = {}
+        self.queues: Dict[str, _ChatQueue] = {}
+        
+        self.requests_sent = 0
+        self.messages_sent = 0
+        self.rate_limited = 0
+        self._send_times: Deque[float] = deque()
+    
+    def _token_bucket(self, token: str) -> TokenBucket:
+        bucket = self.token_buckets.get(token)
+        if bucket is None:
+            bucket = TokenBucket(rate=self.global_rate, capacity=self.global_rate)
+            self.token_buckets[token] = bucket
+        return bucket
+    
+    def _chat_bucket(self, token: str, chat_id: str) -> TokenBucket:
+        key = (token, chat_id)
+        bucket = self.chat_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate=self.chat_rate, capacity=self.chat_burst)
+            self.chat_buckets[key] = bucket
+        return bucket
+    
+    async def send_message(self, chat_id: str, text: str, tokens: List[str], **params) -> SendResult:
+        """Queue a message for chat_id and wait until it is sent; raises TelegramSendError if it never is"""
+        tokens = tuple(dict.fromkeys(t for t in tokens if t))
+        if not tokens:
+            raise TelegramSendError(f"No bot token for chat {chat_id}", permanent=True)
+        
+        chat_id = str(chat_id)
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = _ChatQueue()
+            self.queues[chat_id] = queue
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._dispatch(chat_id, queue), name=f"telegram:{chat_id}")
+        
+        job = _SendJob(text, tokens, tuple(sorted(params.items())),
+                       asyncio.get_running_loop().create_future())
+        queue.jobs.append(job)
+        queue.wakeup.set()
+        return await job.future
+    
+    def _pick_token(self, chat_id: str, tokens: Tuple[str, ...]) -> Tuple[Optional[str], float]:
+        """Choose the usable token that can send to chat_id soonest"""
+        now = time.monotonic()
+        best, best_wait = None, float('inf')
+        for token in tokens:
+            if self.disabled.get((token, chat_id), 0) > now:
+                continue
+            wait = max(self._token_bucket(token).delay(), self._chat_bucket(token, chat_id).delay())
+            if wait < best_wait:
+                best, best_wait = token, wait
+        return best, best_wait
+    
+    def _take_batch(self, queue: _ChatQueue) -> List[_SendJob]:
+        """Pop the head job plus any compatible queued jobs that fit in one message"""
+        batch = [queue.jobs.popleft()]
+        if not self.coalesce:
+            return batch
+        length = len(batch[0].text)
+        while queue.jobs:
+            candidate = queue.jobs[0]
+            if candidate.params != batch[0].params or candidate.tokens != batch[0].tokens:
+                break
+            if length + 2 + len(candidate.text) > TELEGRAM_MESSAGE_LIMIT:
+                break
+            length += 2 + len(candidate.text)
+            batch.append(queue.jobs.popleft())
+        return batch
+    
+    async def _dispatch(self, chat_id: str, queue: _ChatQueue):
+        while True:
+            if not queue.jobs:
+                queue.wakeup.clear()
+                await queue.wakeup.wait()
+                continue
+            
+            token, wait = self._pick_token(chat_id, queue.jobs[0].tokens)
+            if token is None:
+                job = queue.jobs.popleft()
+                logger.error(f"No usable bot token for chat {chat_id}")
+                if not job.future.done():
+                    # Tokens are only disabled when the bot lacks rights in the chat
+                    job.future.set_exception(TelegramSendError(f"No usable bot token for chat {chat_id}", 403))
+                continue
+            if wait > 0:
+                # Let bursts pile up behind the limiter so they can be coalesced (if enabled)
+                await asyncio.sleep(wait)
+                continue
+            
+            batch = self._take_batch(queue)
+            await self._token_bucket(token).acquire()
+            await self._chat_bucket(token, chat_id).acquire()
+            
+            try:
+                retry_delay = await self._send_batch(chat_id, token, batch)
+            except asyncio.CancelledError:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.cancel()
+                raise
+            except Exception as e:
+                logger.error(f"Error posting to Telegram chat {chat_id}: {e}")
+                for job in batch:
+                    job.attempts += 1
+                retry_delay = min(2 ** batch[0].attempts, 30)
+            
+            if retry_delay is None:
+                continue
+            for job in reversed(batch):
+                if job.attempts > self.max_retries:
+                    if not job.future.done():
+                        job.future.set_exception(TelegramSendError(
+                            f"Gave up on chat {chat_id} after {job.attempts} attempts", permanent=False
+                        ))
+                else:
+                    queue.jobs.appendleft(job)
+            if retry_delay:
+                await asyncio.sleep(retry_delay)
+    
+    async def _send_batch(self, chat_id: str, token: str, batch: List[_SendJob]) -> Optional[float]:
+        """Send one (possibly coalesced) message; return a retry delay, or None when its jobs are resolved"""
+        payload = dict(batch[0].params)
+        payload['chat_id'] = chat_id
+        payload['text'] = '\n\n'.join(job.text for job in batch)
+        
+        session = self.client.get_session()
+        async with session.post(f"{self.api_base}/bot{token}/sendMessage", json=payload) as response:
+            try:
+                result = await response.json(content_type=None)
+            except ValueError:
+                result = {}
+        self.requests_sent += 1
+        
+        if response.status == 200 and result.get('ok', True):
+            message_id = str(result['result']['message_id'])
+            self.messages_sent += len(batch)
+            self._record_send()
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_result(SendResult(message_id, token, len(batch)))
+            return None
+        
+        for job in batch:
+            job.attempts += 1
+        
+        if response.status == 429:
+            self.rate_limited += 1
+            retry_after = float((result.get('parameters') or {}).get('retry_after', 1))
+            self._chat_bucket(token, chat_id).penalize(retry_after)
+            logger.warning(f"Telegram 429 for chat {chat_id}, retry_after={retry_after}s")
+            return 0.0
+        
+        description = result.get('description', '')
+        logger.error(f"Telegram API error {response.status}: {description}")
+        lacks_rights = response.status == 403 or (
+            response.status == 400 and any(marker in description.lower() for marker in NO_RIGHTS_MARKERS)
+        )
+        if lacks_rights and len(batch[0].tokens) > 1:
+            # This bot cannot post here (not admin, kicked...): try the next token for a while
+            self.disabled[(token, chat_id)] = time.monotonic() + 300
+            return 0.0
+        if response.status >= 500:
+            return min(2 ** batch[0].attempts, 30)
+        
+        for job in batch:
+            if not job.future.done():
+                job.future.set_exception(TelegramSendError(
+                    f"Telegram API error {response.status}: {description}", response.status
+                ))
+        return None
+    
+    def _record_send(self):
+        now = time.monotonic()
+        self._send_times.append(now)
+        while self._send_times and now - self._send_times[0] > 60:
+            self._send_times.popleft()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Achieved send rate over the last minute plus lifetime counters"""
+        now = time.monotonic()
+        recent = [t for t in self._send_times if now - t <= 60]
+        window = min(60.0, now - recent[0]) if len(recent) > 1 else 60.0
+        return {
+            'requests_sent': self.requests_sent,
+            'messages_sent': self.messages_sent,
+            'rate_limited': self.rate_limited,
+            'requests_per_second': round(len(recent) / window, 3) if recent else 0.0,
+            'queued': sum(len(q.jobs) for q in self.queues.values())
+        }
+    
+    async def close(self):
+        tasks = [q.task for q in self.queues.values() if q.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Callers outside the outbox await send_message directly; do not leave them waiting
+        for queue in self.queues.values():
+            for job in queue.jobs:
+                if not job.future.done():
+                    job.future.set_exception(TelegramSendError("Telegram sender closed"))
+            queue.jobs.clear()
+        self.queues.clear()
@@ -0,0 +1,119 @@
+"""
+Webhook micro-batching for AutoForwardX
+Packs bursts of a pair's forwarded messages into one webhook post within
+Discord's limits (10 embeds, 2000 content and 6000 embed characters), and
+sizes each pair's wait from its recent arrival rate under a latency ceiling
+"""
+
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+MAX_EMBEDS = 10
+MAX_CONTENT = 2000
+MAX_EMBED_CHARS = 6000
+
+def embed_length(embed: Dict[str, Any]) -> int:
+    """Characters Discord counts towards the 6000 limit shared by all embeds of a message"""
+    total = len(embed.get('title') or '') + len(embed.get('description') or '')
+    total += len((embed.get('footer') or {}).get('text') or '')
+    total += len((embed.get('author') or {}).get('name') or '')
+    for embed_field in embed.get('fields') or []:
+        total += len(embed_field.get('name') or '') + len(embed_field.get('value') or '')
+    return total
+
+def join_content(contents: Iterable[Optional[str]]) -> str:
+    return '\n\n'.join(content for content in contents if content)
+
+def pack_count(payloads: List[Dict[str, Any]]) -> int:
+    """How many leading payloads fit in one webhook message; always at least one"""
+    embeds = 0
+    chars = 0
+    contents: List[str] = []
+    for count, payload in enumerate(payloads):
+        payload_embeds = payload.get('embeds') or []
+        payload_chars = sum(embed_length(embed) for embed in payload_embeds)
+        content = join_content(contents + [payload.get('content')])
+        if count and (embeds + len(payload_embeds) > MAX_EMBEDS or chars + payload_chars > MAX_EMBED_CHARS
+                      or len(content) > MAX_CONTENT or payload.get('username') != payloads[0].get('username')):
+            return count
+        embeds += len(payload_embeds)
+        chars += payload_chars
+        contents.append(payload.get('content'))
+    return len(payloads)
+
+def render_batch(base: Dict[str, Any], pieces: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """One webhook body from per-message pieces ({'content', 'embeds'}; None for a deleted message)"""
+    live = [piece for piece in pieces if piece is not None]
+    body = dict(base)
+    body['content'] = join_content(piece.get('content') for piece in live)[:MAX_CONTENT]
+    body['embeds'] = [embed for piece in live for embed in piece.get('embeds') or []][:MAX_EMBEDS]
+    return body
+
+@dataclass
+class ArrivalRate:
+    """Exponentially decayed message rate (per second) with time constant tau"""
+    rate: float = 0.0
+    updated: float = 0.0
+    
+    def at(self, now: float, tau: float) -> float:
+        return self.rate * math.exp(-(now - self.updated) / tau)
+    
+    def observe(self, now: float, tau: float):
+        self.rate = self.at(now, tau) + 1.0 / tau
+        self.updated = now
+
+class BatchWindow:
+    """Per-pair batching windows
+    
+    A pair batches when its batch_window_ms is set; that value is the latency
+    ceiling. The wait for more messages is the time the pair's current rate
+    needs to fill a post (MAX_EMBEDS messages), capped by the ceiling, and is
+    zero when fewer than `min_expected` further messages are expected within
+    the ceiling, so a lone message is posted straight away.
+    """
+    
+    def __init__(self, tau: Optional[float] = None, min_expected: Optional[float] = None):
+        self.tau = tau if tau is not None else float(os.getenv('BATCH_RATE_TAU', '2.0'))
+        self.min_expected = min_expected if min_expected is not None else float(os.getenv('BATCH_MIN_EXPECTED', '0.5'))
+        self.ceilings: Dict[str, float] = {}
+        self.rates: Dict[str, ArrivalRate] = {}
+    
+    def configure(self, pairs: Iterable[Any]):
+        """Take each pair's batch_window_ms (0: batching off) from the current config"""
+        self.ceilings = {pair.pair_name: pair.batch_window_ms / 1000 for pair in pairs if pair.batch_window_ms > 0}
+        for pair_name in list(self.rates):
+            if pair_name not in self.ceilings:
+                del self.rates[pair_name]
+    
+    def observe(self, pair_name: str, now: Optional[float] = None):
+        if pair_name not in self.ceilings:
+            return
+        now = time.monotonic() if now is None else now
+        self.rates.setdefault(pair_name, ArrivalRate(updated=now)).observe(now, self.tau)
+    
+    def window(self, pair_name: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds to hold a post for company; None when the pair does not batch"""
+        ceiling = self.ceilings.get(pair_name)
+        if ceiling is None:
+            return None
+        arrival = self.rates.get(pair_name)
+        if arrival is None:
+            return 0.0
+        rate = arrival.at(time.monotonic() if now is None else now, self.tau)
+        if rate * ceiling < self.min_expected:
+            return 0.0
+        return min(ceiling, MAX_EMBEDS / rate)
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            pair_name: {
+                'ceiling_ms': round(ceiling * 1000),
+                'rate': round(self.rates[pair_name].at(now, self.tau), 2) if pair_name in self.rates else 0.0,
+                'window_ms': round((self.window(pair_name, now) or 0.0) * 1000)
+            }
+            for pair_name, ceiling in self.ceilings.items()
+        }